@@ -0,0 +1,496 @@
+import decimal
+from decimal import Decimal
+from functions import function_list, operators, constants
+from optimizer import SEQUENCE_FUNCTIONS
+from precise import decimal_functions, decimal_function_list, decimal_operators, decimal_constants, precision_context
+
+FLOAT_UNIT = 2.0 ** -53
+# Worst ulp of the float kernels over their domains with some headroom, see report_accuracy
+# in benchmarks.py. Kernels left out lose digits somewhere (log1p, asinh and atanh near 0,
+# acos near 1 and the gamma family), so their float results are never trusted.
+float_function_ulps = {
+    'sin': 4, 'cos': 4, 'tan': 8, 'cot': 8, 'sec': 8, 'csc': 8, 'cosec': 8,
+    'sinh': 8, 'cosh': 8, 'tanh': 8, 'exp': 8, 'expm1': 4, 'exp2': 8,
+    'ln': 4, 'log': 4, 'log10': 8, 'lg': 8, 'log2': 8, 'sqrt': 1, 'cbrt': 4,
+    'atan': 4, 'arctan': 4, 'asin': 8, 'arcsin': 8, 'acosh': 4, 'erf': 4, 'erfc': 8,
+    'normcdf': 8, 'normpdf': 8, 'invnorm': 8,
+    'abs': 0, 'fabs': 0, 'radians': 1, 'degrees': 1,
+    'atan2': 8, 'hypot': 4, 'copysign': 0, 'ldexp': 0,
+}
+# π/2 is carried to about 118 bits in the float argument reduction
+FLOAT_REDUCTION_UNIT = 2.0 ** -100
+FIRST_PRECISION = 30
+INF = Decimal('Infinity')
+
+def _fn(name):
+    return function_list[name]
+
+# |f'(x)| for the smooth functions, given x and f(x) as floats
+derivatives = {
+    'sin': lambda x, r: abs(_fn('cos')(x)),
+    'cos': lambda x, r: abs(_fn('sin')(x)),
+    'tan': lambda x, r: 1 + r * r,
+    'cot': lambda x, r: 1 + r * r,
+    'sec': lambda x, r: abs(r * _fn('tan')(x)),
+    'csc': lambda x, r: abs(r / _fn('tan')(x)),
+    'cosec': lambda x, r: abs(r / _fn('tan')(x)),
+    'sinh': lambda x, r: _fn('cosh')(x),
+    'cosh': lambda x, r: abs(_fn('sinh')(x)),
+    'tanh': lambda x, r: 1 - r * r,
+    'exp': lambda x, r: abs(r),
+    'expm1': lambda x, r: abs(r) + 1,
+    'exp2': lambda x, r: abs(r) * constants['ln2'],
+    'ln': lambda x, r: 1 / abs(x),
+    'log': lambda x, r: 1 / abs(x),
+    'log10': lambda x, r: 1 / (abs(x) * constants['ln10']),
+    'lg': lambda x, r: 1 / (abs(x) * constants['ln10']),
+    'log2': lambda x, r: 1 / (abs(x) * constants['ln2']),
+    'log1p': lambda x, r: 1 / abs(1 + x),
+    'sqrt': lambda x, r: 1 / (2 * abs(r)),
+    'cbrt': lambda x, r: 1 / (3 * r * r),
+    'atan': lambda x, r: 1 / (1 + x * x),
+    'arctan': lambda x, r: 1 / (1 + x * x),
+    'asin': lambda x, r: 1 / _fn('sqrt')(1 - x * x),
+    'arcsin': lambda x, r: 1 / _fn('sqrt')(1 - x * x),
+    'acos': lambda x, r: 1 / _fn('sqrt')(1 - x * x),
+    'arccos': lambda x, r: 1 / _fn('sqrt')(1 - x * x),
+    'asinh': lambda x, r: 1 / _fn('sqrt')(1 + x * x),
+    'acosh': lambda x, r: 1 / _fn('sqrt')(x * x - 1),
+    'atanh': lambda x, r: 1 / (1 - x * x),
+    'erf': lambda x, r: constants['two'] / constants['sqrt_2pi'] * 2 ** 0.5 * _fn('exp')(-x * x),
+    'erfc': lambda x, r: constants['two'] / constants['sqrt_2pi'] * 2 ** 0.5 * _fn('exp')(-x * x),
+    'normcdf': lambda x, r: _fn('normpdf')(x),
+    'normpdf': lambda x, r: abs(x * r),
+    'invnorm': lambda x, r: 1 / _fn('normpdf')(r),
+    'abs': lambda x, r: 1,
+    'fabs': lambda x, r: 1,
+    'radians': lambda x, r: constants['pi'] / 180,
+    'degrees': lambda x, r: 180 / constants['pi'],
+    # ln(x) - 1/x < digamma(x) < ln(x) for x > 0
+    'gamma': lambda x, r: abs(r) * (abs(_fn('ln')(x)) + 1 / x),
+    'lgamma': lambda x, r: abs(_fn('ln')(x)) + 1 / x,
+}
+
+# |df / dx_i| for the smooth functions of several arguments, given the arguments and f as floats
+partials = {
+    'atan2': lambda y, x, r: (abs(x) / (x * x + y * y), abs(y) / (x * x + y * y)),
+    'hypot': lambda x, y, r: (abs(x) / r, abs(y) / r),
+    'copysign': lambda x, y, r: (1, 0),
+    'ldexp': lambda x, i, r: (2.0 ** i, 0),
+}
+
+# Whether f is smooth on [x - e, x + e], checked before the derivative is trusted. Functions of
+# several arguments take all the values and then all the errors.
+domains = {
+    'atan2': lambda y, x, ey, ex: abs(y) > ey or x - ex > 0,
+    'copysign': lambda x, y, ex, ey: abs(y) > ey,
+    'ldexp': lambda x, i, ex, ei: not ei,
+    'ln': lambda x, e: x - e > 0,
+    'log': lambda x, e: x - e > 0,
+    'log10': lambda x, e: x - e > 0,
+    'lg': lambda x, e: x - e > 0,
+    'log2': lambda x, e: x - e > 0,
+    'log1p': lambda x, e: x - e > -1,
+    'sqrt': lambda x, e: x - e > 0,
+    'cbrt': lambda x, e: abs(x) > e,
+    'asin': lambda x, e: abs(x) + e < 1,
+    'arcsin': lambda x, e: abs(x) + e < 1,
+    'acos': lambda x, e: abs(x) + e < 1,
+    'arccos': lambda x, e: abs(x) + e < 1,
+    'acosh': lambda x, e: x - e > 1,
+    'atanh': lambda x, e: abs(x) + e < 1,
+    'invnorm': lambda x, e: x - e > 0 and x + e < 1,
+    'gamma': lambda x, e: x - e > 0,
+    'lgamma': lambda x, e: x - e > 0,
+}
+
+COMPARISONS = ('<', '<=', '>', '>=', '==', '!=', '===', '!==', '<==', '>==')
+STRICT_COMPARISONS = ('===', '!==', '<==', '>==')
+
+# Decimal kernels whose result is exact whenever the final rounding did not flag Inexact,
+# the rest round inside a wider working context where the flag is not seen
+exact_when_unrounded = {
+    'sqrt': lambda x: True,
+    'abs': lambda x: True,
+    'fabs': lambda x: True,
+    'gamma': lambda x: x == int(x),
+}
+
+class AdaptiveEvaluator:
+    ''' Float evaluation with a running error bound per node, escalating only the subtrees that miss their error budget '''
+
+    def __init__(self, tree, digits=15, max_precision=1000):
+        # tree(precision) returns the unfolded AST of the expression with constants at that precision
+        self.tree = tree
+        self.digits = digits
+        self.max_precision = max_precision
+        # Error bounds only need a few digits, rounded up, over the full exponent range
+        self.bounds = decimal.Context(prec=8, rounding=decimal.ROUND_CEILING, Emin=decimal.MIN_EMIN, Emax=decimal.MAX_EMAX)
+        # Only used for additions, which are then exact
+        self.exact = decimal.Context(prec=decimal.MAX_PREC, Emin=decimal.MIN_EMIN, Emax=decimal.MAX_EMAX)
+        self.trees = {}
+        self.inexact = {}
+        self.units = {}
+        self.memo = {}
+        self.escalations = 0
+
+    def _tree(self, precision):
+        if precision not in self.trees:
+            self.trees[precision] = self.tree(precision)
+            # Constants whose value changes with the precision carry a rounding error
+            table = decimal_constants(precision)
+            self.inexact[precision] = {v for name, v in table.items() if isinstance(constants[name], float) and Decimal(constants[name]) != v}
+        return self.trees[precision]
+
+    def _node(self, precision, path):
+        node = self._tree(precision)
+        for i in path:
+            node = node[i]
+        return node
+
+    def _children(self, node):
+        ''' Positions of the child nodes '''
+        if node[0] in ('num', 'var'):
+            return ()
+        if node[0] == 'map' or (node[0] == 'function' and node[1] in SEQUENCE_FUNCTIONS):
+            raise ValueError('Sequences have no error bound for adaptive evaluation')
+        if node[0] == 'series':
+            raise ValueError('Series have no error bound for adaptive evaluation')
+        if node[0] == 'calculus':
+            raise ValueError('Integrals, roots and minima have no error bound for adaptive evaluation')
+        return tuple(range(2, len(node)))
+
+    def _ends(self, x, e, precision):
+        ''' The interval x - e, x + e formed exactly, then in the arithmetic of the precision '''
+        with decimal.localcontext(self.exact):
+            lo, hi = Decimal(x) - e, Decimal(x) + e
+        if precision is None:
+            return float(lo), float(hi)
+        return lo, hi
+
+    def _abs(self, x):
+        if isinstance(x, float) and x != x:
+            return INF
+        return self.bounds.abs(Decimal(x))
+
+    def _unit(self, precision, function=None):
+        ''' Relative rounding error of one operation or function call at a precision '''
+        key = (precision, function)
+        if key not in self.units:
+            with decimal.localcontext(self.bounds):
+                if precision is not None:
+                    unit = Decimal(10) ** (1 - precision)
+                elif function is None:
+                    unit = Decimal(FLOAT_UNIT)
+                elif function not in float_function_ulps:
+                    unit = INF
+                else:
+                    unit = Decimal(FLOAT_UNIT) * float_function_ulps[function]
+            self.units[key] = unit
+        return self.units[key]
+
+    def _reduction_unit(self, precision):
+        ''' Relative error of the reduced argument inside the function kernels '''
+        with decimal.localcontext(self.bounds):
+            if precision is None:
+                return Decimal(FLOAT_REDUCTION_UNIT)
+            return Decimal(10) ** -(precision + decimal_functions.GUARD)
+
+    def _target(self, value):
+        with decimal.localcontext(self.bounds):
+            return self._abs(value) * Decimal(10) ** -self.digits
+
+    def _leaf(self, node, precision):
+        ''' Value and error of a num or var node '''
+        if node[0] == 'var':
+            try:
+                return self.variables[node[1]], 0
+            except KeyError:
+                raise ValueError(f"Variable '{node[1]}' has no value") from None
+
+        value = node[1]
+        if not isinstance(value, Decimal):
+            return value, 0
+        inexact = value in self.inexact[17 if precision is None else precision]
+        with decimal.localcontext(self.bounds):
+            if precision is not None:
+                return value, self._abs(value) * self._unit(precision) if inexact else 0
+
+            f = float(value)
+            if not inexact and Decimal(f) == value:
+                return f, 0
+            # The constant itself is good to 17 digits before it is rounded to a float
+            return f, self._abs(value) * (self._unit(None) + Decimal('1e-16'))
+
+    def _apply(self, node, args, precision):
+        ''' Evaluate one node from its child values '''
+        functions, ops = (function_list, operators) if precision is None else (decimal_function_list, decimal_operators)
+        kind = node[0]
+        if kind == 'function':
+            return functions[node[1]](*args)
+        if kind == 'postfix':
+            return functions['factorial'](args[0]) if node[1] == '!' else args[0]
+        if kind == 'unary':
+            return ops['~'](args[0])
+        if kind == 'convert':
+            return args[0]
+        op = node[1]
+        if op == '&&':
+            return args[0] and args[1]
+        if op == '||':
+            return args[0] or args[1]
+        return ops[op](args[0], args[1])
+
+    def _truth_known(self, a, e):
+        return not e or (a != 0 and e < self._abs(a))
+
+    def _sensitivities(self, node, args, errs, value, precision):
+        ''' Bounds on |d node / d child| so that the error is the sum of sens * child error plus rounding '''
+        kind = node[0]
+        exact = all(not e for e in errs)
+
+        if kind == 'function' and len(args) != 1:
+            name = node[1]
+            if exact:
+                return [0] * len(args)
+            if name not in partials:
+                return [INF] * len(args)
+            values, bounds = [float(a) for a in args], [float(e) for e in errs]
+            if name in domains and not domains[name](*values, *bounds):
+                return [INF] * len(args)
+            try:
+                slopes = partials[name](*values, float(value))
+            except (ZeroDivisionError, OverflowError, ValueError):
+                return [INF] * len(args)
+            with decimal.localcontext(self.bounds):
+                widest = max(self._abs(e) for e in errs)
+                return [2 * self._abs(d) + widest * (1 + self._abs(value)) if d else 0 for d in slopes]
+
+        if kind == 'function':
+            name = node[1]
+            x, e = args[0], errs[0]
+            if name not in derivatives:
+                if not e:
+                    return [0]
+                # Step functions like floor are exact when both ends of the interval agree
+                lo, hi = self._ends(x, e, precision)
+                lo, hi = self._apply(node, [lo], precision), self._apply(node, [hi], precision)
+                return [0 if lo == hi == value else INF]
+            fx, fe = float(x), float(e)
+            if name in domains and not domains[name](fx, fe):
+                return [INF]
+            try:
+                d = derivatives[name](fx, float(value))
+            except (ZeroDivisionError, OverflowError, ValueError):
+                return [INF]
+            with decimal.localcontext(self.bounds):
+                # Twice the slope at x plus a second order allowance
+                return [2 * self._abs(d) + e * (1 + self._abs(value))]
+
+        if kind in ('postfix', 'unary'):
+            if exact or (kind == 'postfix' and node[1] != '!'):
+                return [0 if exact else 1]
+            lo, hi = self._ends(args[0], errs[0], precision)
+            same = int(lo) == int(hi) and lo >= 0
+            return [0 if same and kind == 'postfix' else INF]
+
+        if kind == 'convert':
+            return [1]
+
+        op = node[1]
+        a, b = args
+        ea, eb = errs
+        with decimal.localcontext(self.bounds):
+            if op in ('+', '-'):
+                return [1, 1]
+            if op in ('*', '.'):
+                return [self._abs(b) + eb, self._abs(a)]
+            if op == '/':
+                gap = self._abs(b) - eb
+                if gap <= 0:
+                    return [INF, INF]
+                return [1 / gap, (self._abs(a) + ea) / (self._abs(b) * gap)]
+            if op == '^':
+                if exact:
+                    return [0, 0]
+                if a > 0:
+                    r = self._abs(value)
+                    ln_a = abs(Decimal(a).ln(self.bounds))
+                    return [2 * r * self._abs(b) / self._abs(a), 2 * r * (ln_a + 1)]
+                if eb or not a:
+                    return [INF, INF]
+                return [2 * self._abs(value) * self._abs(b) / self._abs(a), 0]
+            if op in COMPARISONS:
+                # Strict comparisons of different types are false whatever the values
+                decided = (exact or (op in STRICT_COMPARISONS and type(a) is not type(b))
+                           or self._abs(Decimal(a) - Decimal(b)) > ea + eb)
+                return [0, 0] if decided else [INF, INF]
+            if op in ('&&', '||'):
+                if not self._truth_known(a, ea):
+                    return [INF, 0]
+                take_left = (not a) if op == '&&' else bool(a)
+                return [1, 0] if take_left else [0, 1]
+            if op in ('//', '%'):
+                if exact:
+                    return [0, 0]
+                if eb:
+                    return [INF, INF]
+                # The quotient must not cross an integer anywhere in the interval
+                lo, hi = self._ends(a, ea, precision)
+                if self._apply(node, [lo, b], precision) != self._apply(node, [hi, b], precision) and op == '//':
+                    return [INF, INF]
+                q = Decimal(a) / Decimal(b)
+                if (Decimal(lo) / Decimal(b)) // 1 != q // 1 or (Decimal(hi) / Decimal(b)) // 1 != q // 1:
+                    return [INF, INF]
+                return [0, 0] if op == '//' else [1, 0]
+            # Permutations, combinations and bitwise operators need exact operands
+            return [0, 0] if exact else [INF, INF]
+
+    def _combine(self, node, args, errs, precision):
+        ''' Value and error bound of a node at a precision, None meaning native floats '''
+        rounded = True
+        if precision is None:
+            value = self._apply(node, args, None)
+        else:
+            args = [a if a is None or isinstance(a, (int, Decimal)) else Decimal(a) for a in args]
+            with precision_context(precision) as ctx:
+                ctx.clear_flags()
+                value = self._apply(node, args, precision)
+                rounded = ctx.flags[decimal.Inexact]
+            if node[0] == 'function' and not (len(args) == 1 and node[1] in exact_when_unrounded
+                                              and exact_when_unrounded[node[1]](args[0])):
+                rounded = True
+
+        sens = self._sensitivities(node, args, errs, value, precision)
+        with decimal.localcontext(self.bounds):
+            err = Decimal(0)
+            for s, e in zip(sens, errs):
+                if e and s:
+                    err += s * e
+            if rounded and not isinstance(value, (bool, int)):
+                unit = self._unit(precision, node[1] if node[0] == 'function' else None)
+                err += INF if unit == INF else self._abs(value) * unit
+                if node[0] == 'function' and len(args) == 1 and node[1] in derivatives and sens[0] != INF:
+                    # Argument reduction error, relative to the argument rather than the result
+                    err += self._abs(args[0]) * sens[0] * self._reduction_unit(precision)
+        return value, err, sens
+
+    def _float_pass(self, root):
+        ''' Evaluate the whole tree with floats, recording every node's value and error
+
+        Runs over an explicit stack like optimizer.postorder, with a guard step between the operands of
+        && and || that skips the right one when the left decides, as evaluate does. '''
+        results = []
+        # Nodes are pushed as (node, path) to expand them, then as (None, node, path) to combine them
+        stack = [(root, ())]
+        while stack:
+            entry = stack.pop()
+            if entry[0] == 'guard':
+                _, node, path = entry
+                a, e = results[-1]
+                if self._truth_known(a, e) and bool(a) == (node[1] == '||'):
+                    # The right operand is never needed, its error counts for nothing
+                    stack.pop()
+                    self.memo[path + (3,)] = (None, 0, None)
+                    results.append((None, 0))
+                continue
+            if entry[0] is None:
+                _, node, path = entry
+                count = len(self._children(node))
+                args = [v for v, _ in results[-count:]]
+                errs = [e for _, e in results[-count:]]
+                del results[-count:]
+                value, err, _ = self._combine(node, args, errs, None)
+            else:
+                node, path = entry
+                children = self._children(node)
+                if children:
+                    stack.append((None, node, path))
+                    if node[0] == 'symbol' and node[1] in ('&&', '||'):
+                        stack += ((node[3], path + (3,)), ('guard', node, path), (node[2], path + (2,)))
+                    else:
+                        stack += reversed([(node[i], path + (i,)) for i in children])
+                    continue
+                value, err = self._leaf(node, None)
+            self.memo[path] = (value, err, None)
+            results.append((value, err))
+        return results[0]
+
+    def _precision(self, value, budget, current):
+        ''' Digits that make a rounding of value fit in budget, at least double the current precision '''
+        with decimal.localcontext(self.bounds):
+            if budget and value:
+                need = (self._abs(value) / budget).adjusted() + 3
+            else:
+                need = self.max_precision
+        precision = max(need, 2 * current if current else FIRST_PRECISION)
+        if precision > self.max_precision:
+            raise ArithmeticError(f'Cannot guarantee {self.digits} digits within a precision of {self.max_precision}')
+        return precision
+
+    def _refine(self, root, budget):
+        ''' Re-evaluate the parts of the tree that miss their error budget at a higher precision
+
+        Children are refined before their parent is combined again, over an explicit stack. '''
+        # Nodes are pushed as (node, path, budget) to refine their children, then as
+        # (None, node, path, budget) to be combined from the refined children
+        stack = [(root, (), budget)]
+        while stack:
+            entry = stack.pop()
+            if entry[0] is None:
+                _, node, path, budget = entry
+                value, _, precision = self.memo[path]
+                children = self._children(node)
+                args = [self.memo[path + (i,)][0] for i in children]
+                errs = [self.memo[path + (i,)][1] for i in children]
+                precision = self._precision(value, budget / 2, precision)
+                value, err, _ = self._combine(node, args, errs, precision)
+                self.memo[path] = (value, err, precision)
+                self.escalations += 1
+                continue
+
+            node, path, budget = entry
+            value, err, precision = self.memo[path]
+            if err <= budget:
+                continue
+
+            children = self._children(node)
+            if not children:
+                precision = self._precision(value, budget, precision)
+                value, err = self._leaf(self._node(precision, path), precision)
+                self.memo[path] = (value, err, precision)
+                self.escalations += 1
+                continue
+
+            args = [self.memo[path + (i,)][0] for i in children]
+            errs = [self.memo[path + (i,)][1] for i in children]
+            sens = self._sensitivities(node, args, errs, value, precision)
+            stack.append((None, node, path, budget))
+            below = []
+            with decimal.localcontext(self.bounds):
+                for i, a, s, e in zip(children, args, sens, errs):
+                    if not s or not e:
+                        continue
+                    # Undecidable comparisons and jumps push the child three digits further
+                    if s != INF:
+                        child_budget = budget / (2 * len(children) * s)
+                    elif e != INF:
+                        child_budget = e / 1000
+                    else:
+                        child_budget = self._target(a)
+                    below.append((node[i], path + (i,), child_budget))
+            stack += reversed(below)
+
+    def evaluate(self, variables):
+        ''' Return a value with self.digits correct significant digits '''
+        self.variables = variables
+        self.memo = {}
+        self.escalations = 0
+        root = self._tree(17)
+        self._float_pass(root)
+
+        while True:
+            value, err, _ = self.memo[()]
+            if err <= self._target(value):
+                return value
+            self._refine(root, self._target(value))
@@ -0,0 +1,649 @@
+import re, math, time, decimal, timeit, tracemalloc
+from itertools import takewhile
+from main import Parse
+from scanner import ParseError
+from functions import symbols
+
+README_EXPRESSIONS = [
+    'sqrt(2)^2 + sqrt(2) - (2 - sqrt(2))',
+    'sin( (pi/2) - asin( sin(pi/6) ) ) + cos( acos( half ) )',
+    'ln(exp(ln(2.pi)) + exp(ln(3.e)) + exp(ln(5)))',
+    '(10 C 3) * (8 P 2) + (6! / (3! * 2!))',
+    '(2.pi).(3.e) / (sqrt(2).sqrt(2))',
+    '((12345 & 255) | (42 << 8)) xor (999 % 256)',
+    '((10 C 3) == 120) && ((gamma(6) === 120) || (gamma(6) == 120))',
+    '£(10 C 3) + $5! + 2.pi',
+]
+
+def bench(name, func, number):
+    ''' Time func and print the mean cost per call '''
+    t = timeit.timeit(func, number=number)
+    print(f'{name:<50} {t / number * 1e6:12.2f} us/call')
+    return t / number
+
+def bench_compiled():
+    ''' Tree-walking Parse.evaluate against CompiledExpression '''
+    print('walker vs compiled closures')
+    # Arithmetic heavy expression so the per-node dispatch dominates
+    long_expression = ' + '.join(f'({i} * 3 - {i} // 2) % 7 . 2' for i in range(50))
+    for expression in README_EXPRESSIONS[3:6] + [long_expression]:
+        parser = Parse(expression, fold=False)
+        compiled = parser.compile()
+        label = expression if len(expression) < 40 else expression[:37] + '...'
+        walk = bench(f'  walk    {label}', parser.evaluate, 2000)
+        comp = bench(f'  compile {label}', compiled, 2000)
+        print(f'  speedup {walk / comp:.2f}x')
+
+def bench_folding():
+    ''' Unfolded against constant folded ASTs '''
+    print('constant folding')
+    for expression in README_EXPRESSIONS[:3]:
+        label = expression if len(expression) < 40 else expression[:37] + '...'
+        plain = bench(f'  plain  {label}', Parse(expression, fold=False).evaluate, 2000)
+        folded = bench(f'  folded {label}', Parse(expression).evaluate, 2000)
+        print(f'  speedup {plain / folded:.2f}x')
+
+def bench_batch():
+    ''' One parse per grid point against a single evaluate_batch call '''
+    from vectorized import np
+    if np is None:
+        print('batch evaluation skipped, NumPy is not installed')
+        return
+
+    print('grid evaluation of sin(x)^2 + ln(x)')
+    points = 10000
+    grid = np.arange(1, points + 1)
+    Parse.cache.resize(0)
+    per_point = bench(f'  parse per point ({points} points)', lambda: [Parse(f'sin({x})^2 + ln({x})').evaluate() for x in grid.tolist()], 1)
+    Parse.cache.resize(1024)
+    compiled = Parse('sin(x)^2 + ln(x)').compile()
+    bench(f'  compiled per point ({points} points)', lambda: [compiled(x=x) for x in grid.tolist()], 1)
+    batch = bench(f'  evaluate_batch ({points} points)', lambda: Parse('sin(x)^2 + ln(x)').evaluate_batch(x=grid), 20)
+    print(f'  speedup {per_point / batch:.1f}x')
+    big = np.linspace(0.5, 100.0, 1000000)
+    bench('  evaluate_batch (1000000 points)', lambda: Parse('sin(x)^2 + ln(x)').evaluate_batch(x=big), 3)
+
+def bench_kernels():
+    ''' Scalar Func loop against the ArrayFunc kernels on one column of data '''
+    from vectorized import np
+    if np is None:
+        print('array kernels skipped, NumPy is not installed')
+        return
+    from functions import function_list
+    from vectorized import array_function_list
+
+    print('array kernels on 100000 values')
+    data = np.linspace(0.1, 5.0, 100000)
+    column = data.tolist()
+    for name in ('sin', 'tan', 'exp', 'ln', 'atan', 'erf', 'gamma'):
+        fn = function_list[name]
+        scalar = bench(f'  scalar {name}', lambda: [fn(x) for x in column], 1)
+        kernel = array_function_list[name]
+        array = bench(f'  array  {name}', lambda: kernel(data), 10)
+        print(f'  speedup {scalar / array:.1f}x')
+
+def naive_factorial(n):
+    p = 1
+    for i in range(2, n + 1):
+        p *= i
+    return p
+
+def bench_factorials():
+    ''' Scaling of !, P and C through Parse up to n = 10 ** 6 '''
+    print('factorial, perm and comb through Parse')
+    for n in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+        number = 1 if n >= 10 ** 5 else 20
+        for expression in (f'{n}!', f'{n} P {n // 2}', f'{n} C {n // 2}', f'{n} C 3'):
+            bench(f'  {expression}', Parse(expression, fold=False).evaluate, number)
+        # Either side of the small k loop
+        for k in (64, 65):
+            bench(f'  {n} C {k}', Parse(f'{n} C {k}', fold=False).evaluate, number)
+        if n <= 10 ** 5:
+            bench(f'  naive {n}! loop', lambda: naive_factorial(n), number)
+            bench(f'  naive {n} C {n // 2} from three factorials', lambda: naive_factorial(n) // (naive_factorial(n // 2) * naive_factorial(n - n // 2)), number)
+
+def bench_bigint():
+    ''' gcd, lcm and isqrt on 10000 digit operands '''
+    import math, random
+    from functions import function_list
+
+    def euclid(a, b):
+        while b:
+            a, b = b, a % b
+        return a
+
+    print('gcd, lcm and isqrt on 10000 digit integers')
+    rng = random.Random(1)
+    g = rng.randrange(10 ** 2000, 10 ** 2001)
+    a = rng.randrange(10 ** 9999, 10 ** 10000) * g
+    b = rng.randrange(10 ** 9999, 10 ** 10000) * g
+    bench('  Euclid loop gcd', lambda: euclid(a, b), 5)
+    bench('  Lehmer gcd', lambda: function_list['gcd'](a, b), 5)
+    bench('  math.gcd', lambda: math.gcd(a, b), 5)
+    bench('  lcm of three', lambda: function_list['lcm'](a, b, g), 5)
+    bench('  integer Newton isqrt', lambda: function_list['isqrt'](a * b), 5)
+    bench('  math.isqrt', lambda: math.isqrt(a * b), 5)
+
+def bench_trig():
+    ''' Fused sincos and expm1 core against separate calls '''
+    from functions import function_list
+    print('trigonometric and hyperbolic family')
+    sin, cos, sincos = function_list['sin'], function_list['cos'], function_list['sincos']
+    bench('  sin(x) and cos(x) separately', lambda: (sin(1.2345), cos(1.2345)), 20000)
+    bench('  sincos(x)', lambda: sincos(1.2345), 20000)
+    for name in ('tan', 'cot', 'sec', 'sinh', 'cosh', 'tanh'):
+        fn = function_list[name]
+        bench(f'  {name}(x)', lambda: fn(1.2345), 20000)
+
+def ulp_error(value, expected):
+    ''' Distance between value and expected in units in the last place '''
+    if value == expected:
+        return 0
+    return abs(value - expected) / math.ulp(expected)
+
+def report_accuracy(samples=20000):
+    ''' Worst ulp error and speed of the scalar kernels against the math module '''
+    import random
+    from functions import function_list
+    print('scalar kernel accuracy against math (worst ulp over random samples)')
+    rng = random.Random(0)
+    cases = [
+        ('exp', math.exp, lambda: rng.uniform(-745, 709)),
+        ('expm1', math.expm1, lambda: rng.uniform(-2, 2)),
+        ('ln', math.log, lambda: math.ldexp(rng.random() + 0.5, rng.randint(-1070, 1023))),
+        ('sin', math.sin, lambda: rng.uniform(-100, 100)),
+        ('cos', math.cos, lambda: rng.uniform(-100, 100)),
+        ('sin', math.sin, lambda: math.ldexp(rng.random() + 0.5, rng.randint(20, 1023))),
+        ('atan', math.atan, lambda: math.tan(rng.uniform(-1.57, 1.57))),
+        ('erf', math.erf, lambda: rng.uniform(-6.5, 6.5)),
+    ]
+    for name, reference, sample in cases:
+        fn = function_list[name]
+        xs = [sample() for _ in range(samples)]
+        worst = max(ulp_error(fn(x), reference(x)) for x in xs)
+        print(f'  {name:<8} worst {worst:4.1f} ulp up to |x| = {max(map(abs, xs)):.3g}')
+        bench(f'  {name}(x)', lambda: fn(xs[0]), 20000)
+
+def bench_types():
+    ''' Mixed literal expressions with conversions fixed at parse time against per operation promotion '''
+    print('type inference')
+    expression = '(0.5 + 1.25) * x + 2.5 * pi'
+    inferred = Parse(expression, fold=False).compile()
+    promoted = Parse(expression, fold=False, precision=16).compile()
+    bench('  inferred float path', lambda: inferred(x=1.5), 20000)
+    bench('  Decimal promotion at every operator', lambda: promoted(x=1.5), 20000)
+
+def bench_precision():
+    ''' Decimal engine cost per call at increasing precision, constants already cached '''
+    print('Decimal precision engine')
+    for digits in (50, 1000):
+        for expression in ('pi', 'exp(2.5)', 'ln(2.5)', 'sin(2.5)', 'atan(2.5)', 'erf(2.5)', 'gamma(2.5)'):
+            compiled = Parse(expression, fold=False, precision=digits).compile()
+            compiled()
+            bench(f'  {expression} to {digits} digits', compiled, 20)
+    from precise import decimal_functions
+    compiled = Parse('gamma(2.5)', fold=False, precision=1000).compile()
+    def cold():
+        decimal_functions.cache.clear()
+        compiled()
+    bench('  gamma(2.5) to 1000 digits, Spouge table built each call', cold, 3)
+
+def bench_adaptive():
+    ''' Adaptive evaluation against floats and a fixed 50 digit Decimal evaluation '''
+    print('adaptive precision')
+    for expression in README_EXPRESSIONS[:5]:
+        label = expression if len(expression) < 40 else expression[:37] + '...'
+        parser = Parse(expression, fold=False)
+        escalations = parser.evaluate_adaptive()[1]
+        bench(f'  float    {label}', parser.evaluate, 200)
+        bench(f'  adaptive {label} ({escalations} escalations)', parser.evaluate_adaptive, 200)
+        bench(f'  50 digit {label}', Parse(expression, fold=False, precision=50).evaluate, 200)
+
+def bench_memo():
+    ''' Recurring gamma, erf and lgamma arguments with and without memoization '''
+    from functions import function_list, memoize, unmemoize, memo_stats
+    print('memoized functions over 20 recurring arguments')
+    args = [0.25 * i + 0.1 for i in range(20)] * 50
+    for name in ('gamma', 'erf', 'lgamma'):
+        plain = bench(f'  {name} plain', lambda: [function_list[name](x) for x in args], 20)
+        memoize(name)
+        memo = bench(f'  {name} memoized', lambda: [function_list[name](x) for x in args], 20)
+        print(f'  speedup {plain / memo:.2f}x, hit ratio {memo_stats()[name]["hit_ratio"]:.3f}')
+        unmemoize(name)
+    bench('  gamma(100) from the integer table', lambda: function_list['gamma'](100), 20000)
+    bench('  100! from the integer table', lambda: function_list['factorial'](100), 20000)
+
+def bench_lgamma():
+    ''' Log space lgamma and non-integer comb and perm on large arguments '''
+    from functions import function_list
+    print('lgamma, gamma and non-integer comb')
+    lgamma, gamma, comb = function_list['lgamma'], function_list['gamma'], function_list['comb']
+    for x in (2.5, 7.3, 150.2, 1e3 + 0.5, 1e6 + 0.3):
+        bench(f'  lgamma({x})', lambda: lgamma(x), 20000)
+    for x in (0.3, 7.3, 150.2):
+        bench(f'  gamma({x})', lambda: gamma(x), 20000)
+    bench('  comb(1000000.5, 3)', lambda: comb(1e6 + 0.5, 3), 20000)
+    bench('  comb(12345.678, 20.5)', lambda: comb(12345.678, 20.5), 20000)
+
+def bench_normal():
+    ''' normcdf, normpdf and invnorm against statistics.NormalDist, worst error in ulp of the larger result '''
+    import random, statistics
+    from functions import function_list
+    from vectorized import np
+    print('normal distribution against statistics.NormalDist')
+    normal = statistics.NormalDist()
+    rng = random.Random(0)
+    xs = [rng.uniform(-8, 8) for _ in range(20000)]
+    ps = [rng.random() for _ in range(20000)]
+    # NormalDist.cdf loses the lower tail to 1 + erf, so accuracy is checked against erfc
+    accurate = {
+        'normcdf': lambda x: 0.5 * math.erfc(-x / math.sqrt(2)),
+        'normpdf': lambda x: math.exp(-x * x / 2) / math.sqrt(2 * math.pi),
+        'invnorm': normal.inv_cdf,
+    }
+    for name, reference, values in (('normcdf', normal.cdf, xs), ('normpdf', normal.pdf, xs), ('invnorm', normal.inv_cdf, ps)):
+        fn = function_list[name]
+        worst = max(ulp_error(fn(v), accurate[name](v)) for v in values)
+        print(f'  {name:<8} worst {worst:4.1f} ulp from the math module reference')
+        ours = bench(f'  {name}(x)', lambda: fn(values[0]), 20000)
+        theirs = bench(f'  NormalDist {name}(x)', lambda: reference(values[0]), 20000)
+        print(f'  relative cost {ours / theirs:.2f}x')
+        if np is not None:
+            from vectorized import array_function_list
+            data = np.array(values)
+            bench(f'  array {name} (20000 values)', lambda: array_function_list[name](data), 20)
+            bench(f'  NormalDist {name} loop (20000 values)', lambda: [reference(v) for v in values], 5)
+    print(f'  normcdf(-30) {function_list["normcdf"](-30.0):.16e}, NormalDist {normal.cdf(-30.0):.16e}')
+
+def bench_multiarg():
+    ''' Multi-argument primitives against the single argument expressions they replace '''
+    print('multi-argument calls, compiled')
+    for direct, workaround in (('hypot(x, y)', 'sqrt(x^2 + y^2)'), ('atan2(y, x)', 'atan(y / x)'), ('fma(x, y, 1)', 'x * y + 1')):
+        a = bench(f'  {direct}', lambda: Parse(direct, fold=False).compile()(x=1.5, y=2.5), 2000)
+        b = bench(f'  {workaround}', lambda: Parse(workaround, fold=False).compile()(x=1.5, y=2.5), 2000)
+        print(f'  speedup {b / a:.2f}x')
+
+def bench_sequences():
+    ''' Streaming reductions over lazy ranges, one value at a time and in vectorized chunks '''
+    import tracemalloc
+    from functions import function_list
+    print('reductions over range(1, 10^6)')
+    expression = 'fsum(sin(k) / k for k in range(1, 10^6))'
+    scalar = bench('  scalar', lambda: Parse(expression).evaluate(), 1)
+    vector = bench('  vectorized chunks', lambda: Parse(expression, vectorize=True).evaluate(), 1)
+    print(f'  speedup {scalar / vector:.2f}x')
+    values = [0.1] * 100000 + [1e16, 1.0, -1e16]
+    bench('  fsum of 100003 floats', lambda: function_list['fsum'](values), 5)
+    print(f'  error {function_list["fsum"](values) - math.fsum(values)!r}, python sum error {sum(values) - math.fsum(values)!r}')
+    tracemalloc.start()
+    Parse('fsum(k for k in range(1, 10^6))').evaluate()
+    print(f'  peak memory streaming 10^6 values {tracemalloc.get_traced_memory()[1] / 1024:.0f} KiB')
+    tracemalloc.stop()
+
+def bench_series():
+    ''' Series operators against the equivalent expression strings and plain partial sums '''
+    print('series operators')
+    written = ' + '.join(f'1 / {k}^2' for k in range(1, 201))
+    bench('  200 terms written out', lambda: Parse(written, fold=False).evaluate(), 5)
+    bench('  sum(k, 1, 200, 1/k^2)', lambda: Parse('sum(k, 1, 200, 1/k^2)').evaluate(), 5)
+    bench('  sum(k, 1, 10^9, k^3 + 2 k), closed form', lambda: Parse('sum(k, 1, 10^9, k^3 + 2 * k)').evaluate(), 1000)
+    for body, exact in (('1/k^2', math.pi ** 2 / 6), ('1/k^1.5', 2.612375348685488), ('(0-1)^(k+1)/k', math.log(2))):
+        value = Parse(f'sum(k, 1, inf, {body})').evaluate()
+        bench(f'  sum(k, 1, inf, {body})', lambda: Parse(f'sum(k, 1, inf, {body})').evaluate(), 5)
+        print(f'  relative error {abs(value - exact) / exact:.1e}, plain partial sum of 10^6 terms {abs(math.fsum(eval(body.replace("^", "**")) for k in range(1, 10 ** 6)) - exact) / exact:.1e}')
+
+def bench_calculus():
+    ''' Built-in integrate and solve against scripting them over re-parsed expression strings '''
+    print('calculus built-ins')
+    exact = math.sqrt(math.pi) / 2 * math.erf(2)
+    def simpson(n=1000):
+        h = 2 / n
+        f = lambda x: Parse(f'exp(0 - {x!r}^2)', fold=False).evaluate()
+        return h / 3 * (f(0) + f(2) + sum((4 if i % 2 else 2) * f(i * h) for i in range(1, n)))
+    bench('  Simpson, 1001 re-parsed points', simpson, 5)
+    bench('  integrate(x, 0, 2, exp(0 - x^2))', lambda: Parse('integrate(x, 0, 2, exp(0 - x^2))').evaluate(), 100)
+    value, stats = Parse('exp(0 - x^2)').integrate('x', 0, 2)
+    print(f'  relative error {abs(value - exact) / exact:.1e} from {stats["evaluations"]} evaluations, Simpson {abs(simpson() - exact) / exact:.1e}')
+    def bisect(lo=1.0, hi=2.0):
+        for _ in range(52):
+            mid = (lo + hi) / 2
+            if Parse(f'{mid!r}^3 - 2 * {mid!r} - 5', fold=False).evaluate() < 0:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+    bench('  bisection, 52 re-parsed points', bisect, 20)
+    bench('  solve(x, 2, 3, x^3 - 2 * x - 5)', lambda: Parse('solve(x, 2, 3, x^3 - 2 * x - 5)').evaluate(), 100)
+    print(f'  {Parse("x^3 - 2 * x - 5").solve("x", 2, 3)[1]}')
+
+class ClimbParse(Parse):
+    ''' The recursive precedence climbing the parser used before its explicit stacks, one call per nesting level '''
+
+    def parse(self):
+        node = self.climb()
+        kind, t, offset = self.token
+        if kind != 'end':
+            raise ParseError(f'Unexpected {str(t)!r} at offset {offset}')
+        return node
+
+    def climb(self, floor=0):
+        ''' Parse the operators binding at least as tight as floor, one loop iteration per operator.
+        Precedence and associativity come from the symbols table '''
+        entry = symbols.get(self.token[1])
+        if entry is not None and entry[1] == 'prefix':
+            op = self.eat()
+            node = ('unary', op, self.climb(entry[0]))
+        else:
+            node = self.factor()
+
+        # The token is read in place rather than through peek, this loop runs once per operator
+        tokens = self.tokens
+        while True:
+            op = self.token[1]
+            entry = symbols.get(op)
+            if entry is None:
+                break
+            power, kind = entry
+            if power < floor or kind == 'prefix':
+                break
+            self.token = next(tokens)
+            if kind == 'postfix':
+                node = ('postfix', op, node)
+            else:
+                # Left associative operators only take tighter operators on their right
+                right = self.climb(power + 1 if kind == 'left' else power)
+                node = ('symbol', '^' if op == '**' else op, node, right)
+        return node
+
+    def sequence(self):
+        ''' Parse an expression, mapped over a sequence when followed by for name in ... '''
+        node = self.climb()
+        if self.peek() != 'for':
+            return node
+        self.eat()
+        kind, name, _ = self.token
+        self.eat()
+        if kind != 'name':
+            raise ParseError(f"Expected a variable name after 'for', got {str(name)!r}")
+        if self.eat() != 'in':
+            raise ParseError(f"Expected 'in' after 'for {name}'")
+        return ('map', name, node, self.climb())
+
+    def binding(self, t):
+        ''' Parse name(variable, ...) for the forms that bind a variable '''
+        if self.eat() != '(':
+            raise ParseError(f"'{t}' must be followed by '('")
+        kind, name, _ = self.token
+        self.eat()
+        if kind != 'name':
+            series = t in ('sum', 'product')
+            raise ParseError(f"Expected the {'index ' if series else ''}variable of '{t}', got {str(name)!r}")
+        args = []
+        while self.peek() == ',':
+            self.eat()
+            args.append(self.climb())
+        if self.eat() != ')':
+            raise ParseError(f"Missing ')' after the arguments of '{t}'")
+        return self._binding(t, name, args)
+
+    def factor(self):
+        ''' Parse numbers, names and parenthesized expressions, by the kind the scanner gave the token '''
+        kind, t, offset = self.token
+        self.token = next(self.tokens)
+        # Numbers are the most common primary and arrive already converted
+        if kind == 'num':
+            return ('num', t)
+
+        if kind == 'function':
+            # Arguments are separated by commas and counted once here
+            if self.eat() != '(':
+                raise ParseError(f"Function '{t}' must be followed by '('")
+            args = [] if self.peek() == ')' else [self.sequence()]
+            while self.peek() == ',':
+                self.eat()
+                args.append(self.sequence())
+            if self.eat() != ')':
+                raise ParseError(f"Missing ')' after the arguments of '{t}'")
+            return self._function(t, args)
+
+        if kind == 'constant':
+            return ('num', self.constants[t])
+
+        if kind == 'name':
+            if t in ('sum', 'product', 'integrate', 'solve', 'minimize'):
+                return self.binding(t)
+            # any other name is a free variable
+            return ('var', t)
+
+        if t == '(':
+            n = self.sequence()
+            if self.token[1] != ')':
+                raise ParseError(f"Missing ')' for the '(' at offset {offset}")
+            self.eat()
+            return n
+
+        # Skip symbol
+        if t in ('£', '$'):
+            return self.factor()
+
+        if kind == 'end':
+            raise ParseError(f'Unexpected end of expression at offset {offset}')
+        raise ParseError(f'Unexpected {str(t)!r} at offset {offset}')
+
+class DescentParse(ClimbParse):
+    ''' The recursive descent the parser used before it climbed the symbols table, one call per precedence level '''
+
+    def _exp(self, symbols, func):
+        ''' Generic expression parser for left-associative binary operations '''
+        node = func()
+        while self.peek() in symbols:
+            op = self.eat()
+            node = ('symbol', op, node, func())
+        return node
+    
+    def logical_or(self):
+        ''' Parse logical OR '''
+        return self._exp(('||',), self.logical_and)
+
+    def logical_and(self):
+        ''' Parse logical AND '''
+        return self._exp(('&&',), self.comparison)
+    
+    def comparison(self):
+        return self._exp(('<', '<=', '>', '>=', '==', '!=', '===', '!==', '<==', '>=='), self.bitor)
+
+    def bitor(self):
+        ''' Parse bitwise OR '''
+        return self._exp(('|',), self.bitxor)
+
+    def bitxor(self):
+        ''' Parse bitwise XOR '''
+        return self._exp(('xor', 'XOR'), self.bitand)
+
+    def bitand(self):
+        ''' Parse bitwise AND '''
+        return self._exp(('&',), self.shift)
+
+    def shift(self):
+        ''' Parse bitwise shifts '''
+        return self._exp(('<<', '>>'), self.expr)
+
+    def expr(self):
+        ''' Parse add and subtract '''
+        return self._exp(('+', '-'), self.term)
+
+    def term(self):
+        ''' Parse multiply and divide '''
+        return self._exp(('*', '/', '//', '%', '.'), self.percomb)
+
+    def percomb(self):
+        ''' Parse permutations and combinations '''
+        return self._exp(('P', 'C'), self.power)
+
+    def power(self):
+        ''' Raise to the power '''
+        node = self.prefix()
+        if self.peek() in ('^', '**'):
+            self.eat()
+            node = ('symbol', '^', node, self.power())
+        return node
+
+    def prefix(self):
+        if self.peek() == '~':
+            self.eat()
+            return ('unary', '~', self.prefix())
+        return self.postfix()
+
+    def postfix(self):
+        ''' Parse postfix operators like factorial '''
+        node = self.factor()
+        while self.peek() in ('!','$', '£'):
+            op = self.eat()
+            node = ('postfix', op, node)
+        return node
+
+    def climb(self, floor=0):
+        return self.logical_or()
+
+def bench_parser():
+    ''' Parse throughput of the explicit stack parser against the recursive climbing and descent before it '''
+    print('parser')
+    long_expressions = {
+        'sums': ' + '.join(f'{i} * x - y / {i}' for i in range(1, 500)),
+        'mixed': ' + '.join(f'(x^{i % 5} < {i} && y | {i}) * sin(x) - {i}!' for i in range(1, 200)),
+        'literals': ' + '.join(str(i) for i in range(2000)),
+        'nested': '(' * 20 + ' + '.join(f'sin({i} * (x - {i}))' for i in range(500)) + ')' * 20,
+    }
+    for label, expression in long_expressions.items():
+        count = sum(1 for _ in takewhile(lambda token: token[0] != 'end', Parse('0').tokenize(expression)))
+        times = []
+        for cls in (DescentParse, ClimbParse, Parse):
+            parser = cls('0')
+            def parse():
+                parser.tokens = parser.tokenize(expression)
+                parser.token = next(parser.tokens)
+                return parser.parse()
+            times.append(bench(f'  {cls.__name__:<13} {label}, {count} tokens', parse, 20))
+        print(f'  speedup {times[0] / times[2]:.2f}x over descent, {times[1] / times[2]:.2f}x over climbing, {count / times[2] / 1e6:.2f}M tokens/s')
+
+def bench_nodestore():
+    ''' Memory per node and evaluation time of compact node stores against tuple ASTs of long expressions '''
+    print('node store')
+    n = 50000
+    generated = {
+        'repeated terms': ' + '.join(f'{i % 100} * x' for i in range(n)),
+        'distinct terms': ' + '.join(f'{i}.5 * x^{i % 7} - sin(y)' for i in range(n)),
+        'logic': ' || '.join(f'(x < {i % 50} && y > {i})' for i in range(n)),
+    }
+    for label, expression in generated.items():
+        nodes = len(Parse(expression, fold=False, compact=True).store)
+        print(f'  {label}, {nodes} nodes')
+        for compact in (False, True):
+            Parse.cache.clear()
+            tracemalloc.start()
+            parsed = Parse(expression, fold=False, compact=compact)
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            name = 'node store' if compact else 'tuples'
+            evaluate = lambda: parsed.evaluate(x=1.5, y=2.0)
+            bench(f'  {name:<10} {retained / nodes:6.1f} bytes/node, {peak / nodes:6.1f} peak', evaluate, 5)
+
+def bench_sharing():
+    ''' Evaluation with identical subexpressions merged and evaluated once, against evaluating every occurrence '''
+    print('common subexpressions')
+    templates = {
+        'README': 'sqrt(2)^2 + sqrt(2) - (2 - sqrt(2))',
+        'repeated blocks': ' + '.join(f'ln(exp(sin(x) * cos(y) + {i % 4})) * ln(exp(sin(x) * cos(y) + {i % 4}))' for i in range(100)),
+        'no repeats': ' + '.join(f'{i} * x - y / {i}' for i in range(1, 200)),
+    }
+    for label, expression in templates.items():
+        times = []
+        for share in (False, True):
+            def parse():
+                Parse.cache.clear()
+                return Parse(expression, fold=False, share=share)
+            bench(f'  {label:<16} parse {"shared" if share else "every node"}', parse, 20)
+            parsed = Parse(expression, fold=False, share=share)
+            times.append(bench(f'  {label:<16} {"shared" if share else "every node"}', lambda: parsed.evaluate(x=1.5, y=2.0), 200))
+        print(f'  {parsed.sharing}, speedup {times[0] / times[1]:.2f}x')
+
+def bench_deep():
+    ''' Parse and evaluate a million node expressions nested far past the recursion limit '''
+    print('deep expressions')
+    n = 500000
+    deep = {
+        'brackets': '(' * n + 'x' + ')' * n,
+        'right nested ^': ' ^ '.join(['x'] * n),
+        'left nested +': ' + '.join(['x'] * n),
+        'right nested +': '(x + ' * n + 'x' + ')' * n,
+    }
+    for label, expression in deep.items():
+        Parse.cache.clear()
+        start = time.perf_counter()
+        parsed = Parse(expression)
+        middle = time.perf_counter()
+        parsed.evaluate(x=1)
+        print(f'  {label:<16} parse {middle - start:6.2f} s, evaluate {time.perf_counter() - middle:6.2f} s')
+
+def bench_scanner():
+    ''' The lazy scanner against the regex tokenizer it replaced on multi-megabyte expressions, time and peak memory '''
+    print('scanner')
+    pattern = re.compile(r'\d+\.\d+|\d+|[a-zA-Z][a-zA-Z0-9]*|&&|\|\||!==|===|<==|>==|<=|>=|==|!=|<<|>>|//|\*\*|[<>]|[+*/(),!$£%\-\^\.&\|~]')
+    parser = Parse('0')
+    generated = {
+        'terms': ' + '.join(f'({i} * x - sin(y) / {i}.5) ^ 2' for i in range(100000)),
+        'literals': ' + '.join(str(i) for i in range(500000)),
+    }
+    for label, expression in generated.items():
+        def findall():
+            # The old tokenizer left numbers and names as text, convert and classify them as the parser did
+            for t in pattern.findall(expression):
+                if t[0].isdigit():
+                    decimal.Decimal(t) if '.' in t else int(t)
+                else:
+                    t in parser.functions or t in parser.constants
+        def scanner():
+            for token in parser.tokenize(expression):
+                if token[0] == 'end':
+                    break
+        print(f'  {label}, {len(expression) / 1e6:.1f} MB')
+        for name, func in (('findall', findall), ('scanner', scanner)):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            # Traced separately, tracing slows every allocation
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'  {name:<10} {elapsed:8.3f} s {peak / 1e6:10.2f} MB peak')
+        start = time.perf_counter()
+        parser.tokens = parser.tokenize(expression)
+        parser.token = next(parser.tokens)
+        parser.parse()
+        print(f'  scan and parse {time.perf_counter() - start:4.3f} s')
+
+if __name__ == '__main__':
+    bench_compiled()
+    bench_folding()
+    bench_batch()
+    bench_kernels()
+    bench_factorials()
+    bench_bigint()
+    bench_trig()
+    report_accuracy()
+    bench_types()
+    bench_precision()
+    bench_adaptive()
+    bench_memo()
+    bench_lgamma()
+    bench_normal()
+    bench_multiarg()
+    bench_sequences()
+    bench_series()
+    bench_calculus()
+    bench_parser()
+    bench_scanner()
+    bench_deep()
+    bench_nodestore()
+    bench_sharing()
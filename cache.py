@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        ''' Return the cached value for key, marking it as most recently used '''
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        ''' Store value under key, evicting the least recently used entries '''
+        with self.lock:
+            if self.maxsize <= 0:
+                return
+            self.data[key] = value
+            self.data.move_to_end(key)
+            self._trim()
+
+    def resize(self, maxsize):
+        ''' Change the maximum number of entries, evicting if necessary '''
+        with self.lock:
+            self.maxsize = maxsize
+            self._trim()
+
+    def clear(self):
+        ''' Remove every entry and reset the counters '''
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        ''' Return hit, miss and eviction counters '''
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def _trim(self):
+        while len(self.data) > max(self.maxsize, 0):
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
@@ -0,0 +1,744 @@
+import math, heapq
+from functions import functions as scalar, function_list, operators, conversions, constants
+from optimizer import free_variables, infer_types
+from sequences import Mapped
+
+# Gauss-Kronrod 7-15 abscissae on [-1, 1] from the outside in, the last one the centre
+GK_NODES = [
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.0,
+]
+GK_WEIGHTS = [
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714,
+]
+# Weights of the embedded 7 point Gauss rule on the odd abscissae and the centre
+GAUSS_WEIGHTS = [
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327,
+]
+# Intervals the adaptive Gauss-Kronrod rule splits into before tanh-sinh takes over
+MAX_INTERVALS = 2000
+# Times tanh-sinh halves its step, and the largest t it sums out to
+TANH_SINH_LEVELS = 10
+TANH_SINH_LIMIT = 6.5
+# Relative tolerance of integrals
+TOLERANCE = 1e-12
+# Error estimates under this fraction of the integral of |f| are rounding noise
+ROUNDOFF = 50 * 2.0 ** -52
+EPSILON = 2.0 ** -52
+SQRT_EPSILON = 2.0 ** -26
+# Intervals are not split below this width, their nodes would underflow
+SMALLEST = 2.0 ** -960
+MAX_ITERATIONS = 200
+# Absolute resolution of minimize, for minima at or near zero
+RESOLUTION = 1e-10
+# (3 - sqrt(5)) / 2, the golden section step of Brent's minimizer
+GOLDEN = 0.3819660112501051
+HALF_PI = 1.5707963267948966
+
+INF = float('inf')
+
+def _fn(name):
+    return function_list[name]
+
+# Step functions, their derivative is zero wherever it exists
+STEP_FUNCTIONS = {
+    'ceil', 'floor', 'trunc', 'sgn', 'factorial', 'gcd', 'lcm', 'isqrt',
+    'isnan', 'isinf', 'isfinite', 'isclose', 'range',
+}
+# Reductions of sequences, differentiated element by element
+REDUCTIONS = {'fsum', 'prod', 'sumprod', 'dist'}
+
+# f'(x) given x and f(x), a tuple for the functions returning one
+derivatives = {
+    'sin': lambda x, r: _fn('cos')(x),
+    'cos': lambda x, r: -_fn('sin')(x),
+    'sincos': lambda x, r: (r[1], -r[0]),
+    'tan': lambda x, r: 1 + r * r,
+    'cot': lambda x, r: -(1 + r * r),
+    'sec': lambda x, r: r * _fn('tan')(x),
+    'csc': lambda x, r: -r / _fn('tan')(x),
+    'cosec': lambda x, r: -r / _fn('tan')(x),
+    'sinh': lambda x, r: _fn('cosh')(x),
+    'cosh': lambda x, r: _fn('sinh')(x),
+    'tanh': lambda x, r: 1 - r * r,
+    'asin': lambda x, r: 1 / _fn('sqrt')(1 - x * x),
+    'arcsin': lambda x, r: 1 / _fn('sqrt')(1 - x * x),
+    'acos': lambda x, r: -1 / _fn('sqrt')(1 - x * x),
+    'arccos': lambda x, r: -1 / _fn('sqrt')(1 - x * x),
+    'atan': lambda x, r: 1 / (1 + x * x),
+    'arctan': lambda x, r: 1 / (1 + x * x),
+    'asinh': lambda x, r: 1 / _fn('sqrt')(1 + x * x),
+    'acosh': lambda x, r: 1 / _fn('sqrt')(x * x - 1),
+    'atanh': lambda x, r: 1 / (1 - x * x),
+    'exp': lambda x, r: r,
+    'expm1': lambda x, r: r + 1,
+    'exp2': lambda x, r: r * constants['ln2'],
+    'ln': lambda x, r: 1 / x,
+    'log': lambda x, r: 1 / x,
+    'log10': lambda x, r: 1 / (x * constants['ln10']),
+    'lg': lambda x, r: 1 / (x * constants['ln10']),
+    'log2': lambda x, r: 1 / (x * constants['ln2']),
+    'log1p': lambda x, r: 1 / (1 + x),
+    'sqrt': lambda x, r: 0.5 / r,
+    'cbrt': lambda x, r: 1 / (3 * r * r),
+    'erf': lambda x, r: 2 / scalar.SQRT_PI * _fn('exp')(-x * x),
+    'erfc': lambda x, r: -2 / scalar.SQRT_PI * _fn('exp')(-x * x),
+    'abs': lambda x, r: _fn('sgn')(x),
+    'fabs': lambda x, r: _fn('sgn')(x),
+    'radians': lambda x, r: constants['pi'] / 180,
+    'degrees': lambda x, r: 180 / constants['pi'],
+    'gamma': lambda x, r: r * scalar._digamma(x),
+    'lgamma': lambda x, r: scalar._digamma(x),
+    'modf': lambda x, r: (1.0, 0.0),
+}
+
+def _normal_partials(r, x, mu, sigma, density):
+    ''' Partials of normpdf and normcdf in x, mu and sigma '''
+    z = (x - mu) / sigma
+    if density:
+        return -z * r / sigma, z * r / sigma, r * (z * z - 1) / sigma
+    p = _fn('normpdf')(x, mu, sigma)
+    return p, -p, -z * p
+
+def _combinatoric_partials(r, n, k, comb):
+    ''' Partials of perm and comb in n and k from the digamma function '''
+    # Integer functions keep their Decimal literals, the partials are taken in floats
+    n, k = float(n), float(k)
+    dn = scalar._digamma(n + 1) - scalar._digamma(n - k + 1)
+    dk = scalar._digamma(n - k + 1)
+    if comb:
+        dk -= scalar._digamma(k + 1)
+    return r * dn, r * dk
+
+# Partial derivatives in every argument given f and the arguments, the statistics functions
+# take their defaults when mu and sigma are left out
+partials = {
+    'atan2': lambda r, y, x: (x / (x * x + y * y), -y / (x * x + y * y)),
+    'hypot': lambda r, x, y: (x / r, y / r),
+    'copysign': lambda r, x, y: (math.copysign(1.0, x) * math.copysign(1.0, y), 0.0),
+    'ldexp': lambda r, x, i: (2.0 ** i, 0.0),
+    'fma': lambda r, a, b, c: (b, a, 1.0),
+    'pow': lambda r, x, y: (y * x ** (y - 1), r * _fn('ln')(x) if r else 0.0),
+    'fmod': lambda r, x, y: (1.0, -float(_fn('trunc')(x / y))),
+    'remainder': lambda r, x, y: (1.0, -float(round(x / y))),
+    'perm': lambda r, n, k: _combinatoric_partials(r, n, k, False),
+    'comb': lambda r, n, k: _combinatoric_partials(r, n, k, True),
+    'normpdf': lambda r, x, mu=0.0, sigma=1.0: _normal_partials(r, x, mu, sigma, True),
+    'normcdf': lambda r, x, mu=0.0, sigma=1.0: _normal_partials(r, x, mu, sigma, False),
+    'invnorm': lambda r, p, mu=0.0, sigma=1.0: (sigma / _fn('normpdf')((r - mu) / sigma), 1.0, (r - mu) / sigma),
+}
+partials['P'] = partials['perm']
+partials['C'] = partials['comb']
+
+def _scale(d, dx):
+    ''' Chain rule, element by element for the functions returning a tuple '''
+    if isinstance(d, tuple):
+        return tuple(di * dx for di in d)
+    return d * dx
+
+def _equation(body):
+    ''' An equation left == right is solved as left - right = 0 '''
+    if body[0] == 'symbol' and body[1] == '==':
+        return infer_types(('symbol', '-', body[2], body[3]))[0]
+    return body
+
+class ForwardMode:
+    ''' An AST compiled into closures returning its value and its derivative in one variable '''
+
+    def __init__(self, name, compile, functions=function_list, operators=operators):
+        # Subtrees without the variable run as the plain compiled closures with a zero derivative
+        self.name = name
+        self.plain = compile
+        self.functions = functions
+        self.operators = operators
+
+    def _constant(self, node):
+        fn = self.plain(node)
+        return lambda v: (fn(v), 0.0)
+
+    def compile(self, node):
+        ''' Turn an AST node into a closure taking the variable mapping and returning (value, derivative) '''
+        name = self.name
+        if name not in free_variables(node):
+            return self._constant(node)
+        kind = node[0]
+
+        if kind == 'var':
+            return lambda v: (v[name], 1.0)
+
+        if kind == 'function':
+            fname = node[1]
+            fn = self.functions[fname]
+            args = [self.compile(arg) for arg in node[2:]]
+            if fname in REDUCTIONS:
+                return self._reduction(fname, args)
+            if fname in STEP_FUNCTIONS:
+                return lambda v: (fn(*[arg(v)[0] for arg in args]), 0.0)
+            if len(args) == 1 and fname in derivatives:
+                arg, rule = args[0], derivatives[fname]
+                def unary(v):
+                    x, dx = arg(v)
+                    r = fn(x)
+                    return r, _scale(rule(x, r), dx) if dx else 0.0
+                return unary
+            if fname in partials:
+                rule = partials[fname]
+                def call(v):
+                    pairs = [arg(v) for arg in args]
+                    xs = [x for x, _ in pairs]
+                    r = fn(*xs)
+                    return r, sum((dx * p for (_, dx), p in zip(pairs, rule(r, *xs)) if dx), 0.0)
+                return call
+            raise ValueError(f"No derivative rule for '{fname}'")
+
+        if kind == 'map':
+            _, var, body, source = node
+            # Elements are (value, derivative) pairs, None in place of the derivative marks them
+            body = self._constant(body) if var == name else self.compile(body)
+            source = self.compile(source)
+            return lambda v: (Mapped(var, body, source(v)[0], v), None)
+
+        if kind == 'series':
+            return self._series(node)
+
+        if kind == 'calculus':
+            return self._calculus(node)
+
+        if kind == 'postfix':
+            _, op, inner = node
+            inner = self.compile(inner)
+            if op == '!':
+                fn = self.functions['factorial']
+                return lambda v: (fn(inner(v)[0]), 0.0)
+            return inner
+
+        if kind == 'convert':
+            inner = self.compile(node[2])
+            fn = conversions[node[1]]
+            def convert(v):
+                x, dx = inner(v)
+                return fn(x), dx
+            return convert
+
+        if kind == 'unary':
+            inner = self.compile(node[2])
+            fn = self.operators['~']
+            return lambda v: (fn(inner(v)[0]), 0.0)
+
+        _, op, left, right = node
+        a = self.compile(left)
+        b = self.compile(right)
+
+        if op == '&&':
+            def both(v):
+                x = a(v)
+                return b(v) if x[0] else x
+            return both
+        if op == '||':
+            def either(v):
+                x = a(v)
+                return x if x[0] else b(v)
+            return either
+
+        fn = self.operators[op]
+        if op in ('+', '-'):
+            sign = 1 if op == '+' else -1
+            def add(v):
+                (x, dx), (y, dy) = a(v), b(v)
+                return fn(x, y), dx + sign * dy
+            return add
+        if op in ('*', '.'):
+            def multiply(v):
+                (x, dx), (y, dy) = a(v), b(v)
+                return x * y, dx * y + x * dy
+            return multiply
+        if op == '/':
+            def divide(v):
+                (x, dx), (y, dy) = a(v), b(v)
+                r = x / y
+                return r, (dx - r * dy) / y
+            return divide
+        if op == '^':
+            ln = self.functions['ln']
+            def power(v):
+                (x, dx), (y, dy) = a(v), b(v)
+                r = x ** y
+                d = y * x ** (y - 1) * dx if dx else 0.0
+                # x^y = exp(y ln x) in the exponent, which has no derivative for x <= 0 unless x^y is 0
+                if dy and r:
+                    d += r * ln(x) * dy
+                return r, d
+            return power
+        if op == '%':
+            def modulo(v):
+                (x, dx), (y, dy) = a(v), b(v)
+                return fn(x, y), dx - (x // y) * dy
+            return modulo
+        if op in partials:
+            rule = partials[op]
+            def combinatoric(v):
+                (x, dx), (y, dy) = a(v), b(v)
+                r = fn(x, y)
+                p, q = rule(r, x, y)
+                return r, (p * dx if dx else 0.0) + (q * dy if dy else 0.0)
+            return combinatoric
+        # Floor division, comparisons and bitwise operators are piecewise constant
+        return lambda v: (fn(a(v)[0], b(v)[0]), 0.0)
+
+    def _reduction(self, fname, args):
+        ''' fsum, prod, sumprod and dist over sequences, differentiated element by element '''
+        fsum = self.functions['fsum']
+        sqrt = self.functions['sqrt']
+
+        def pairs(arg, v):
+            value, d = arg(v)
+            return value if d is None else ((x, 0.0) for x in value)
+
+        if fname == 'fsum':
+            def total(v):
+                d = [0.0]
+                def values():
+                    for x, dx in pairs(args[0], v):
+                        d[0] += dx
+                        yield x
+                return fsum(values()), d[0]
+            return total
+
+        if fname == 'prod':
+            def product(v):
+                r, d = 1, 0.0
+                for x, dx in pairs(args[0], v):
+                    r, d = r * x, d * x + r * dx
+                return r, d
+            return product
+
+        if fname == 'sumprod':
+            def dot(v):
+                r, d = 0, 0.0
+                for (x, dx), (y, dy) in zip(pairs(args[0], v), pairs(args[1], v)):
+                    r += x * y
+                    d += dx * y + x * dy
+                return r, d
+            return dot
+
+        def distance(v):
+            s, d = 0, 0.0
+            for (x, dx), (y, dy) in zip(pairs(args[0], v), pairs(args[1], v)):
+                s += (x - y) * (x - y)
+                d += (x - y) * (dx - dy)
+            r = sqrt(s)
+            return r, d / r if r else 0.0
+        return distance
+
+    def _series(self, node):
+        ''' Finite sums and products term by term, infinite ones have no derivative '''
+        _, op, var, lo, hi, body, *_ = node
+        if var == self.name:
+            # The variable only reaches the integer bounds
+            return self._constant(node)
+        lo, hi = self.plain(lo), self.plain(hi)
+        body = self.compile(body)
+        product = op == 'product'
+
+        def series(v):
+            first, last = lo(v), hi(v)
+            if last == INF:
+                raise ValueError(f'Infinite {op} has no derivative')
+            scope = dict(v)
+            r, d = (1, 0.0) if product else (0, 0.0)
+            for k in range(int(first), int(last) + 1):
+                scope[var] = k
+                x, dx = body(scope)
+                if product:
+                    r, d = r * x, d * x + r * dx
+                else:
+                    r, d = r + x, d + dx
+            return r, d
+        return series
+
+    def _calculus(self, node):
+        ''' Integrals by the Leibniz rule and roots by implicit differentiation '''
+        _, op, var, body, *args = node
+        if op == 'minimize':
+            raise ValueError("No derivative rule for 'minimize'")
+
+        if op == 'solve':
+            body = _equation(body)
+            calculus = Calculus(var, body, self.plain, self.functions, self.operators)
+            points = [self.plain(arg) for arg in args]
+            # At the root g(x, t) = 0, so dx/dt = -g_t / g_x
+            slope = ForwardMode(var, self.plain, self.functions, self.operators).compile(body)
+            shift = self._constant(body) if var == self.name else self.compile(body)
+            def root(v):
+                r = calculus.solve(v, *[point(v) for point in points])
+                scope = {**v, var: r}
+                return r, -shift(scope)[1] / slope(scope)[1]
+            return root
+
+        value = self.plain(body)
+        inner = None if var == self.name or self.name not in free_variables(body) else self.compile(body)
+        a, b = self.compile(args[0]), self.compile(args[1])
+        tol = self.plain(args[2]) if len(args) > 2 else lambda v: None
+
+        def integral(v):
+            (lo, dlo), (hi, dhi), t = a(v), b(v), tol(v)
+            scope = dict(v)
+            def f(x):
+                scope[var] = x
+                return value(scope)
+            r = quadrature(f, lo, hi, t)
+            d = 0.0
+            if inner is not None:
+                def g(x):
+                    scope[var] = x
+                    return inner(scope)[1]
+                d = quadrature(g, lo, hi, t)
+            if dhi:
+                d += f(hi) * dhi
+            if dlo:
+                d -= f(lo) * dlo
+            return r, d
+        return integral
+
+def _finite(f, a, b):
+    ''' Map an infinite range onto a finite one, x = a + t / (1 - t), its mirror or x = t / (1 - t^2) '''
+    if a > -INF and b < INF:
+        return f, a, b
+    if a > -INF:
+        return (lambda t: f(a + t / (1 - t)) / ((1 - t) * (1 - t))), 0.0, 1.0
+    if b < INF:
+        return (lambda t: f(b - (1 - t) / t) / (t * t)), 0.0, 1.0
+    return (lambda t: f(t / (1 - t * t)) * (1 + t * t) / ((1 - t * t) * (1 - t * t))), -1.0, 1.0
+
+def _kronrod(f, a, b):
+    ''' Kronrod 15 point estimate on [a, b], its distance from the embedded Gauss rule and the integral of |f| '''
+    c, h = 0.5 * (a + b), 0.5 * (b - a)
+    fc = f(c)
+    k, g, s = fc * GK_WEIGHTS[7], fc * GAUSS_WEIGHTS[3], abs(fc) * GK_WEIGHTS[7]
+    for j in range(7):
+        d = h * GK_NODES[j]
+        f1, f2 = f(c - d), f(c + d)
+        k += GK_WEIGHTS[j] * (f1 + f2)
+        s += GK_WEIGHTS[j] * (abs(f1) + abs(f2))
+        if j & 1:
+            g += GAUSS_WEIGHTS[j >> 1] * (f1 + f2)
+    return k * h, abs(k - g) * h, s * h
+
+def _converged(value, error, scale, tol):
+    return error <= max(tol * abs(value), ROUNDOFF * scale)
+
+def _gauss_kronrod(f, a, b, tol, stats):
+    ''' Adaptive Gauss-Kronrod, always halving the interval with the largest error estimate '''
+    value, error, scale = _kronrod(f, a, b)
+    heap = [(-error, a, b, value, scale)]
+    while not _converged(value, error, scale, tol) and len(heap) < MAX_INTERVALS:
+        e, lo, hi, v, s = heapq.heappop(heap)
+        mid = 0.5 * (lo + hi)
+        if hi - lo <= 1024 * EPSILON * max(abs(lo), abs(hi), SMALLEST):
+            # A few hundred floats wide, the outer nodes would round onto the ends
+            heapq.heappush(heap, (e, lo, hi, v, s))
+            break
+        for interval in ((lo, mid), (mid, hi)):
+            v1, e1, s1 = _kronrod(f, *interval)
+            heapq.heappush(heap, (-e1, *interval, v1, s1))
+            value, error, scale = value + v1, error + e1, scale + s1
+        value, error, scale = value - v, error + e, scale - s
+    stats['intervals'] = len(heap)
+    # The running totals drift, the result is summed afresh
+    fsum = _fn('fsum')
+    return fsum(i[3] for i in heap), fsum(-i[0] for i in heap), fsum(i[4] for i in heap)
+
+def _tanh_sinh(f, a, b, tol, stats):
+    ''' Double exponential quadrature, halving the step until two levels agree '''
+    c, h = 0.5 * (a + b), 0.5 * (b - a)
+    sinh, cosh, exp = _fn('sinh'), _fn('cosh'), _fn('exp')
+
+    def pair(t):
+        # Nodes a + d and b - d, d found from exp(-2s) directly so the nodes near a keep their digits
+        q = exp(-2 * HALF_PI * sinh(t))
+        d = 2 * h * q / (1 + q)
+        w = HALF_PI * cosh(t) * 4 * q / ((1 + q) * (1 + q))
+        left, right = a + d, b - d
+        if left == a and right == b:
+            return None
+        fl = f(left) if left != a else 0.0
+        fr = f(right) if right != b else 0.0
+        return w * (fl + fr), w * (abs(fl) + abs(fr))
+
+    fc = f(c)
+    total, scale = HALF_PI * fc, HALF_PI * abs(fc)
+    # Sum out at unit steps until the nodes reach the ends or f fails there, later levels stop at the same t
+    limit, t = 0.0, 1.0
+    while t <= TANH_SINH_LIMIT:
+        try:
+            term = pair(t)
+        except (ArithmeticError, ValueError):
+            break
+        if term is None:
+            break
+        total, scale, limit = total + term[0], scale + term[1], t
+        t += 1
+    step = 1.0
+    value, error = h * total, INF
+    for level in range(1, TANH_SINH_LEVELS + 1):
+        step *= 0.5
+        for i in range(1, int(limit / step) + 1, 2):
+            term = pair(i * step)
+            if term is not None:
+                total, scale = total + term[0], scale + term[1]
+        previous, value = value, h * step * total
+        error = abs(value - previous)
+        stats['levels'] = level
+        if _converged(value, error, h * step * scale, tol):
+            break
+    return value, error, h * step * scale
+
+def quadrature(f, a, b, tol=None, stats=None):
+    ''' Integral of f from a to b by adaptive Gauss-Kronrod, then tanh-sinh if that has not converged '''
+    tol = TOLERANCE if tol is None else tol
+    stats = {} if stats is None else stats
+    a, b = float(a), float(b)
+    if a == b:
+        stats.update(method='gauss-kronrod', intervals=0, error=0.0)
+        return 0.0
+    if a > b:
+        return -quadrature(f, b, a, tol, stats)
+    f, a, b = _finite(f, a, b)
+    value, error, scale = _gauss_kronrod(f, a, b, tol, stats)
+    stats.update(method='gauss-kronrod', error=error)
+    if _converged(value, error, scale, tol):
+        return value
+    # Endpoint singularities and the slow decay left by an infinite range suit tanh-sinh
+    value, error, scale = _tanh_sinh(f, a, b, tol, stats)
+    stats.update(method='tanh-sinh', error=error)
+    if _converged(value, error, scale, tol):
+        return value
+    raise ArithmeticError(f'Integral did not converge to {tol} within {MAX_INTERVALS} intervals')
+
+def _newton(f, df, x, stats):
+    ''' Newton's method from x, secant steps wherever the derivative is unavailable '''
+    previous = None
+    for i in range(MAX_ITERATIONS):
+        stats['iterations'] = i + 1
+        slope = df(x) if df else None
+        fx, d = (f(x), None) if slope is None else slope
+        if fx == 0:
+            return x
+        if d is None:
+            stats['method'] = 'secant'
+            if previous is None:
+                previous = x, fx
+                x += 1e-4 * abs(x) or 1e-4
+                continue
+            d = (fx - previous[1]) / (x - previous[0])
+        if not d:
+            raise ArithmeticError(f'Zero derivative at {x}, no Newton step')
+        step = fx / d
+        previous = x, fx
+        x -= step
+        if not math.isfinite(x):
+            raise ArithmeticError('Newton iteration diverged')
+        if abs(step) <= 4 * EPSILON * abs(x):
+            return x
+    raise ArithmeticError(f'Root not found within {MAX_ITERATIONS} iterations')
+
+def _safeguarded(f, df, lo, hi, flo, stats):
+    ''' Newton's method kept inside the bracket, bisecting when a step leaves it or fails to halve '''
+    # f(neg) < 0 < f(pos) throughout
+    neg, pos = (lo, hi) if flo < 0 else (hi, lo)
+    x = 0.5 * (lo + hi)
+    before = last = abs(hi - lo)
+    for i in range(MAX_ITERATIONS):
+        stats['iterations'] = i + 1
+        slope = df(x)
+        fx, d = (f(x), None) if slope is None else slope
+        if fx == 0:
+            return x
+        if fx < 0:
+            neg = x
+        else:
+            pos = x
+        new = x - fx / d if d else x
+        if d and abs(new - x) <= 2 * EPSILON * abs(x):
+            return new
+        if not (min(neg, pos) < new < max(neg, pos) and 2 * abs(new - x) <= before):
+            new = 0.5 * (neg + pos)
+        before, last = last, abs(new - x)
+        if new == x or last <= 2 * EPSILON * abs(new):
+            return new
+        x = new
+    raise ArithmeticError(f'Root not found within {MAX_ITERATIONS} iterations')
+
+def _brent(f, a, b, fa, fb, stats):
+    ''' Brent's root finder, inverse quadratic and secant steps guarded by bisection '''
+    c, fc = b, fb
+    d = e = b - a
+    for i in range(MAX_ITERATIONS):
+        stats['iterations'] = i + 1
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * EPSILON * abs(b)
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or fb == 0:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p, q = 2 * m * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol or EPSILON * abs(m), m)
+        fb = f(b)
+    raise ArithmeticError(f'Root not found within {MAX_ITERATIONS} iterations')
+
+class Calculus:
+    ''' Integral, root or minimum of body over one variable, the body compiled once for every call '''
+
+    def __init__(self, name, body, compile, functions=function_list, operators=operators):
+        # compile turns an AST into a closure taking the variable mapping
+        self.name = name
+        body = _equation(body)
+        self.body = compile(body)
+        try:
+            self.slope = ForwardMode(name, compile, functions, operators).compile(body)
+        except ValueError:
+            # Some construct has no derivative rule, root finding and minimization go derivative free
+            self.slope = None
+        self.stats = {}
+
+    def _function(self, variables):
+        ''' The body as a function of the variable alone, counting evaluations '''
+        scope, name, body, stats = dict(variables), self.name, self.body, self.stats
+        def f(x):
+            stats['evaluations'] += 1
+            scope[name] = x
+            return body(scope)
+        return f
+
+    def _derivative(self, variables):
+        ''' The body and its derivative as a function of the variable, None where the derivative fails '''
+        if self.slope is None:
+            return None
+        scope, name, slope, stats = dict(variables), self.name, self.slope, self.stats
+        def df(x):
+            stats['derivative_evaluations'] += 1
+            scope[name] = x
+            try:
+                return slope(scope)
+            except (ArithmeticError, ValueError):
+                return None
+        return df
+
+    def evaluate(self, op, variables, *args):
+        ''' Run integrate, solve or minimize by name, as a calculus node does '''
+        return getattr(self, op)(variables, *args)
+
+    def integrate(self, variables, a, b, tol=None):
+        ''' Integral of the body from a to b '''
+        self.stats = {'evaluations': 0}
+        return quadrature(self._function(variables), a, b, tol, self.stats)
+
+    def solve(self, variables, lo, hi=None):
+        ''' Root of the body by Newton's method from lo, or inside the bracket lo, hi '''
+        self.stats = {'evaluations': 0, 'derivative_evaluations': 0, 'iterations': 0, 'method': 'newton'}
+        f, df = self._function(variables), self._derivative(variables)
+        if hi is None:
+            return _newton(f, df, float(lo), self.stats)
+        lo, hi = float(lo), float(hi)
+        flo, fhi = f(lo), f(hi)
+        if flo == 0 or fhi == 0:
+            return lo if flo == 0 else hi
+        if (flo < 0) == (fhi < 0):
+            raise ValueError(f'No sign change between {lo} and {hi} to bracket a root')
+        if df is None:
+            self.stats['method'] = 'brent'
+            return _brent(f, lo, hi, flo, fhi, self.stats)
+        return _safeguarded(f, df, lo, hi, flo, self.stats)
+
+    def minimize(self, variables, lo, hi):
+        ''' Point of the least value of the body between lo and hi by Brent's method, refined on the derivative '''
+        self.stats = {'evaluations': 0, 'derivative_evaluations': 0, 'iterations': 0, 'method': 'brent'}
+        f = self._function(variables)
+        a, b = sorted((float(lo), float(hi)))
+        x = w = v = a + GOLDEN * (b - a)
+        fx = fw = fv = f(x)
+        d = e = 0.0
+        for i in range(MAX_ITERATIONS):
+            self.stats['iterations'] = i + 1
+            m = 0.5 * (a + b)
+            tol = SQRT_EPSILON * abs(x) + RESOLUTION
+            if abs(x - m) <= 2 * tol - 0.5 * (b - a):
+                break
+            parabolic = False
+            if abs(e) > tol:
+                # Parabola through x, w and v
+                r = (x - w) * (fx - fv)
+                q = (x - v) * (fx - fw)
+                p = (x - v) * q - (x - w) * r
+                q = 2 * (q - r)
+                if q > 0:
+                    p = -p
+                q = abs(q)
+                if abs(p) < abs(0.5 * q * e) and q * (a - x) < p < q * (b - x):
+                    e, d = d, p / q
+                    parabolic = True
+                    if x + d - a < 2 * tol or b - x - d < 2 * tol:
+                        d = math.copysign(tol, m - x)
+            if not parabolic:
+                e = (a if x >= m else b) - x
+                d = GOLDEN * e
+            u = x + (d if abs(d) >= tol else math.copysign(tol, d))
+            fu = f(u)
+            if fu <= fx:
+                if u >= x:
+                    a = x
+                else:
+                    b = x
+                v, w, x = w, x, u
+                fv, fw, fx = fw, fx, fu
+            else:
+                if u < x:
+                    a = u
+                else:
+                    b = u
+                if fu <= fw or w == x:
+                    v, w, fv, fw = w, u, fw, fu
+                elif fu <= fv or v == x or v == w:
+                    v, fv = u, fu
+        else:
+            raise ArithmeticError(f'Minimum not found within {MAX_ITERATIONS} iterations')
+        return self._refine(variables, x, fx, a, b)
+
+    def _refine(self, variables, x, fx, a, b):
+        ''' Brent leaves x within sqrt(epsilon), a root of the derivative inside a, b pins it to full precision '''
+        df = self._derivative(variables)
+        if df is None:
+            return x
+        ends = df(a), df(b)
+        if None in ends or (ends[0][1] < 0) == (ends[1][1] < 0):
+            return x
+        slope = lambda t: (df(t) or (0, 0.0))[1]
+        root = _brent(slope, a, b, ends[0][1], ends[1][1], {})
+        return root if self._function(variables)(root) <= fx else x
@@ -0,0 +1,104 @@
+from functions import function_list, operators, conversions
+from precise import precision_context
+from sequences import Mapped
+from series import Series
+from calculus import Calculus
+from vectorized import evaluate_array
+
+class CompiledExpression:
+    ''' An AST compiled into a tree of pre-bound closures '''
+
+    def __init__(self, ast, functions=function_list, operators=operators, precision=None, vectorize=False):
+        self.ast = ast
+        self.functions = functions
+        self.operators = operators
+        self.precision = precision
+        self.vectorize = vectorize and precision is None
+        self.fn = self.compile(ast)
+
+    def compile(self, node):
+        ''' Turn an AST node into a closure taking the variable mapping '''
+        kind = node[0]
+
+        if kind == 'num':
+            value = node[1]
+            return lambda v: value
+
+        if kind == 'var':
+            name = node[1]
+            def variable(v):
+                try:
+                    return v[name]
+                except KeyError:
+                    raise ValueError(f"Variable '{name}' has no value") from None
+            return variable
+
+        if kind == 'function':
+            fn = self.functions[node[1]]
+            args = [self.compile(arg) for arg in node[2:]]
+            if len(args) == 1:
+                arg = args[0]
+                return lambda v: fn(arg(v))
+            if len(args) == 2:
+                a, b = args
+                return lambda v: fn(a(v), b(v))
+            return lambda v: fn(*[arg(v) for arg in args])
+
+        if kind == 'map':
+            _, name, ast, source = node
+            vector = (lambda arrays: evaluate_array(ast, arrays)) if self.vectorize else None
+            body, source = self.compile(ast), self.compile(source)
+            return lambda v: Mapped(name, body, source(v), v, vector)
+
+        if kind == 'series':
+            _, op, name, lo, hi, body, *tol = node
+            series = Series(op, name, body, self.compile, self.functions, self.operators)
+            lo, hi = self.compile(lo), self.compile(hi)
+            tol = self.compile(tol[0]) if tol else lambda v: None
+            return lambda v: series.evaluate(lo(v), hi(v), v, tol(v))
+
+        if kind == 'calculus':
+            if self.precision is not None:
+                raise ValueError('integrate, solve and minimize evaluate in floats, compile without a precision')
+            _, op, name, body, *args = node
+            calculus = Calculus(name, body, self.compile, self.functions, self.operators)
+            args = [self.compile(arg) for arg in args]
+            return lambda v: calculus.evaluate(op, v, *[arg(v) for arg in args])
+
+        if kind == 'postfix':
+            inner = self.compile(node[2])
+            if node[1] == '!':
+                fn = self.functions['factorial']
+                return lambda v: fn(inner(v))
+            return inner
+
+        if kind == 'convert':
+            inner = self.compile(node[2])
+            fn = conversions[node[1]]
+            return lambda v: fn(inner(v))
+
+        if kind == 'unary':
+            inner = self.compile(node[2])
+            fn = self.operators['~']
+            return lambda v: fn(inner(v))
+
+        _, op, left, right = node
+        a = self.compile(left)
+        b = self.compile(right)
+
+        if op == '&&':
+            return lambda v: a(v) and b(v)
+        if op == '||':
+            return lambda v: a(v) or b(v)
+
+        fn = self.operators[op]
+        return lambda v: fn(a(v), b(v))
+
+    def evaluate(self, **variables):
+        ''' Evaluate the compiled expression, free variables are passed as keywords '''
+        if self.precision is None:
+            return self.fn(variables)
+        with precision_context(self.precision):
+            return self.fn(variables)
+
+    __call__ = evaluate
@@ -1,3 +1,8 @@
+import operator, struct, decimal, functools, inspect
+from itertools import zip_longest
+from cache import LRUCache
+from sequences import Range
+
 
 class Func:
     def __init__(self):
@@ -6,12 +11,129 @@ class Func:
         self.TAU = 6.283185307179586
         self.HALF_PI = 1.5707963267948966
         self.QUARTER_PI = 0.7853981633974483
+        # π/2 split into 33 bit pieces so n * PIO2_1 is exact during reduction
+        self.PIO2_1 = 1.5707963267341256
+        self.PIO2_2 = 6.077100506303966e-11
+        self.PIO2_3 = 2.0222662487111665e-21
         self.LN1_1 = 0.09531017980432493
         self.LN2 = 0.6931471805599453
+        self.LN2_HI = 0.6931471806019545
+        self.LN2_LO = -4.2009150726810846e-11
         self.LN10 = 2.302585092994046
         self.SQRT2 = 1.4142135623730951
         self.SQRT_2PI = 2.5066282746310002
         self.TWO_SQRT_PI = 1.1283791670955128
+        self.COMB_SIEVE_LIMIT = 10 ** 7
+        self.LEHMER_BITS = 64
+
+        # Kernel tables and minimax polynomial coefficients, lowest degree first
+        self.LN2_32_HI = 0.021660849393811077
+        self.LN2_32_LO = -1.312785960212839e-12
+        self.SIN_COEFFS = [
+            -0.16666666666666666, 0.008333333333330948, -0.00019841269836758574,
+            2.755731610255244e-06, -2.5051131845003624e-08, 1.5918129294866608e-10,
+        ]
+        self.COS_COEFFS = [
+            0.041666666666666664, -0.0013888888888887398, 2.480158729876569e-05,
+            -2.7557317271729793e-07, 2.08761462684032e-09, -1.1382632425521717e-11,
+        ]
+        self.EXPM1_COEFFS = [
+            0.5, 0.1666666666666667, 0.04166666666666667,
+            0.008333333333326141, 0.0013888888888883752, 0.00019841269874800493,
+            2.4801587325533363e-05, 2.7557255425746435e-06, 2.7557273661348637e-07,
+            2.510520637395701e-08, 2.0914679376583935e-09,
+        ]
+        self.EXP_COEFFS = [
+            0.4999999999976113, 0.16666666666632543, 0.041666829580991785,
+            0.008333356606798872,
+        ]
+        self.EXP_TABLE = [
+            1.0, 1.0218971486541166, 1.0442737824274138,
+            1.0671404006768237, 1.0905077326652577, 1.1143867425958924,
+            1.1387886347566916, 1.1637248587775775, 1.189207115002721,
+            1.215247359980469, 1.241857812073484, 1.2690509571917332,
+            1.2968395546510096, 1.3252366431597413, 1.3542555469368927,
+            1.383909881963832, 1.4142135623730951, 1.4451808069770467,
+            1.4768261459394993, 1.5091644275934228, 1.5422108254079407,
+            1.5759808451078865, 1.6104903319492543, 1.645755478153965,
+            1.681792830507429, 1.718619298122478, 1.7562521603732995,
+            1.7947090750031072, 1.8340080864093424, 1.8741676341103,
+            1.9152065613971474, 1.9571441241754002,
+        ]
+        self.LN_TABLE = [
+            -0.3522205935893521, -0.33024168687057687, -0.3087354816496133,
+            -0.2876820724517809, -0.26706278524904525, -0.24686007793152578,
+            -0.22705745063534608, -0.2076393647782445, -0.18859116980755003,
+            -0.16989903679539747, -0.15154989812720093, -0.13353139262452263,
+            -0.1158318155251217, -0.09844007281325252, -0.0813456394539524,
+            -0.06453852113757118, -0.048009219186360606, -0.0317486983145803,
+            -0.015748356968139168, 0.0, 0.015504186535965254,
+            0.030771658666753687, 0.0458095360312942, 0.06062462181643484,
+            0.07522342123758753, 0.08961215868968714, 0.10379679368164356,
+            0.11778303565638346, 0.13157635778871926, 0.1451820098444979,
+            0.15860503017663857, 0.17185025692665923, 0.184922338494012,
+            0.19782574332991987, 0.21056476910734964, 0.22314355131420976,
+            0.2355660713127669, 0.24783616390458127, 0.25995752443692605,
+            0.27193371548364176, 0.2837681731306446, 0.2954642128938359,
+            0.3070250352949119, 0.3184537311185346, 0.329753286372468,
+            0.3409265869705932, 0.3519764231571782,
+        ]
+        self.ATAN_COEFFS = [
+            -0.3333333333333327, 0.19999999997886797, -0.1428570346460735,
+            0.11093375583013043,
+        ]
+        self.ATAN_TABLE = [
+            0.0, 0.06241880999595735, 0.12435499454676144,
+            0.18534794999569476, 0.24497866312686414, 0.3028848683749714,
+            0.35877067027057225, 0.4124104415973873, 0.4636476090008061,
+            0.5123894603107377, 0.5585993153435624, 0.6022873461349642,
+            0.6435011087932844, 0.6823165548747481, 0.7188299996216245,
+            0.7531512809621944, 0.7853981633974483,
+        ]
+        self.ERF_COEFFS = [
+            1.1283791670955126, -0.37612638903183476, 0.11283791670925353,
+            -0.026866170632887928, 0.00522397737302147, -0.0008548297753674966,
+            0.00012053335124353741, -1.4845849259707869e-05, 1.4725865480556744e-06,
+        ]
+        self.ERF_TABLE = [
+            [0.7111556336535152, 0.6429310691952074, -0.48219830189642077, 0.026788794549795273, 0.15068696934653852, -0.05324272916643963, -0.026872509908663057, 0.01843523505415861, 0.0023018055169271427, -0.0039682547846095996, 0.00018562708708838016, 0.0006238506167295797, -0.00010143969230739605, -7.419257295435942e-05],
+            [0.9229001282564582, 0.2365211224472908, -0.29565140305911153, 0.16753579506683547, -0.006159404230896534, -0.04718103640600039, 0.02130127301145005, 0.0036259827199190244, -0.0056976802634647146, 0.0008776311203165393, 0.0007935637760477615, -0.0003238378954372589, -5.3358854084741746e-05, 5.444072496071499e-05],
+            [0.9866716712191824, 0.05277499593015038, -0.09235624287775983, 0.09015728471400461, -0.04810220983301914, 0.006624361468900602, 0.008963045180389002, -0.006058751526573601, 0.0007300475155067315, 0.0008941843166397162, -0.0004426629932340801, -5.505955216685546e-06, 6.765497805692175e-05, -1.7013932130488557e-05],
+            [0.9985372834133188, 0.007142319022017982, -0.016070217799542874, 0.02172455369197196, -0.01908338363633625, 0.010657679165515582, -0.00290435713041379, -0.000670455955356343, 0.0009994964272719107, -0.000369381086164474, -1.153034958136253e-05, 6.51506823581935e-05, -2.194472164632137e-05, -1.5164999359449104e-06],
+            [0.9998993780778803, 0.0005862772470937923, -0.0016122624295072932, 0.002760388705066609, -0.003258113659793406, 0.0027558084140728244, -0.0016573273880252134, 0.0006460409567512276, -8.901228719214331e-05, -7.122311801431493e-05, 5.5013835286284066e-05, -1.5843740679499495e-05, -1.2681253092432668e-06, 2.687131468952656e-06],
+            [0.9999956972205363, 2.9189025383581733e-05, -9.486433249663875e-05, 0.0001958097119481461, -0.00028656933775070937, 0.00031379722550312924, -0.0002635285041757942, 0.0001699914133368133, -8.164763207712718e-05, 2.5913900673472375e-05, -2.328840480316741e-06, -2.865557704931699e-06, 1.9043111846332243e-06, -5.336244331841553e-07],
+            [0.9999998862727434, 8.814321912317976e-07, -3.305370717149894e-06, 7.969616062397557e-06, -1.384123987009681e-05, 1.8370974995629414e-05, -1.927272219942407e-05, 1.6275302987042403e-05, -1.1128193054255004e-05, 6.108869420026458e-06, -2.6041152154208356e-06, 7.756125867485207e-07, -8.078525577335848e-08, -6.041585276859998e-08],
+            [0.9999999981494259, 1.6143993719507204e-08, -6.861197330583845e-08, 1.890192597995592e-07, -3.7879526983383196e-07, 5.872461797936775e-07, -7.309199654212912e-07, 7.477252231001777e-07, -6.37834656523887e-07, 4.5700581729818335e-07, -2.7500786094321867e-07, 1.377741503313587e-07, -5.655309447048697e-08, 1.703091943167985e-08],
+            [0.9999999999815149, 1.7934357034353256e-10, -8.518819585501894e-10, 2.6378450136141567e-09, -5.980921403439721e-09, 1.0572396927692433e-08, -1.5144701789651e-08, 1.8036301277976957e-08, -1.8173468655661378e-08, 1.5675568258151044e-08, -1.1645597137497432e-08, 7.500767558845102e-09, -4.35232109852286e-09, 2.049854216764062e-09],
+            [0.9999999999998869, 1.2084074716093265e-12, -6.3441391965136284e-12, 2.1801684786565257e-11, -5.511471704429019e-11, 1.0920038803325359e-10, -1.7640269613546945e-10, 2.3860470121491385e-10, -2.7540126376724834e-10, 2.748828746176984e-10, -2.3888787209141457e-10, 1.834293290048941e-10, -1.33374243044882e-10, 7.87516422700037e-11],
+            [0.9999999999999996, 4.9384851411824895e-15, -2.8396288954473957e-14, 1.0720628125956702e-13, -2.9875278475970634e-13, 6.549692514839024e-13, -1.1756753433806352e-12, 1.775537607069319e-12, -2.30109051151223e-12, 2.5945550729449734e-12, -2.5585495268186886e-12, 2.2579165888464656e-12, -1.9637541497887333e-12, 1.3599117789003806e-12],
+        ]
+        # erfc(x) e^(x^2) on [j / 2, j / 2 + 1/2] for j = 1..11 as polynomials in x - (j / 2 + 1/4)
+        self.ERFC_TABLE = [
+            [0.5069376502931449, -0.3679726916557954, 0.23095813155129497, -0.12983606199488007, 0.06679054252841538, -0.031897262039946896, 0.01428919858470859, -0.006051532271776434, 0.002437641069942269, -0.000938513222881505, 0.00034666379283020214, -0.00012332717214560827, 4.337915907561481e-05, -1.440376961255891e-05],
+            [0.3678229164523611, -0.20882187596460985, 0.10679557149659845, -0.05021827439590747, 0.022011364250946238, -0.009081627632959959, 0.003553109894683297, -0.0013257829272368543, 0.0004739707006153454, -0.00016296012111131222, 5.404491508514403e-05, -1.7341459254977562e-05, 5.501701839828387e-06, -1.6610767030625112e-06],
+            [0.2849722347374364, -0.1309763455144852, 0.05576363008708723, -0.022259995241388317, 0.008404319207340187, -0.0030209746514281146, 0.001039204521356914, -0.00034353335318474803, 0.0001095053381684006, -3.375536830552878e-05, 1.0085518680104132e-05, -2.92763224927802e-06, 8.406449608561853e-07, -2.3131132443809953e-07],
+            [0.23108725873039188, -0.08848650280874916, 0.031992627410706256, -0.011002060756440045, 0.0036189953543597905, -0.0011437284836541604, 0.0003485354218814771, -0.00010272108111777696, 2.9353254863530408e-05, -8.150285053705488e-06, 2.2028461470983834e-06, -5.805909757132036e-07, 1.5147418685283685e-07, -3.8093997572624824e-08],
+            [0.1936620962790687, -0.06323763756063484, 0.019758592987322864, -0.005934337896997976, 0.001719581885289515, -0.0004821950849811217, 0.00013118180050158485, -3.469860957140213e-05, 8.940157366119897e-06, -2.2473737254695783e-06, 5.519449177126979e-07, -1.3261857188670576e-07, 3.1568164431976944e-08, -7.279738484278512e-09],
+            [0.16633534842682188, -0.047199402321170376, 0.012937290883018157, -0.003435471300907574, 0.0008860045775343321, -0.00022238256956848873, 5.442040880644052e-05, -1.3004640264149419e-05, 3.0388322525197412e-06, -6.952081224454215e-07, 1.558749388297477e-07, -3.4288600060257634e-08, 7.478692856076797e-09, -1.586936266709577e-09],
+            [0.14558972127503855, -0.03645625753272353, 0.008878755527325298, -0.00210728287016911, 0.00048822238209558116, -0.00011057957492429544, 2.4516325375175097e-05, -5.326672789022946e-06, 1.1353256642536615e-06, -2.3760040556954934e-07, 4.8863416523494246e-08, -9.882877201280105e-09, 1.983538604342367e-09, -3.886928977136085e-10],
+            [0.12934527478598792, -0.028944331414615332, 0.006331866273872749, -0.0013559331671040983, 0.0002845751568401692, -5.8595500213358165e-05, 1.1848093644133921e-05, -2.3546006354783887e-06, 4.602602510051801e-07, -8.855436560091711e-08, 1.678048346916335e-08, -3.1337186685536493e-09, 5.811724586030923e-10, -1.0555257375577111e-10],
+            [0.11630270721024731, -0.02350344859816315, 0.00466132636897234, -0.0009080988970296905, 0.00017392830404065597, -3.277578113463187e-05, 6.081114550292908e-06, -1.1115677200716773e-06, 2.002919741920613e-07, -3.5595747942067336e-08, 6.242335630900769e-09, -1.0807446894693348e-09, 1.859478945996065e-10, -3.141135105048579e-11],
+            [0.1056127354688918, -0.01944544467214865, 0.003524150940111397, -0.0006291014910425433, 0.00011068405606902267, -1.920407867207035e-05, 3.287547680190039e-06, -5.55558100260598e-07, 9.271691472357647e-08, -1.52876234438342e-08, 2.4913485679760037e-09, -4.0142946040380724e-10, 6.432031515574242e-11, -1.0140384592111234e-11],
+            [0.09669877816971392, -0.016343218143802483, 0.002725273842849635, -0.00044859569827805586, 7.2924288875407e-05, -1.1712414897786451e-05, 1.8593010710359471e-06, -2.918382112209443e-07, 4.5307839541466324e-08, -6.959585888416656e-09, 1.0580344538295682e-09, -1.5924080266529063e-10, 2.384598604374149e-11, -3.5200073691581453e-12],
+        ]
+        # x sqrt(pi) erfc(x) e^(x^2) for x >= 6 as a polynomial in 1 / x^2
+        self.ERFC_TAIL = [1.0, -0.49999999999999645, 0.7499999999938971, -1.8749999958577388, 6.562498539698784, -29.530944158487966, 162.38088061653497, -1052.0735263375336, 7694.012675132685, -57896.37697290498, 368318.01783437765, -1338866.8237274187]
+        # Acklam's rational approximation to the normal quantile, 1.15e-9 relative before refinement
+        self.INVNORM_A = [-39.69683028665376, 220.9460984245205, -275.9285104469687, 138.357751867269, -30.66479806614716, 2.506628277459239]
+        self.INVNORM_B = [-54.47609879822406, 161.5858368580409, -155.6989798598866, 66.80131188771972, -13.28068155288572]
+        self.INVNORM_C = [-0.007784894002430293, -0.3223964580411365, -2.400758277161838, -2.549732539343734, 4.374664141464968, 2.938163982698783]
+        self.INVNORM_D = [0.007784695709041462, 0.3224671290700398, 2.445134137142996, 3.754408661907416]
+        self.INVNORM_LOW = 0.02425
+        self.INV_SQRT_2PI = 0.3989422804014327
+        self.INV_LN2_32 = 46.16624130844683
+        self._two_over_pi = (0, 0)
+        self._pio2_fixed = self._pi_fixed(127)
 
         self.LANCZOS_CONSTANTS = [
             0.99999999999980993,
@@ -24,94 +146,188 @@ class Func:
             9.9843695780195716e-6,
             1.5056327351493116e-7,
         ]
+
+        # Warm tables, n! exactly up to the largest n whose factorial is a finite float
+        self.FACTORIALS = [1]
+        for n in range(1, 171):
+            self.FACTORIALS.append(self.FACTORIALS[-1] * n)
+        # Correctly rounded gamma(n + 1) = n!
+        self.GAMMA_INTEGERS = [float(f) for f in self.FACTORIALS]
+        # gamma(n + 1/2) / sqrt(pi) = (2n)! / (4^n n!), exact up to rounding for 2n <= 170
+        self.GAMMA_HALVES = [self.FACTORIALS[2 * n] / (self.FACTORIALS[n] << 2 * n) for n in range(86)]
+        self.SQRT_PI = 1.7724538509055159
+        self.LN_SQRT_2PI = 0.9189385332046728
+        self.GAMMA_MAX = 171.6243769563027
+        # Stirling series B2k / (2k (2k - 1)) for k = 1..8, under 2e-18 from x = 10
+        self.STIRLING_MIN = 10.0
+        self.STIRLING_COEFFS = [
+            1 / 12, -1 / 360, 1 / 1260, -1 / 1680, 1 / 1188, -691 / 360360, 1 / 156, -3617 / 122400,
+        ]
+        # Digamma series B2k / 2k for k = 1..8, its derivative term by term
+        self.DIGAMMA_COEFFS = [
+            1 / 12, -1 / 120, 1 / 252, -1 / 240, 1 / 132, -691 / 32760, 1 / 12, -3617 / 8160,
+        ]
     
+    def _frexp(self, x):
+        ''' Split positive finite x into m in [1, 2) and e with x = m * 2 ** e '''
+        bits = struct.unpack('<Q', struct.pack('<d', x))[0]
+        e = bits >> 52
+        if e == 0:
+            # Subnormal, scale into the normal range first
+            bits = struct.unpack('<Q', struct.pack('<d', x * 18014398509481984.0))[0]
+            e = (bits >> 52) - 54
+        m = struct.unpack('<d', struct.pack('<Q', (bits & 0xFFFFFFFFFFFFF) | 0x3FF0000000000000))[0]
+        return m, e - 1023
+
+    def _scale(self, x, k):
+        ''' Compute x * 2 ** k without overflowing the intermediate power '''
+        if -1000 < k < 1000:
+            return x * 2.0 ** k
+        half = k // 2
+        return x * 2.0 ** half * 2.0 ** (k - half)
+
     def lnFn(self, x):
-        ''' Compute neural logarithm using talyor series expansion '''
+        ''' Compute natural logarithm from the exponent, a table of ln(j / 64) and a fixed series '''
 
         if x <= 0:
             raise ValueError('X must be positive for ln')
-        
-        result = 0.0
-        while x >= 2.0:
-            x *= 0.5
-            result += self.LN2
-        
-        while x < 1.0:
-            x *= 2.0
-            result -= self.LN2
-        
-        if x > self.SQRT2:
-            x *= 0.5
-            result += self.LN2
-        
-        y = (x - 1) / (x + 1)
+        if x == float('inf') or x != x:
+            return float(x)
+
+        m, e = self._frexp(x)
+        if m > self.SQRT2:
+            m *= 0.5
+            e += 1
+
+        # ln(m) = ln(c) + 2 atanh(y), |y| < 0.0056 so four terms are enough
+        j = int(m * 64 + 0.5)
+        c = j / 64
+        y = (m - c) / (m + c)
         y2 = y * y
-        s = 0
-        term = y
-        n = 1
+        s = 2 * y * (1 + y2 * (1 / 3 + y2 * (0.2 + y2 / 7)))
 
-        while True:
-            p = s
-            s += term / n
-            if s == p:
-                break
-            term *= y2
-            n += 2
-        
-        return result + 2.0 * s
+        return e * self.LN2_HI + (self.LN_TABLE[j - 45] + (e * self.LN2_LO + s))
     
+    def _expm1_reduced(self, x):
+        ''' Shared exponential core, returns expm1(r) and k with x = k ln2 + r '''
+        k = round(x / self.LN2)
+        r = (x - k * self.LN2_HI) - k * self.LN2_LO
+
+        c = self.EXPM1_COEFFS
+        p = c[10]
+        for i in range(9, -1, -1):
+            p = p * r + c[i]
+        return r + r * r * p, k
+
     def expFn(self, x):
-        ''' Compute exponential using Taylor series expansion '''
-        
-        k = int(round(x / self.LN2))
-        r = x - k * self.LN2
+        ''' Compute exponential as 2 ** m * 2 ** (j / 32) * (1 + p(r)) with |r| <= ln2 / 64 '''
+        if x != x:
+            return x
+        if x > 709.8:
+            raise OverflowError('math range error')
+        if x < -746:
+            return 0.0
 
-        s = 1
-        term = 1
-        n = 1
+        k = round(x * self.INV_LN2_32)
+        r = (x - k * self.LN2_32_HI) - k * self.LN2_32_LO
+        c = self.EXP_COEFFS
+        p = r + r * r * (c[0] + r * (c[1] + r * (c[2] + r * c[3])))
+        t = self.EXP_TABLE[k & 31]
+        result = self._scale(t + t * p, k >> 5)
+        if result == float('inf'):
+            raise OverflowError('math range error')
+        return result
 
-        while True:
-            p = s
-            term *= r / n
-            s += term
-            if s == p:
-                break
+    def _reduce_half_pi(self, x):
+        ''' Reduce x to r in [-π/4, π/4] and the quadrant q with x = q π/2 + r '''
+        if -self.QUARTER_PI <= x <= self.QUARTER_PI:
+            return x, 0
+        if -823549.0 < x < 823549.0:
+            # n < 2 ** 19 keeps n * PIO2_1 exact
+            n = round(x / self.HALF_PI)
+            r = ((x - n * self.PIO2_1) - n * self.PIO2_2) - n * self.PIO2_3
+            return r, n % 4
+        return self._reduce_large(x)
 
-            n += 1
-        
-        return s * (2.0 ** k)
+    def _pi_fixed(self, bits):
+        ''' floor(π * 2 ** bits) from Machin's formula in integer arithmetic '''
+        guard = 32
+        one = 1 << (bits + guard)
 
-    def sinFn(self, x):
-        ''' Compute sine using Taylor series expansion '''
-        
-        # Reduce to range [-π, π]
-        if abs(x) > self.PI:
-            x = ((x + self.PI) % (self.TAU)) - self.PI
+        def arctan_inverse(n):
+            total = term = one // n
+            n2 = n * n
+            k = 1
+            sign = -1
+            while term:
+                term //= n2
+                k += 2
+                total += sign * (term // k)
+                sign = -sign
+            return total
 
-        # Reduce to range [-π/2, π/2]
-        if x > self.HALF_PI:
-            x = self.PI - x
-        elif x < -self.HALF_PI:
-            x = -self.PI - x
+        return (16 * arctan_inverse(5) - 4 * arctan_inverse(239)) >> guard
 
-        s = 0
-        term = x
-        n = 1
-        x2 = x * x
+    def _reduce_large(self, x):
+        ''' Payne-Hanek style reduction against an exact binary expansion of 2/π '''
+        num, den = abs(x).as_integer_ratio()
+        if den & (den - 1):
+            num, den = abs(float(x)).as_integer_ratio()
+        d = den.bit_length() - 1
 
-        while True:
-            p = s
-            s += term
-            if s == p:
-                break
+        # Enough bits of 2/π that 192 bits survive below the binary point
+        bits = max(num.bit_length() - d, 0) + 192
+        if self._two_over_pi[0] < bits:
+            self._two_over_pi = (bits, (1 << (2 * bits + 65)) // self._pi_fixed(bits + 64))
+        have, table = self._two_over_pi
+        t = table >> (have - bits)
 
-            term *= -x2 / ((n + 1) * (n + 2))
-            n += 2
+        shift = bits + d
+        prod = num * t
+        n = prod >> shift
+        f = (prod - (n << shift)) >> (shift - 128)
+        if f >= 1 << 127:
+            f -= 1 << 128
+            n += 1
+        r = float(f * self._pio2_fixed) * 2.0 ** -256
+        if x < 0:
+            return -r, -n % 4
+        return r, n % 4
 
-        return s
+    def _sin_series(self, r):
+        ''' Minimax polynomial for sin on [-π/4, π/4] '''
+        r2 = r * r
+        c = self.SIN_COEFFS
+        return r + r * r2 * (c[0] + r2 * (c[1] + r2 * (c[2] + r2 * (c[3] + r2 * (c[4] + r2 * c[5])))))
+
+    def _cos_series(self, r):
+        ''' Minimax polynomial for cos on [-π/4, π/4] '''
+        r2 = r * r
+        c = self.COS_COEFFS
+        return 1 - (0.5 * r2 - r2 * r2 * (c[0] + r2 * (c[1] + r2 * (c[2] + r2 * (c[3] + r2 * (c[4] + r2 * c[5]))))))
+
+    def sinFn(self, x):
+        ''' Compute sine by reduction to [-π/4, π/4] and a minimax polynomial on its quadrant '''
+        r, q = self._reduce_half_pi(x)
+        s = self._cos_series(r) if q & 1 else self._sin_series(r)
+        return -s if q >= 2 else s
+
+    def sincosFn(self, x):
+        ''' Compute sine and cosine together, sharing one argument reduction '''
+        r, q = self._reduce_half_pi(x)
+        s = self._sin_series(r)
+        c = self._cos_series(r)
+
+        if q & 1:
+            s, c = c, s
+        if q >= 2:
+            s = -s
+        if q == 1 or q == 2:
+            c = -c
+        return s, c
     
     def atanFn(self, x):
-        ''' Compute arctangent using Taylor series expansion '''
+        ''' Compute arctangent from a table of atan(j / 16) and a minimax polynomial '''
         if x == 0:
             return 0
         
@@ -127,25 +343,14 @@ class Func:
             x = 1 / x
             base = self.HALF_PI
             factor = -1
-        
-        limit = self.SQRT2 - 1
-
-        if x > limit:
-            x = (x - 1) / (x + 1)
-            base += factor * self.QUARTER_PI
-        
-        s = 0
-        term = x
-        n = 1
-        x2 = x * x
 
-        while True:
-            p = s
-            s += term / n
-            if s == p:
-                break
-            term *= -x2
-            n += 2
+        # atan(x) = atan(c) + atan(t) with |t| <= 1/32
+        j = int(x * 16 + 0.5)
+        c = j / 16
+        t = (x - c) / (1 + x * c)
+        t2 = t * t
+        a = self.ATAN_COEFFS
+        s = self.ATAN_TABLE[j] + (t + t * t2 * (a[0] + t2 * (a[1] + t2 * (a[2] + t2 * a[3]))))
         
         return sign * (base + factor * s)
     
@@ -183,31 +388,119 @@ class Func:
         return y
     
     def factorialFn(self, x):
-        ''' Compute factorial'''
+        ''' Compute factorial as the binary split odd part shifted by the power of two '''
         if x < 0:
             raise ValueError('X cannot be negative for factorial')
-        if x <= 1:
-            return 1
-        n = 1
-        for i in range(2, int(x) + 1):
-            n *= i
-        return n
+        n = int(x)
+        if n < len(self.FACTORIALS):
+            return self.FACTORIALS[n]
+
+        # n! = prod over i of (odd numbers in (n >> (i + 1), n >> i]) ** (i + 1)
+        inner = outer = 1
+        upper = 3
+        for i in range(n.bit_length() - 2, -1, -1):
+            v = n >> i
+            if v <= 2:
+                continue
+            lower = upper
+            upper = (v + 1) | 1
+            inner *= self._odd_product(lower, upper)
+            outer *= inner
+        return outer << (n - bin(n).count('1'))
+
+    def _odd_product(self, lo, hi):
+        ''' Product of the odd numbers in [lo, hi) by binary splitting '''
+        count = (hi - lo) // 2
+        if count <= 16:
+            p = 1
+            for i in range(lo, hi, 2):
+                p *= i
+            return p
+        mid = (lo + count) | 1
+        return self._odd_product(lo, mid) * self._odd_product(mid, hi)
+
+    def _range_product(self, lo, hi):
+        ''' Product of the integers in [lo, hi) by binary splitting '''
+        if hi - lo <= 16:
+            p = 1
+            for i in range(lo, hi):
+                p *= i
+            return p
+        mid = (lo + hi) // 2
+        return self._range_product(lo, mid) * self._range_product(mid, hi)
+
+    def _primes(self, n):
+        ''' Primes up to and including n by sieve of Eratosthenes '''
+        sieve = bytearray([1]) * (n + 1)
+        sieve[:2] = b'\x00\x00'
+        for p in range(2, int(n ** 0.5) + 1):
+            if sieve[p]:
+                sieve[p * p::p] = bytes(len(range(p * p, n + 1, p)))
+        return [p for p in range(2, n + 1) if sieve[p]]
+
+    def _product(self, values, lo=0, hi=None):
+        ''' Product of a list by binary splitting '''
+        if hi is None:
+            hi = len(values)
+        if hi - lo <= 16:
+            p = 1
+            for i in range(lo, hi):
+                p *= values[i]
+            return p
+        mid = (lo + hi) // 2
+        return self._product(values, lo, mid) * self._product(values, mid, hi)
     
-    def gcdFn(self, a, b):
-        ''' Compute greatest common divisor using Euclidean algorithm '''
+    def gcdFn(self, *args):
+        ''' Compute greatest common divisor of any number of values '''
+        g = 0
+        for a in args:
+            g = self._gcd(g, a)
+        return g
+
+    def _gcd(self, a, b):
+        ''' Euclidean algorithm, switching to Lehmer's algorithm for big integers '''
         a = abs(a)
         b = abs(b)
+        if isinstance(a, int) and isinstance(b, int) and min(a, b).bit_length() > self.LEHMER_BITS:
+            return self._lehmer_gcd(a, b)
+        while b != 0:
+            a, b = b, a % b
+        return a
+
+    def _lehmer_gcd(self, a, b):
+        ''' Lehmer's gcd, running Euclid on the leading bits and applying the cofactors in one step '''
+        if a < b:
+            a, b = b, a
+        while b.bit_length() > self.LEHMER_BITS:
+            shift = a.bit_length() - self.LEHMER_BITS
+            x = a >> shift
+            y = b >> shift
+            A, B, C, D = 1, 0, 0, 1
+            while y + C != 0 and y + D != 0:
+                q = (x + A) // (y + C)
+                if q != (x + B) // (y + D):
+                    break
+                A, C = C, A - q * C
+                B, D = D, B - q * D
+                x, y = y, x - q * y
+            if B == 0:
+                a, b = b, a % b
+            else:
+                a, b = A * a + B * b, C * a + D * b
         while b != 0:
             a, b = b, a % b
         return a
     
     def cosFn(self, x):
-        ''' Compute cosine as sin(x/2 - x) '''
-        return self.sinFn(self.HALF_PI - x)
+        ''' Compute cosine by reduction to [-π/4, π/4] and a minimax polynomial on its quadrant '''
+        r, q = self._reduce_half_pi(x)
+        c = self._sin_series(r) if q & 1 else self._cos_series(r)
+        return -c if q == 1 or q == 2 else c
 
     def tanFn(self, x):
         ''' Compute tangent as sine divided by cosine '''
-        return self.sinFn(x) / self.cosFn(x)
+        s, c = self.sincosFn(x)
+        return s / c
 
     def secFn(self, x):
         ''' Compute secant as reciprocal of cosine '''
@@ -218,31 +511,40 @@ class Func:
         return 1 / self.sinFn(x)
 
     def cotFn(self, x):
-        ''' Compute cotangent as reciprocal of tangent '''
-        return 1 / self.tanFn(x)
+        ''' Compute cotangent as cosine divided by sine '''
+        s, c = self.sincosFn(x)
+        return c / s
 
     def sinhFn(self, x):
-        ''' Compute hyperbolic sine '''
-        ex = self.expFn(x)
-        return (ex - 1 / ex) / 2
+        ''' Compute hyperbolic sine from expm1 so small x does not cancel '''
+        u = self.expm1Fn(abs(x))
+        s = (u + u / (u + 1)) / 2
+        return -s if x < 0 else s
 
     def coshFn(self, x):
         ''' Compute hyperbolic cosine '''
-        ex = self.expFn(x)
+        ex = self.expFn(abs(x))
         return (ex + 1 / ex) / 2
 
     def tanhFn(self, x):
-        ''' Compute hyperbolic tangent '''
-        ex2 = self.expFn(x * 2)
-        return (ex2 - 1) / (ex2 + 1)
+        ''' Compute hyperbolic tangent from expm1(2|x|) '''
+        if abs(x) > 20:
+            return -1.0 if x < 0 else 1.0
+        u = self.expm1Fn(2 * abs(x))
+        t = u / (u + 2)
+        return -t if x < 0 else t
     
     def cosecFn(self, x):
         ''' Compute cosecant '''
         return self.cscFn(x)
 
     def expm1Fn(self, x):
-        ''' Compute exp(x) '''
-        return self.expFn(x) - 1
+        ''' Compute exp(x) - 1 without cancellation near zero '''
+        p, k = self._expm1_reduced(x)
+        if k == 0:
+            return p
+        scale = 2.0 ** k
+        return p * scale + (scale - 1)
 
     def exp2Fn(self, x):
         ''' Compute 2 raised to the power x using expFn '''
@@ -304,17 +606,88 @@ class Func:
         ''' Compute fused multiply-add: a * b + c '''
         return a*b + c
     
+    def _log_ratio(self, a, b):
+        ''' ln(a / b) without the cancellation of ln a - ln b when a and b are close '''
+        u = (a - b) / (a + b)
+        if abs(u) > 0.1:
+            return self.lnFn(a / b)
+        # ln(a / b) = 2 atanh(u), u^2 <= 0.01 so nine terms reach 1e-18
+        u2 = u * u
+        s = 0.0
+        for i in range(17, 1, -2):
+            s = s * u2 + 1 / i
+        return 2 * u * (1 + u2 * s)
+
+    def _lgamma_difference(self, a, b):
+        ''' lgamma(a) - lgamma(b) without losing the digits the two large logs share '''
+        if min(a, b) < self.STIRLING_MIN:
+            return self.lgammaFn(a) - self.lgammaFn(b)
+        # Difference of the Stirling forms, (a - 1/2) ln a - (b - 1/2) ln b regrouped around ln(a / b)
+        return ((a - b) * (self.lnFn(a) - 1) + (b - 0.5) * self._log_ratio(a, b)
+                + self._stirling_series(a) - self._stirling_series(b))
+
+    def _log_falling(self, n, k):
+        ''' ln(gamma(n + 1) / gamma(n - k + 1)) for non-integer arguments '''
+        n, k = float(n), float(k)
+        if n < 0 or k < 0:
+            raise ValueError('N and K cannot be negative')
+        return self._lgamma_difference(n + 1, n - k + 1)
+
     def permFn(self, n, k):
-        ''' Compute permutations P(n, k) '''
-        return self.factorialFn(n) // self.factorialFn(n - k)
+        ''' Compute permutations P(n, k) as the product n (n - 1) ... (n - k + 1), through lgamma for non-integers '''
+        if n != int(n) or k != int(k):
+            return self.expFn(self._log_falling(n, k))
+        n, k = int(n), int(k)
+        if n < 0 or k < 0:
+            raise ValueError('N and K cannot be negative for perm')
+        if k > n:
+            return 0
+        return self._range_product(n - k + 1, n + 1)
     
     def combFn(self, n, k):
-        ''' Compute combinations C(n, k) '''
-        return self.factorialFn(n) // (self.factorialFn(k) * self.factorialFn(n - k))
+        ''' Compute combinations C(n, k) without building n!, through lgamma for non-integers '''
+        if n != int(n) or k != int(k):
+            # C(n, k) = C(n, n - k) for real arguments too, the smaller k keeps lgamma(k + 1) small
+            k = min(float(k), float(n) - float(k)) if float(n) - float(k) > 0 else float(k)
+            return self.expFn(self._log_falling(n, k) - self.lgammaFn(k + 1))
+        n, k = int(n), int(k)
+        if n < 0 or k < 0:
+            raise ValueError('N and K cannot be negative for comb')
+        if k > n:
+            return 0
+        k = min(k, n - k)
+
+        if k <= 64:
+            c = 1
+            for i in range(1, k + 1):
+                c = c * (n - k + i) // i
+            return c
+
+        # The sieve costs O(n) whatever k is, it only pays off once k is a sizeable fraction of n
+        if n > self.COMB_SIEVE_LIMIT or k * 32 < n:
+            return self._range_product(n - k + 1, n + 1) // self.factorialFn(k)
+
+        # Exponent of each prime p in C(n, k) by Legendre's formula
+        powers = []
+        for p in self._primes(n):
+            e = 0
+            q = p
+            while q <= n:
+                e += n // q - k // q - (n - k) // q
+                q *= p
+            if e:
+                powers.append(p ** e if e > 1 else p)
+        return self._product(powers)
     
-    def lcmFn(self, a, b):
-        ''' Compute least common multiple '''
-        return abs(a * b) // self.gcdFn(a, b)
+    def lcmFn(self, *args):
+        ''' Compute least common multiple of any number of values '''
+        m = 1
+        for a in args:
+            if m == 0 or a == 0:
+                m = 0
+                continue
+            m = abs(m * a) // self._gcd(m, a)
+        return m
     
     def powFn(self, x, y):
         ''' Compute x to power of y '''
@@ -359,19 +732,18 @@ class Func:
         return -ax if y < 0 else ax
     
     def distFn(self, p, q):
-        ''' Compute Enclidean distance between two points '''
-        if len(p) != len(q):
-            raise ValueError('Points must have the same dimension for dist')
-        
+        ''' Compute Enclidean distance between two points, streaming both coordinate sequences '''
         s = 0
-        for a,b in zip(p, q):
+        for a, b in zip_longest(p, q):
+            if a is None or b is None:
+                raise ValueError('Points must have the same dimension for dist')
             d = a - b
             s += d * d
         
         return self.sqrtFn(s)
     
     def erfFn(self, x):
-        ''' Compute error function '''
+        ''' Compute error function from piecewise minimax polynomials '''
 
         if x == 0:
             return 0
@@ -383,26 +755,105 @@ class Func:
         
         if x >= 6:
             return sign * 1.0
-        
-        s = 0
-        term = x
-        n = 0
-        x2 = x * x
 
-        while True:
-            p = s
-            s += term
-            if s == p:
-                break
+        if x < 0.5:
+            u = x * x
+            c = self.ERF_COEFFS
+            p = c[8]
+            for i in range(7, -1, -1):
+                p = p * u + c[i]
+            return sign * x * p
 
-            term *= (-x2) * (2 * n + 1) / ((n + 1) * (2 * n + 3))
-            n += 1
-        
-        return sign * self.TWO_SQRT_PI * s
+        # One polynomial in (x - midpoint) per interval of width 1/2
+        j = int(x * 2)
+        t = x - (j * 0.5 + 0.25)
+        c = self.ERF_TABLE[j - 1]
+        p = c[13]
+        for i in range(12, -1, -1):
+            p = p * t + c[i]
+        return sign * p
     
+    def _exp_neg_square(self, x, c=1.0):
+        ''' exp(-c x^2) for c = 1 or 1/2 with x^2 split so its rounding is not magnified by the exponential '''
+        if x > 40:
+            return 0.0
+        # xh carries at most 26 bits, so xh * xh is exact
+        xh = int(x * 2097152) / 2097152
+        return self.expFn(-c * xh * xh) * self.expFn(-c * (x + xh) * (x - xh))
+
+    def _erfc_scaled(self, x):
+        ''' erfc(x) e^(x^2) for x >= 1/2 '''
+        if x >= 6:
+            s = 1 / (x * x)
+            c = self.ERFC_TAIL
+            p = c[-1]
+            for i in range(len(c) - 2, -1, -1):
+                p = p * s + c[i]
+            return p / (x * self.SQRT_PI)
+
+        j = int(x * 2)
+        t = x - (j * 0.5 + 0.25)
+        c = self.ERFC_TABLE[j - 1]
+        p = c[13]
+        for i in range(12, -1, -1):
+            p = p * t + c[i]
+        return p
+
     def erfcFn(self, x):
-        ''' Compute complementary error function '''
-        return 1.0 - self.erfFn(x)
+        ''' Compute complementary error function, keeping its relative accuracy in the upper tail '''
+        if x < 0.5:
+            return 1.0 - self.erfFn(x)
+        return self._exp_neg_square(x) * self._erfc_scaled(x)
+
+    def normpdfFn(self, x, mu=0.0, sigma=1.0):
+        ''' Compute the normal probability density '''
+        if sigma <= 0:
+            raise ValueError('Sigma must be positive for normpdf')
+        z = abs(x - mu) / sigma
+        return self._exp_neg_square(z, 0.5) * self.INV_SQRT_2PI / sigma
+
+    def normcdfFn(self, x, mu=0.0, sigma=1.0):
+        ''' Compute the normal cumulative distribution, accurate relative to the lower tail '''
+        if sigma <= 0:
+            raise ValueError('Sigma must be positive for normcdf')
+        z = (x - mu) / sigma
+        if z > -0.7071067811865476:
+            return 0.5 + 0.5 * self.erfFn(z * 0.7071067811865476)
+        # e^(-z^2 / 2) straight from z, since rounding z / sqrt(2) would be squared into the exponent
+        return 0.5 * self._exp_neg_square(-z, 0.5) * self._erfc_scaled(-z * 0.7071067811865476)
+
+    def invnormFn(self, p, mu=0.0, sigma=1.0):
+        ''' Compute the normal quantile by Acklam's approximation and one Halley step '''
+        if sigma <= 0:
+            raise ValueError('Sigma must be positive for invnorm')
+        if p <= 0 or p >= 1:
+            raise ValueError('P must be between 0 and 1 for invnorm')
+        if p > 0.5:
+            # 1 - p is exact here, and the lower half keeps the refinement relative
+            return mu - sigma * self._invnorm_lower(1 - p)
+        return mu + sigma * self._invnorm_lower(p)
+
+    def _invnorm_lower(self, p):
+        ''' Standard normal quantile for 0 < p <= 1/2 '''
+        a, b, c, d = self.INVNORM_A, self.INVNORM_B, self.INVNORM_C, self.INVNORM_D
+        if p < self.INVNORM_LOW:
+            q = self.sqrtFn(-2 * self.lnFn(p))
+            x = ((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5])
+                 / ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1))
+            e = None
+        else:
+            q = p - 0.5
+            r = q * q
+            x = ((((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q
+                 / (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1))
+            # normcdf(x) - p without the shared 1/2, which would cancel near the median
+            e = 0.5 * self.erfFn(x * 0.7071067811865476) - q
+
+        # Halley step on normcdf(x) - p, which squares the 1e-9 error away
+        if e is None:
+            e = self.normcdfFn(x) - p
+        u = e / self.normpdfFn(x)
+        return x - u / (1 + x * u / 2)
     
     def truncFn(self, x):
         ''' Truncate x to integer '''
@@ -421,8 +872,22 @@ class Func:
         return x == x and abs(x) != float("inf")
     
     def isqrtFn(self, n):
-        ''' Compute integer square root '''
-        return int(self.sqrtFn(n))
+        ''' Compute the exact integer square root with integer Newton steps '''
+        n = int(n)
+        if n < 0:
+            raise ValueError('N cannot be negative for isqrt')
+        if n == 0:
+            return 0
+
+        # Each step doubles the number of correct leading bits of a
+        c = (n.bit_length() - 1) // 2
+        a = 1
+        d = 0
+        for s in reversed(range(c.bit_length())):
+            e = d
+            d = c >> s
+            a = (a << d - e - 1) + (n >> 2 * c - e - d + 1) // a
+        return a - (a * a > n)
     
     def cbrtFn(self, x):
         ''' Compute cube root '''
@@ -442,6 +907,12 @@ class Func:
             s += x * y
         return s
     
+    def rangeFn(self, start, stop=None, step=1):
+        ''' Lazy sequence from start up to but excluding stop, range(n) counts from 0 '''
+        if stop is None:
+            start, stop = 0, start
+        return Range(start, stop, step)
+    
     def modfFn(self, x):
         ''' Return fractional and integer parts of x '''
         i = float(self.truncFn(x))
@@ -452,15 +923,52 @@ class Func:
         return x - self.truncFn(x / y) * y
     
     def fsumFn(self, arr):
-        ''' Compute sum of iterable using Kahan summation '''
-        s = 0
-        c = 0
+        ''' Compute the correctly rounded sum of an iterable from Shewchuk's non-overlapping partials '''
+        partials = []
+        special = 0.0
         for v in arr:
-            y = v - c
-            t = s + y
-            c = (t - s) - y
-            s = t
-        return s
+            x = float(v)
+            if x - x:
+                # inf and nan bypass the partials, inf - inf gives nan as it should
+                special += x
+                continue
+            i = 0
+            for y in partials:
+                if abs(x) < abs(y):
+                    x, y = y, x
+                hi = x + y
+                lo = y - (hi - x)
+                if lo:
+                    partials[i] = lo
+                    i += 1
+                x = hi
+            if x - x:
+                raise OverflowError('Intermediate overflow in fsum')
+            partials[i:] = [x]
+        if special:
+            return special
+
+        # Add the partials from the top until the sum stops being exact, then round half even
+        n = len(partials)
+        if not n:
+            return 0.0
+        n -= 1
+        hi = partials[n]
+        lo = 0.0
+        while n > 0:
+            x = hi
+            n -= 1
+            y = partials[n]
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                break
+        if n > 0 and ((lo < 0 and partials[n - 1] < 0) or (lo > 0 and partials[n - 1] > 0)):
+            y = lo * 2
+            x = hi + y
+            if y == x - hi:
+                hi = x
+        return hi
     
     def iscloseFn(self, a, b, rel_tol=1e-09, abs_tol=0.0):
         ''' Check if two floats are close in value '''
@@ -484,11 +992,55 @@ class Func:
         x = abs(x)
         return sign * (x ** (1/3))
     
+    def _stirling_series(self, x):
+        ''' Correction lgamma(x) - ((x - 0.5) ln x - x + ln sqrt(2 pi)) for x >= STIRLING_MIN '''
+        y = 1 / (x * x)
+        s = 0.0
+        for c in reversed(self.STIRLING_COEFFS):
+            s = s * y + c
+        return s / x
+
+    def _digamma(self, x):
+        ''' Digamma, the derivative of lgamma, by recurrence into the asymptotic series and reflection below 1/2 '''
+        if x <= 0 and x == int(x):
+            raise ValueError('X must not be a non-positive integer for digamma')
+        if x < 0.5:
+            # digamma(1 - x) - digamma(x) = pi cot(pi x)
+            return self._digamma(1 - x) - self.PI / self.tanFn(self.PI * x)
+        r = 0.0
+        while x < self.STIRLING_MIN:
+            r -= 1 / x
+            x += 1
+        y = 1 / (x * x)
+        s = 0.0
+        for c in reversed(self.DIGAMMA_COEFFS):
+            s = s * y + c
+        return r + self.lnFn(x) - 0.5 / x - s * y
+
+    def _table_gamma(self, x):
+        ''' gamma at the integers and half integers covered by the factorial tables, else None '''
+        if x <= len(self.GAMMA_INTEGERS) and x == int(x):
+            return self.GAMMA_INTEGERS[int(x) - 1]
+        n = x - 0.5
+        if n < len(self.GAMMA_HALVES) and n == int(n):
+            return self.GAMMA_HALVES[int(n)] * self.SQRT_PI
+        return None
+
     def gammaFn(self, x):
-        ''' Compute gamma function using Lanczos approximation '''
+        ''' Compute gamma function from the factorial tables, Stirling's series for large x and Lanczos approximation otherwise '''
         if x <= 0:
             raise ValueError('X must be positive for gamma function')
-        
+        r = self._table_gamma(x)
+        if r is not None:
+            return r
+        if x > self.GAMMA_MAX:
+            raise OverflowError('X is too large for gamma function')
+
+        if x >= self.STIRLING_MIN:
+            # x^(x - 1/2) in two halves so neither overflows before e^-x scales it down
+            p = x ** (0.5 * x - 0.25)
+            return self.SQRT_2PI * (p * self.expFn(-x)) * p * self.expFn(self._stirling_series(x))
+
         g = 7
         if x < 0.5:
             s = self.sinFn(self.PI * x)
@@ -501,7 +1053,7 @@ class Func:
             for i in range(1, len(self.LANCZOS_CONSTANTS)):
                 a += self.LANCZOS_CONSTANTS[i] / (z + i)
             t = z + g + 0.5
-            gu = self.SQRT_2PI * (t ** (u + 0.5)) * self.expFn(-t) * a
+            gu = self.SQRT_2PI * (t ** (z + 0.5)) * self.expFn(-t) * a
             
             return self.PI / (s * gu)
         
@@ -513,8 +1065,19 @@ class Func:
         return self.SQRT_2PI * (t ** (z + 0.5)) * self.expFn(-t) * a
     
     def lgammaFn(self, x):
-        ''' Compute natural logarithm of gamma function '''
-        return self.lnFn(self.gammaFn(x))
+        ''' Compute natural logarithm of gamma function in log space, so it stays finite past gamma overflow '''
+        if x <= 0:
+            raise ValueError('X must be positive for gamma function')
+        r = self._table_gamma(x)
+        if r is not None:
+            return self.lnFn(r)
+
+        # lgamma(x) = lgamma(x + n) - ln(x (x + 1) ... (x + n - 1)) lifts x into the Stirling range
+        shift = 1.0
+        while x < self.STIRLING_MIN:
+            shift *= x
+            x += 1
+        return (x - 0.5) * self.lnFn(x) - x + self.LN_SQRT_2PI + self._stirling_series(x) - self.lnFn(shift)
 
 functions = Func()
 
@@ -522,6 +1085,7 @@ function_list = {
     "abs": abs,
     "sgn": functions.sgnFn,
     "sin": functions.sinFn,
+    "sincos": functions.sincosFn,
     "cosec": functions.cosecFn,
     "csc": functions.cscFn,
     "cos": functions.cosFn,
@@ -540,9 +1104,9 @@ function_list = {
     "sqrt": functions.sqrtFn,
     "ln": functions.lnFn,
     "lg": functions.lgFn,
-    # "normcdf": _normal.cdf,
-    # "normpdf": _normal.pdf,
-    # "invnorm": _normal.inv_cdf,
+    "normcdf": functions.normcdfFn,
+    "normpdf": functions.normpdfFn,
+    "invnorm": functions.invnormFn,
     "acosh": functions.acoshFn,
     "asinh": functions.asinhFn,
     "atan2": functions.atan2Fn,
@@ -581,6 +1145,7 @@ function_list = {
     "pow": functions.powFn,
     "prod": functions.prodFn,
     "radians": functions.radiansFn,
+    "range": functions.rangeFn,
     "remainder": functions.remainderFn,
     "trunc": functions.truncFn,
     "cbrt": functions.cbrtFn,
@@ -589,6 +1154,132 @@ function_list = {
     "fma": functions.fmaFn,
 }
 
+# Names of function_list entries that must not be constant folded
+impure_functions = set()
+
+def mark_impure(*names):
+    ''' Stop the optimizer folding calls to these functions, call before parsing '''
+    impure_functions.update(names)
+
+# Memoized function_list entries, name to the original function and its cache
+memoized_functions = {}
+
+def memoize(*names, maxsize=256):
+    ''' Serve repeated calls to these function_list entries from a bounded LRU cache, call before compiling '''
+    for name in names:
+        if name in impure_functions:
+            raise ValueError(f"Function '{name}' is impure and cannot be memoized")
+        if name in memoized_functions:
+            memoized_functions[name][1].resize(maxsize)
+            continue
+        fn = function_list[name]
+        cache = LRUCache(maxsize)
+        memoized_functions[name] = (fn, cache)
+        function_list[name] = _memoized(fn, cache)
+
+def unmemoize(*names):
+    ''' Restore the original function_list entries '''
+    for name in names:
+        if name in memoized_functions:
+            function_list[name] = memoized_functions.pop(name)[0]
+
+def memo_stats():
+    ''' Hit, miss and eviction counters of every memoized function '''
+    return {name: cache.stats() for name, (fn, cache) in memoized_functions.items()}
+
+def constant_key(value):
+    ''' Key telling apart constants that compare equal, 1 from 1.0 and True, 0.0 from -0.0, None for other types '''
+    kind = type(value)
+    if kind is float:
+        # NaN is unequal to itself, its hex string is not
+        return kind, value.hex()
+    if kind is decimal.Decimal:
+        return kind, str(value)
+    if kind in (int, bool, str):
+        return kind, value
+    return None
+
+def _memo_key(value):
+    key = constant_key(value)
+    return (type(value), value) if key is None else key
+
+def _memoized(fn, cache):
+    missing = object()
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        # 1, 1.0 and True hash alike, as do 0.0 and -0.0, but may give different results
+        if len(args) == 1:
+            key = _memo_key(args[0])
+        else:
+            key = tuple(_memo_key(a) for a in args)
+        try:
+            value = cache.get(key, missing)
+        except TypeError:
+            return fn(*args)
+        if value is missing:
+            value = fn(*args)
+            cache.put(key, value)
+        return value
+    return wrapper
+
+# Smallest and largest argument count of each function_list entry, None for no largest
+arities = {}
+
+def arity(name):
+    ''' Argument counts accepted by a function_list entry, read from its signature once '''
+    if name not in arities:
+        low, high = 0, 0
+        for p in inspect.signature(function_list[name]).parameters.values():
+            if p.kind == p.VAR_POSITIONAL:
+                high = None
+            elif p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD):
+                high += 1
+                if p.default is p.empty:
+                    low += 1
+        arities[name] = (low, high)
+    return arities[name]
+
+def strict_eq(a, b):
+    ''' Equal in both value and type '''
+    return type(a) is type(b) and a == b
+
+operators = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "^": operator.pow,
+    "//": operator.floordiv,
+    "%": operator.mod,
+    ".": operator.mul,
+    "P": functions.permFn,
+    "C": functions.combFn,
+    "&": operator.and_,
+    "|": operator.or_,
+    "xor": operator.xor,
+    "XOR": operator.xor,
+    "~": operator.invert,
+    "<<": operator.lshift,
+    ">>": operator.rshift,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "===": strict_eq,
+    "!==": lambda a, b: not strict_eq(a, b),
+    "<==": lambda a, b: type(a) is type(b) and a <= b,
+    ">==": lambda a, b: type(a) is type(b) and a >= b,
+}
+
+# Targets of the convert nodes inserted by the type inference pass
+conversions = {
+    "float": float,
+    "decimal": decimal.Decimal,
+}
+
 constants = {
     "zero": 0.0,
     "one": 1.0,
@@ -607,45 +1298,43 @@ constants = {
     "sqrt2": functions.SQRT2,
     "sqrt_2pi": functions.SQRT_2PI,
     "imag_i": 1j,
+    "inf": float("inf"),
 }
 
+# Binding power and kind of every operator token, higher binds tighter. The parser reads this
+# table, so an operator is added by giving it an entry here and its evaluation in operators.
 symbols = {
-    "!":   (12, "postfix"), # added factorial operator
-    "$":   (12, "postfix"), # add currency symbol
-    '£':   (12, "postfix"), # add currency symbol
-    "^":   (11, "right"), # add power operator
-    "**":  (11, "right"), # add power operator
-    "@":   (10, "left"), # skip
-    "</":  (10, "left"), # skip
-    "/>":  (10, "left"), # skip
-    "P":   (9, "left"), # add permutation operator
-    "C":   (9, "left"), # add combination operator
-    "*":   (8, "left"), # multiply operator
-    "/":   (8, "left"), # divide operator
-    "//":  (8, "left"), # floor division operator
-    "%":   (8, "left"), # modulus operator
-    ".":   (8, "left"), # multiply operator
-    "><":  (8, "left"), # skip
-    "+":   (7, "left"), # addition operator
-    "-":   (7, "left"), # subtraction operator
-    "<+>": (7, "left"), # skip
-    "<":   (6, "left"), # added less than operator
-    "<=":  (6, "left"), # added less than or equal to operator
-    ">":   (6, "left"), # added greater than operator
-    ">=":  (6, "left"), # added greater than or equal to operator
-    "<*":  (6, "left"), # skip
-    "<==": (6, "left"), # add strict less than or equal to operator
-    ">*":  (6, "left"), # skip
-    ">==": (6, "left"), # add strict greater than or equal to operator
-    "==":  (5, "left"), # add equality operator
-    "!=":  (5, "left"), # add inequality operator
-    "===": (5, "left"), # add strict equality operator
-    "!==": (5, "left"), # add strict inequality operator
-    "&&":  (4, "left"), # added logical AND operator
-    "||":  (3, "left"), # added logical OR operator
-    "=":   (2, "right"),
-    "=>":  (2, "right"),
-    "?":   (1, "ternary"),
-    ":":   (1, "ternary"),
-    ";":   (0, "left"),
+    "!":   (13, "postfix"), # factorial operator
+    "$":   (13, "postfix"), # currency symbol
+    "£":   (13, "postfix"), # currency symbol
+    "~":   (12, "prefix"), # bitwise NOT operator
+    "^":   (11, "right"), # power operator
+    "**":  (11, "right"), # power operator
+    "P":   (10, "left"), # permutation operator
+    "C":   (10, "left"), # combination operator
+    "*":   (9, "left"), # multiply operator
+    "/":   (9, "left"), # divide operator
+    "//":  (9, "left"), # floor division operator
+    "%":   (9, "left"), # modulus operator
+    ".":   (9, "left"), # multiply operator
+    "+":   (8, "left"), # addition operator
+    "-":   (8, "left"), # subtraction operator
+    "<<":  (7, "left"), # left shift operator
+    ">>":  (7, "left"), # right shift operator
+    "&":   (6, "left"), # bitwise AND operator
+    "xor": (5, "left"), # bitwise XOR operator
+    "XOR": (5, "left"), # bitwise XOR operator
+    "|":   (4, "left"), # bitwise OR operator
+    "<":   (3, "left"), # less than operator
+    "<=":  (3, "left"), # less than or equal to operator
+    ">":   (3, "left"), # greater than operator
+    ">=":  (3, "left"), # greater than or equal to operator
+    "<==": (3, "left"), # strict less than or equal to operator
+    ">==": (3, "left"), # strict greater than or equal to operator
+    "==":  (3, "left"), # equality operator
+    "!=":  (3, "left"), # inequality operator
+    "===": (3, "left"), # strict equality operator
+    "!==": (3, "left"), # strict inequality operator
+    "&&":  (2, "left"), # logical AND operator
+    "||":  (1, "left"), # logical OR operator
 }
@@ -1,153 +1,434 @@
-import re, decimal
-from functions import function_list, constants
+import os, sys, decimal, argparse, multiprocessing
+from collections import deque
+from itertools import islice
+from functions import function_list, constants, operators, conversions, arity, symbols
+from cache import LRUCache
+from compiler import CompiledExpression
+from optimizer import fold_constants, free_variables, infer_types, hash_cons
+from vectorized import evaluate_array
+from precise import decimal_function_list, decimal_operators, decimal_constants, precision_context
+from adaptive import AdaptiveEvaluator
+from sequences import Mapped
+from series import Series
+from calculus import Calculus
+from scanner import ParseError, scan
+from nodestore import NodeStore, OPCODES, FIRST_BINARY, NUM, VAR, CALL, FUNCTION, POSTFIX, UNARY, CONVERT, TREE, GUARD, AND
+
+# Names that bind a variable in their body, parsed as name(variable, ...)
+BINDINGS = ('sum', 'product', 'integrate', 'solve', 'minimize')
 
 class Parse:
-    def __init__(self, expression):
-        self.tokens = self.tokenize(expression)
-        self.i = 0
-        self.ast = self.ast = self.logical_or()
+    # Parsed ASTs keyed by expression text, shared by every instance
+    cache = LRUCache(maxsize=1024)
+
+    def __init__(self, expression, fold=True, precision=None, vectorize=False, compact=False, share=True):
+        # With a precision every value is a Decimal carrying that many significant digits
+        self.expression = expression
+        # Evaluate the body of (... for k in ...) over whole chunks with NumPy, float mode only
+        self.vectorize = vectorize and precision is None
+        # Adaptive evaluators keyed by digits and precision limit, each caching its ASTs per precision
+        self.adaptive = {}
+        # Series keyed by their node, each holding its compiled body and closed form
+        self.series = {}
+        # Integrals, roots and minima keyed by variable and body, each holding its compiled body and derivative
+        self.calculus = {}
+        self.precision = precision
+        if precision is None:
+            self.functions, self.constants, self.operators = function_list, constants, operators
+        else:
+            self.functions, self.operators = decimal_function_list, decimal_operators
+            self.constants = decimal_constants(precision)
+
+        # A compact expression keeps its AST as a NodeStore of flat arrays instead of nested tuples
+        key = (expression, fold, precision, compact, share)
+        entry = self.cache.get(key)
+        if entry is None:
+            self.tokens = self.tokenize(expression)
+            self.token = next(self.tokens)
+            parsed = self.parse()
+            # The Decimal engine promotes everything itself, float mode needs explicit boundaries
+            if precision is None:
+                parsed, _ = infer_types(parsed)
+            if fold:
+                with self.context():
+                    parsed = fold_constants(parsed, self.functions, self.operators)
+            # Identical pure subtrees become one node, evaluated once and reused wherever it appears. A node
+            # store writes every occurrence out again, so compact expressions skip the merging
+            shared, sharing = frozenset(), None
+            if compact:
+                parsed = NodeStore(parsed)
+            elif share:
+                parsed, shared, sharing = hash_cons(parsed)
+            entry = (parsed, shared, sharing)
+            self.cache.put(key, entry)
+        parsed, self.shared, self.sharing = entry
+        self.ast, self.store = (None, parsed) if compact else (parsed, None)
+
+    def context(self):
+        ''' Decimal context for the expression, the current one when no precision is set '''
+        if self.precision is None:
+            return decimal.localcontext()
+        return precision_context(self.precision)
 
     def tokenize(self, expression):
-        ''' Tokenize the input expression into numbers, operators, and parentheses '''
-        return re.findall(r'\d+\.\d+|\d+|[a-zA-Z]+|&&|\|\||!==|===|<==|>==|<=|>=|==|!=|<<|>>|//|\*\*|[<>]|[+*/()!$£%\-\^\.&\|~]', expression)
+        ''' Scan the expression lazily into (kind, value, offset) tokens, names classified against this engine '''
+        return scan(expression, self.functions, self.constants)
 
     def peek(self):
-        ''' Look at the next token without consuming it '''
-        return self.tokens[self.i] if self.i < len(self.tokens) else None
+        ''' Look at the value of the next token without consuming it, None at the end '''
+        return self.token[1]
 
     def eat(self):
-        ''' Consume and return the next token '''
-        t = self.peek()
-        self.i += 1
+        ''' Consume the next token and return its value '''
+        t = self.token[1]
+        self.token = next(self.tokens)
         return t
 
-    def _exp(self, symbols, func):
-        ''' Generic expression parser for left-associative binary operations '''
-        node = func()
-        while self.peek() in symbols:
-            op = self.eat()
-            node = ('symbol', op, node, func())
-        return node
-    
-    def logical_or(self):
-        ''' Parse logical OR '''
-        return self._exp(('||',), self.logical_and)
-
-    def logical_and(self):
-        ''' Parse logical AND '''
-        return self._exp(('&&',), self.comparison)
-    
-    def comparison(self):
-        return self._exp(('<', '<=', '>', '>=', '==', '!=', '===', '!==', '<==', '>=='), self.bitor)
-
-    def bitor(self):
-        ''' Parse bitwise OR '''
-        return self._exp(('|',), self.bitxor)
-
-    def bitxor(self):
-        ''' Parse bitwise XOR '''
-        return self._exp(('xor', 'XOR'), self.bitand)
-
-    def bitand(self):
-        ''' Parse bitwise AND '''
-        return self._exp(('&',), self.shift)
-
-    def shift(self):
-        ''' Parse bitwise shifts '''
-        return self._exp(('<<', '>>'), self.expr)
-
-    def expr(self):
-        ''' Parse add and subtract '''
-        return self._exp(('+', '-'), self.term)
-
-    def term(self):
-        ''' Parse multiply and divide '''
-        return self._exp(('*', '/', '//', '%', '.'), self.percomb)
-
-    def percomb(self):
-        ''' Parse permutations and combinations '''
-        return self._exp(('P', 'C'), self.power)
-
-    def power(self):
-        ''' Raise to the power '''
-        node = self.prefix()
-        if self.peek() in ('^', '**'):
-            self.eat()
-            node = ('symbol', '^', node, self.power())
-        return node
+    def parse(self):
+        ''' Parse the expression over explicit stacks, so nesting costs no Python recursion
 
-    def prefix(self):
-        if self.peek() == '~':
-            self.eat()
-            return ('unary', '~', self.prefix())
-        return self.postfix()
-
-    def postfix(self):
-        ''' Parse postfix operators like factorial '''
-        node = self.factor()
-        while self.peek() in ('!','$', '£'):
-            op = self.eat()
-            node = ('postfix', op, node)
-        return node
-
-    def factor(self):
-        ''' Parse numbers and parenthesized '''
-        t = self.eat()
-        if t == '(':
-            n = self.logical_or()
-            self.eat()
-            return n
-        
-        # Skip symbol
-        if t in ['£', '$']:
-            return self.factor()
+        Operands wait on values and operators on ops until an operator binding no tighter arrives, which
+        gives the precedence and associativity of the symbols table. Brackets, function arguments, the
+        binding forms and mapped sequences each open a frame, and a token that is not an operator closes
+        the operand of the innermost one. '''
+        values, ops = [], []
+        # [kind, len(ops) when opened, ...] with the rest depending on the kind:
+        # paren offset mapped, function name args mapped, binding name variable args, map name body
+        frames = [['top', 0]]
+        tokens = self.tokens
+        operand = True
+        while True:
+            kind, t, offset = self.token
 
-        # check for function
-        if t in function_list:
-            self.eat()
-            arg = self.logical_or()
+            if operand:
+                self.token = next(tokens)
+                # Numbers are the most common primary and arrive already converted
+                if kind == 'num':
+                    values.append(('num', t))
+                elif kind == 'constant':
+                    values.append(('num', self.constants[t]))
+                elif kind == 'function':
+                    if self.eat() != '(':
+                        raise ParseError(f"Function '{t}' must be followed by '('")
+                    if self.peek() != ')':
+                        frames.append(['function', len(ops), t, [], False])
+                        continue
+                    self.eat()
+                    values.append(self._function(t, []))
+                elif kind == 'name' and t in BINDINGS:
+                    if self.eat() != '(':
+                        raise ParseError(f"'{t}' must be followed by '('")
+                    kind, name, _ = self.token
+                    self.eat()
+                    if kind != 'name':
+                        series = t in ('sum', 'product')
+                        raise ParseError(f"Expected the {'index ' if series else ''}variable of '{t}', got {str(name)!r}")
+                    if self.peek() == ',':
+                        self.eat()
+                        frames.append(['binding', len(ops), t, name, []])
+                        continue
+                    if self.eat() != ')':
+                        raise ParseError(f"Missing ')' after the arguments of '{t}'")
+                    values.append(self._binding(t, name, []))
+                elif kind == 'name':
+                    # any other name is a free variable
+                    values.append(('var', t))
+                elif t == '(':
+                    frames.append(['paren', len(ops), offset, False])
+                    continue
+                elif t in ('£', '$'):
+                    # Skip symbol, the operand has to follow without a prefix operator
+                    if symbols.get(self.peek(), (0, ''))[1] == 'prefix':
+                        raise ParseError(f'Unexpected {self.peek()!r} at offset {self.token[2]}')
+                    continue
+                elif symbols.get(t, (0, ''))[1] == 'prefix':
+                    ops.append((symbols[t][0], t, 'prefix'))
+                    continue
+                elif kind == 'end':
+                    raise ParseError(f'Unexpected end of expression at offset {offset}')
+                else:
+                    raise ParseError(f'Unexpected {str(t)!r} at offset {offset}')
+                operand = False
+                continue
+
+            entry = symbols.get(t)
+            if entry is not None and entry[1] != 'prefix':
+                self.token = next(tokens)
+                power, kind = entry
+                if kind == 'postfix':
+                    values[-1] = ('postfix', t, values[-1])
+                    continue
+                # Left associative operators apply the waiting ones of the same power first
+                base = frames[-1][1]
+                while len(ops) > base and (ops[-1][0] > power or ops[-1][0] == power and kind == 'left'):
+                    _, op, waiting = ops.pop()
+                    if waiting == 'prefix':
+                        values[-1] = ('unary', op, values[-1])
+                    else:
+                        right = values.pop()
+                        values[-1] = ('symbol', op, values[-1], right)
+                ops.append((power, '^' if t == '**' else t, kind))
+                operand = True
+                continue
+
+            # The operand of the innermost frame is complete
+            frame = frames[-1]
+            while len(ops) > frame[1]:
+                _, op, waiting = ops.pop()
+                if waiting == 'prefix':
+                    values[-1] = ('unary', op, values[-1])
+                else:
+                    right = values.pop()
+                    values[-1] = ('symbol', op, values[-1], right)
+            opened = frame[0]
+
+            if opened == 'top':
+                if kind != 'end':
+                    raise ParseError(f'Unexpected {str(t)!r} at offset {offset}')
+                return values[0]
+
+            if opened == 'map':
+                # The token is left for the enclosing frame, which takes no second for
+                frames.pop()
+                values[-1] = ('map', frame[2], frame[3], values[-1])
+                frames[-1][-1] = True
+                continue
+
+            if t == 'for' and opened != 'binding' and not frame[-1]:
+                self.eat()
+                kind, name, _ = self.token
+                self.eat()
+                if kind != 'name':
+                    raise ParseError(f"Expected a variable name after 'for', got {str(name)!r}")
+                if self.eat() != 'in':
+                    raise ParseError(f"Expected 'in' after 'for {name}'")
+                frames.append(['map', len(ops), name, values.pop()])
+                operand = True
+                continue
+
+            if opened == 'paren':
+                if t != ')':
+                    raise ParseError(f"Missing ')' for the '(' at offset {frame[2]}")
+                self.eat()
+                frames.pop()
+                continue
+
+            # Function and binding arguments
+            args = frame[3] if opened == 'function' else frame[4]
+            if t == ',':
+                self.eat()
+                args.append(values.pop())
+                frame[-1] = frame[-1] if opened == 'binding' else False
+                operand = True
+                continue
+            if t != ')':
+                raise ParseError(f"Missing ')' after the arguments of '{frame[2]}'")
             self.eat()
-            return ('function', t, arg)
+            frames.pop()
+            args.append(values.pop())
+            values.append(self._function(frame[2], args) if opened == 'function' else self._binding(frame[2], frame[3], args))
+
+    def _function(self, t, args):
+        ''' Function node for t, its arguments counted against its signature '''
+        low, high = arity(t)
+        if len(args) < low or (high is not None and len(args) > high):
+            expected = str(low) if low == high else f'{low} or more' if high is None else f'{low} to {high}'
+            raise ParseError(f"Function '{t}' takes {expected} argument{'' if expected == '1' else 's'}, got {len(args)}")
+        return ('function', t, *args)
 
-        # check for constant
-        if t in constants:
-            return ('num', constants[t])
+    def _binding(self, t, name, args):
+        ''' Node for the forms that bind a variable in their body, the variable comes first
 
-        # must be a number
-        if '.' in t:
-            return ('num', decimal.Decimal(t))
-        return ('num', int(t))
+        sum(k, lo, hi, body) and product(k, lo, hi, body) run k over the integers, integrate(x, a, b, body)
+        integrates over x, all three with an optional tolerance after the body. solve(x, x0, body) and
+        solve(x, lo, hi, body) find a root from a start or inside a bracket, minimize(x, lo, hi, body) the
+        point of the least value. '''
+        series = t in ('sum', 'product')
+        if series or t == 'integrate':
+            if len(args) not in (3, 4):
+                kind = 'an index' if series else 'a variable'
+                raise ParseError(f"'{t}' takes {kind}, two bounds, a body and an optional tolerance")
+            lo, hi, body, *tol = args
+            if series:
+                return ('series', t, name, lo, hi, body, *tol)
+            return ('calculus', t, name, body, lo, hi, *tol)
+        if t == 'solve' and len(args) not in (2, 3):
+            raise ParseError("'solve' takes a variable, a starting point or two bracketing points and a body")
+        if t == 'minimize' and len(args) != 3:
+            raise ParseError("'minimize' takes a variable, two bounds and a body")
+        *points, body = args
+        return ('calculus', t, name, body, *points)
 
-    def evaluate(self, node=None):
-        ''' Evaluate the AST recursively '''
+    def evaluate(self, node=None, variables=None, **values):
+        ''' Evaluate the AST in post-order over an explicit stack, free variables are passed as keywords '''
+        if variables is None:
+            variables = values
+            if self.precision is not None:
+                with self.context():
+                    return self.evaluate(node, variables)
         if not node:
+            if self.store is not None:
+                return self._walk(variables)
             node = self.ast
 
-        if node[0] == 'num':
-            return node[1]
+        # Values of the subexpressions that appear more than once, by node id, for this evaluation only
+        shared, memo = self.shared, {}
+        results = []
+        # Nodes are pushed to have their operands pushed, then once more as ('apply', node, count)
+        # to take the count values their operands left on results
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = node[0]
+
+            if kind == 'num':
+                results.append(node[1])
+                continue
+
+            if kind == 'var':
+                try:
+                    results.append(variables[node[1]])
+                except KeyError:
+                    raise ValueError(f"Variable '{node[1]}' has no value") from None
+                continue
+
+            if kind != 'apply':
+                if shared and id(node) in memo:
+                    results.append(memo[id(node)])
+                    continue
+                if kind == 'symbol':
+                    if node[1] in ('&&', '||'):
+                        # The right hand side waits until the left one has been seen
+                        stack += (('apply', node, 1), node[2])
+                    else:
+                        stack += (('apply', node, 2), node[3], node[2])
+                    continue
+                # Bound variables and bodies are evaluated by their own nodes, only the rest are operands
+                if kind == 'map':
+                    operands = node[3:]
+                elif kind == 'series':
+                    operands = node[3:5] + node[6:]
+                elif kind == 'calculus':
+                    operands = node[4:]
+                else:
+                    operands = node[2:]
+                stack.append(('apply', node, len(operands)))
+                stack += reversed(operands)
+                continue
+
+            _, node, count = node
+            kind = node[0]
+            if kind == 'symbol':
+                op = node[1]
+                if count == 1:
+                    a = results[-1]
+                    if a if op == '&&' else not a:
+                        results.pop()
+                        stack.append(node[3])
+                    continue
+                b = results.pop()
+                results[-1] = self._operate(op, results[-1], b)
+                if shared and id(node) in shared:
+                    memo[id(node)] = results[-1]
+                continue
+
+            if count:
+                args = results[-count:]
+                del results[-count:]
+            else:
+                args = []
+
+            if kind == 'function':
+                results.append(self.functions[node[1]](*args))
+
+            elif kind == 'map':
+                _, name, body, _ = node
+                vector = (lambda arrays, body=body: evaluate_array(body, arrays)) if self.vectorize else None
+                results.append(Mapped(name, lambda scope, body=body: self.evaluate(body, scope), args[0], variables, vector))
 
-        if node[0] == 'function':
-            _, name, arg = node
-            val = self.evaluate(arg)
-            return function_list[name](val)
+            elif kind == 'series':
+                _, op, name, lo, hi, body, *tol = node
+                if node not in self.series:
+                    compile = lambda ast: CompiledExpression(ast, self.functions, self.operators).fn
+                    self.series[node] = Series(op, name, body, compile, self.functions, self.operators)
+                lo, hi, *tol = args
+                results.append(self.series[node].evaluate(lo, hi, variables, tol[0] if tol else None))
 
-        if node[0] == 'postfix':
-            _, op, inner = node
-            val = self.evaluate(inner)
-            if op in ('$', '£'):
-                return val
-            if op == '!':
-                return function_list['factorial'](val)
+            elif kind == 'calculus':
+                _, op, name, body, *_ = node
+                results.append(self._calculus(name, body).evaluate(op, variables, *args))
 
-        _, op, left, right = node
-        a = self.evaluate(left)
+            elif kind == 'postfix':
+                val, = args
+                if node[1] == '!':
+                    val = self.functions['factorial'](val)
+                results.append(val)
 
-        if op == '&&':
-            return a and self.evaluate(right)
-        if op == '||':
-            return a or self.evaluate(right)
+            elif kind == 'convert':
+                results.append(conversions[node[1]](args[0]))
 
-        b = self.evaluate(right)
+            elif kind == 'unary':
+                results.append(~args[0])
+
+            if shared and id(node) in shared:
+                memo[id(node)] = results[-1]
+
+        return results.pop()
+
+    def _walk(self, variables):
+        ''' Evaluate the node store in one pass over its arrays, values wait on a stack '''
+        store = self.store
+        kinds, operands, arguments, pool = store.kinds, store.operands, store.arguments, store.pool
+        functions, operate = self.functions, self._operate
+        stack = []
+        push, pop = stack.append, stack.pop
+        i, n = 0, len(kinds)
+        while i < n:
+            code = kinds[i]
+            if code >= FIRST_BINARY:
+                b = pop()
+                stack[-1] = operate(OPCODES[code], stack[-1], b)
+            elif code == NUM:
+                push(pool[operands[i]])
+            elif code == VAR:
+                name = pool[operands[i]]
+                try:
+                    push(variables[name])
+                except KeyError:
+                    raise ValueError(f"Variable '{name}' has no value") from None
+            elif code == CALL:
+                stack[-1] = functions[pool[operands[i]]](stack[-1])
+            elif code == GUARD:
+                # A false left operand decides &&, a true one ||, and the right operand is skipped
+                end = operands[i]
+                if (not stack[-1]) if kinds[end] == AND else stack[-1]:
+                    i = end + 1
+                    continue
+                pop()
+            elif code == FUNCTION:
+                start = operands[i]
+                count = arguments[start + 1]
+                args = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                push(functions[pool[arguments[start]]](*args))
+            elif code == POSTFIX:
+                if pool[operands[i]] == '!':
+                    stack[-1] = functions['factorial'](stack[-1])
+            elif code == UNARY:
+                stack[-1] = ~stack[-1]
+            elif code == CONVERT:
+                stack[-1] = conversions[pool[operands[i]]](stack[-1])
+            elif code == TREE:
+                push(self.evaluate(pool[operands[i]], variables))
+            # && and || have the value of their right operand when it was not skipped
+            i += 1
+        return stack[0]
+
+    def _operate(self, op, a, b):
+        ''' Apply the binary operator op '''
+        # Decimal operators never fall back to float
+        if self.precision is not None:
+            return self.operators[op](a, b)
 
         # Arithmetic operators
         if op == '+':
@@ -169,16 +450,16 @@ class Parse:
         
         # Permutation and Combination
         elif op == 'P':
-            return function_list['perm'](a, b)
+            return self.functions['perm'](a, b)
         elif op == 'C':
-            return function_list['comb'](a, b)
+            return self.functions['comb'](a, b)
         
         # bitwise operators
         elif op == '&':
             return a & b
         elif op == '|':
             return a | b
-        elif op == 'xor':
+        elif op in ('xor', 'XOR'):
             return a ^ b
         elif op == '<<':
             return a << b
@@ -207,16 +488,151 @@ class Parse:
         elif op == '>==':
             return type(a) is type(b) and a >= b
 
+    def evaluate_adaptive(self, digits=15, max_precision=1000, **values):
+        ''' Evaluate with floats, re-evaluating only the subtrees whose error bound is too wide at
+        increasing Decimal precision until digits significant digits are guaranteed.
+        Returns the value and the number of subtree escalations '''
+        key = (digits, max_precision)
+        if key not in self.adaptive:
+            self.adaptive[key] = AdaptiveEvaluator(lambda p: Parse(self.expression, fold=False, precision=p).ast, digits, max_precision)
+        evaluator = self.adaptive[key]
+        value = evaluator.evaluate(values)
+        return value, evaluator.escalations
+
+    def _calculus(self, name, body):
+        ''' Integrals, roots and minima of body over name, built once per body '''
+        if self.precision is not None:
+            raise ValueError('integrate, solve and minimize evaluate in floats, parse without a precision')
+        key = (name, body)
+        if key not in self.calculus:
+            compile = lambda ast: CompiledExpression(ast, self.functions, self.operators).fn
+            self.calculus[key] = Calculus(name, body, compile, self.functions, self.operators)
+        return self.calculus[key]
+
+    def integrate(self, name, lo, hi, tol=None, /, **values):
+        ''' Integrate the expression over name from lo to hi, other free variables are passed as keywords.
+        Returns the value and the statistics of the quadrature '''
+        calculus = self._calculus(name, self.tree())
+        return calculus.integrate(values, lo, hi, tol), calculus.stats
+
+    def solve(self, name, lo, hi=None, /, **values):
+        ''' Root of the expression in name, by Newton's method from lo or inside the bracket lo, hi.
+        An equation left == right is solved for left - right = 0. Returns the root and the statistics '''
+        calculus = self._calculus(name, self.tree())
+        return calculus.solve(values, lo, hi), calculus.stats
+
+    def minimize(self, name, lo, hi, /, **values):
+        ''' Point between lo and hi where the expression is least. Returns the point and the statistics '''
+        calculus = self._calculus(name, self.tree())
+        return calculus.minimize(values, lo, hi), calculus.stats
+
+    def evaluate_batch(self, **arrays):
+        ''' Evaluate the AST once over NumPy arrays of variable values '''
+        return evaluate_array(self.tree(), arrays)
+
+    @property
+    def variables(self):
+        ''' Names of the free variables in the expression '''
+        return free_variables(self.tree())
+
+    def compile(self):
+        ''' Compile the AST into a reusable CompiledExpression '''
+        return CompiledExpression(self.tree(), self.functions, self.operators, self.precision, self.vectorize)
+
+    def tree(self):
+        ''' The tuple AST, rebuilt from the node store of a compact expression '''
+        return self.ast if self.store is None else self.store.tree()
+
     def __str__(self):
         v = self.evaluate()
-        if isinstance(v, float):
-            return format(decimal.Decimal(v).normalize(), "f")
-        if isinstance(v, decimal.Decimal):
-            return format(v.normalize(), "f")
+        with self.context():
+            if isinstance(v, float):
+                return format(decimal.Decimal(v).normalize(), "f")
+            if isinstance(v, decimal.Decimal):
+                return format(v.normalize(), "f")
         return str(v)
 
-if __name__ == '__main__':
+def evaluate_lines(lines, precision=None):
+    ''' Evaluate a chunk of expressions, returning (ok, text) for each line '''
+    results = []
+    for line in lines:
+        if not line.strip():
+            results.append((True, ''))
+            continue
+        try:
+            results.append((True, str(Parse(line, precision=precision))))
+        except Exception as e:
+            results.append((False, f'{type(e).__name__}: {e}'))
+    return results
+
+def batch(source, output, workers=None, chunksize=1000, errors=sys.stderr, precision=None):
+    ''' Evaluate one expression per line from source, writing results in input order '''
+    workers = workers or os.cpu_count() or 1
+    lines = (line.rstrip('\r\n') for line in source)
+    chunks = iter(lambda: list(islice(lines, chunksize)), [])
+    number = 0
+    failures = 0
+
+    def write(results):
+        nonlocal number, failures
+        for ok, text in results:
+            number += 1
+            if ok:
+                output.write(text + '\n')
+            else:
+                failures += 1
+                output.write(f'error: {text}\n')
+                errors.write(f'line {number}: {text}\n')
+
+    if workers == 1:
+        for chunk in chunks:
+            write(evaluate_lines(chunk, precision))
+        return failures
+
+    # Keep a bounded number of chunks in flight so huge inputs stream in constant memory
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(evaluate_lines, (chunk, precision)))
+            if len(pending) >= 2 * workers:
+                write(pending.popleft().get())
+        while pending:
+            write(pending.popleft().get())
+    return failures
+
+def repl(precision=None):
+    ''' Read and evaluate expressions interactively '''
     while True:
-        expression = input('> ')
-        t = Parse(expression)
+        try:
+            expression = input('> ')
+        except EOFError:
+            break
+        t = Parse(expression, precision=precision)
         print(t)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='A scientific calculator with support for maths functions and constants')
+    parser.add_argument('--batch', metavar='FILE', nargs='?', const='-', help='evaluate one expression per line from FILE, or stdin if omitted')
+    parser.add_argument('-o', '--output', metavar='FILE', default='-', help='write batch results to FILE instead of stdout')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes, defaults to the CPU count')
+    parser.add_argument('--chunksize', type=int, default=1000, help='expressions sent to a worker at a time')
+    parser.add_argument('-p', '--precision', metavar='DIGITS', type=int, default=None, help='evaluate with Decimal arithmetic to DIGITS significant digits')
+    args = parser.parse_args(argv)
+
+    if args.batch is None:
+        repl(args.precision)
+        return 0
+
+    source = sys.stdin if args.batch == '-' else open(args.batch)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        failures = batch(source, output, args.workers, args.chunksize, precision=args.precision)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+from array import array
+from functions import constant_key
+
+# Opcodes of the node store. Binary operators have one opcode each, so every node has a single operand
+BINARY = ('+', '-', '*', '/', '^', '//', '%', '.', 'P', 'C', '&', '|', 'xor', 'XOR', '<<', '>>',
+          '<', '<=', '>', '>=', '==', '!=', '===', '!==', '<==', '>==')
+OPCODES = ('num', 'var', 'call', 'function', 'postfix', 'unary', 'convert', 'tree', 'guard', '&&', '||') + BINARY
+NUM, VAR, CALL, FUNCTION, POSTFIX, UNARY, CONVERT, TREE, GUARD, AND, OR = range(11)
+FIRST_BINARY = OPCODES.index(BINARY[0])
+CODES = {op: code for code, op in enumerate(OPCODES)}
+# Nodes that bind a variable keep their tuple form, their bodies are compiled from it
+TREES = ('map', 'series', 'calculus')
+
+class NodeStore:
+    ''' An AST as parallel arrays in post-order, one opcode byte and one int operand per node
+
+    Children come before their parent and the right operand of a node is the node just before it, so the
+    operand only has to give the left child of a binary node. Leaves point into a pool of constants and
+    names, calls of any but one argument into the arguments array as the name and the count of arguments
+    before them. && and || put a guard node between their operands that jumps past the right one when the
+    left decides. '''
+
+    def __init__(self, ast):
+        self.kinds = array('B')
+        self.operands = array('i')
+        self.arguments = array('i')
+        self.pool = []
+        self.shared = {}
+        roots, guards = [], []
+        # Nodes are pushed to push their children, then once more as (None, node) to be written
+        stack = [ast]
+        while stack:
+            node = stack.pop()
+            kind = node[0]
+
+            if kind == 'num':
+                roots.append(self._write(NUM, self._constant(node[1])))
+            elif kind == 'var':
+                roots.append(self._write(VAR, self._constant(node[1])))
+            elif kind in TREES:
+                self.pool.append(node)
+                roots.append(self._write(TREE, len(self.pool) - 1))
+            elif kind == 'guard':
+                guards.append(self._write(GUARD, -1))
+            elif kind is not None:
+                if kind == 'symbol' and node[1] in ('&&', '||'):
+                    stack += ((None, node), node[3], ('guard',), node[2])
+                else:
+                    stack.append((None, node))
+                    stack += reversed(node[2:])
+            else:
+                _, node = node
+                kind = node[0]
+                if kind == 'symbol':
+                    roots.pop()
+                    left = roots.pop()
+                    if node[1] in ('&&', '||'):
+                        guard = guards.pop()
+                        self.operands[guard] = len(self.kinds)
+                        roots.append(self._write(CODES[node[1]], guard))
+                    else:
+                        roots.append(self._write(CODES[node[1]], left))
+                elif kind == 'function':
+                    count = len(node) - 2
+                    del roots[len(roots) - count:]
+                    if count == 1:
+                        roots.append(self._write(CALL, self._constant(node[1])))
+                    else:
+                        self.arguments.extend((self._constant(node[1]), count))
+                        roots.append(self._write(FUNCTION, len(self.arguments) - 2))
+                else:
+                    # postfix, unary and convert name their operator in the pool
+                    roots.pop()
+                    roots.append(self._write(CODES[kind], self._constant(node[1])))
+        # Only needed while writing
+        del self.shared
+
+    def _write(self, code, operand):
+        ''' Append a node, returning its index '''
+        self.kinds.append(code)
+        self.operands.append(operand)
+        return len(self.kinds) - 1
+
+    def _constant(self, value):
+        ''' Pool index of value, equal constants and names share one entry '''
+        key = constant_key(value)
+        if key is None:
+            self.pool.append(value)
+            return len(self.pool) - 1
+        index = self.shared.get(key)
+        if index is None:
+            index = self.shared[key] = len(self.pool)
+            self.pool.append(value)
+        return index
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def tree(self):
+        ''' Rebuild the tuple AST '''
+        kinds, operands, arguments, pool = self.kinds, self.operands, self.arguments, self.pool
+        built = []
+        for i, code in enumerate(kinds):
+            operand = operands[i]
+            if code >= FIRST_BINARY:
+                right = built.pop()
+                built[-1] = ('symbol', OPCODES[code], built[-1], right)
+            elif code == NUM:
+                built.append(('num', pool[operand]))
+            elif code == VAR:
+                built.append(('var', pool[operand]))
+            elif code == CALL:
+                built[-1] = ('function', pool[operand], built[-1])
+            elif code == FUNCTION:
+                count = arguments[operand + 1]
+                args = built[len(built) - count:]
+                del built[len(built) - count:]
+                built.append(('function', pool[arguments[operand]], *args))
+            elif code == TREE:
+                built.append(pool[operand])
+            elif code in (AND, OR):
+                right = built.pop()
+                built[-1] = ('symbol', OPCODES[code], built[-1], right)
+            elif code != GUARD:
+                built[-1] = (OPCODES[code], pool[operand], built[-1])
+        return built[0]
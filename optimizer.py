@@ -0,0 +1,324 @@
+import decimal
+from functions import function_list, operators, impure_functions, conversions, constant_key
+
+# Result kinds of functions that do not return a float
+INT_FUNCTIONS = {'factorial', 'gcd', 'lcm', 'isqrt', 'floor', 'ceil', 'trunc', 'sgn'}
+# Exact for integer arguments, through lgamma otherwise
+COUNTING_FUNCTIONS = {'perm', 'comb'}
+BOOL_FUNCTIONS = {'isnan', 'isinf', 'isfinite', 'isclose'}
+SAME_KIND_FUNCTIONS = {'abs', 'fabs'}
+TUPLE_FUNCTIONS = {'sincos', 'modf'}
+SEQUENCE_FUNCTIONS = {'range'}
+
+ARITHMETIC = ('+', '-', '*', '.', '/', '//', '%', '^')
+COMPARISONS = ('<', '<=', '>', '>=', '==', '!=', '===', '!==', '<==', '>==')
+EXACT = ('bool', 'int')
+
+def is_constant(node):
+    return node[0] == 'num'
+
+def children(node):
+    ''' The subtrees of a node, in evaluation order '''
+    if node[0] in ('num', 'var'):
+        return ()
+    return [child for child in node[2:] if isinstance(child, tuple)]
+
+def postorder(node, visit):
+    ''' Call visit on every node after its children with their results, over an explicit stack so
+    the depth of the tree costs no Python recursion. Returns the result for node '''
+    results = []
+    # Nodes are pushed to expand them, then once more as (None, node, count) to visit them with the
+    # count results their children left
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node[0] is None:
+            _, node, count = node
+            done = results[-count:]
+            del results[-count:]
+            results.append(visit(node, done))
+            continue
+        below = children(node)
+        if below:
+            stack.append((None, node, len(below)))
+            stack += reversed(below)
+        else:
+            results.append(visit(node, ()))
+    return results[0]
+
+def free_variables(node):
+    ''' Return the set of variable names used in the AST '''
+    return postorder(node, _free_variables)
+
+def _free_variables(node, names):
+    if node[0] == 'var':
+        return {node[1]}
+    if node[0] in ('map', 'series', 'calculus'):
+        # The body is the only child that sees the bound variable
+        name = node[1] if node[0] == 'map' else node[2]
+        body = 2 if node[0] == 'series' else 0
+        names = list(names)
+        names[body] = names[body] - {name}
+    return set().union(*names)
+
+def value_kind(value):
+    ''' Kind of a literal or folded constant '''
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, decimal.Decimal):
+        return 'decimal'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, complex):
+        return 'complex'
+    return 'any'
+
+def to_float(node, kind):
+    ''' Wrap a Decimal subtree so it runs exact internally and hands a float to its parent '''
+    if kind != 'decimal':
+        return node
+    if node[0] == 'num':
+        return ('num', float(node[1]))
+    return ('convert', 'float', node)
+
+def arithmetic_kind(op, a, b, right):
+    ''' Kind produced by an arithmetic operator, None when Decimal meets float '''
+    if a in EXACT and b in EXACT:
+        if op == '/':
+            return 'float'
+        if op == '^' and not (right[0] == 'num' and value_kind(right[1]) in EXACT and right[1] >= 0):
+            return 'any'
+        return 'int'
+    if 'decimal' in (a, b):
+        if a in EXACT + ('decimal',) and b in EXACT + ('decimal',):
+            return 'decimal'
+        return None
+    if 'any' in (a, b):
+        return 'any'
+    return 'complex' if 'complex' in (a, b) else 'float'
+
+def counting_kind(kinds):
+    ''' Kind of perm or comb, exact only when both arguments are '''
+    if all(k in EXACT for k in kinds):
+        return 'int'
+    return 'any' if 'any' in kinds else 'float'
+
+def infer_types(node):
+    ''' Return the AST with conversions at the boundaries between Decimal and float subtrees, and its kind
+
+    Integer subtrees stay exact, subtrees made only of Decimal literals and integers stay Decimal, and a
+    Decimal subtree that meets a float, a float function or a variable is converted to float once.
+    '''
+    return postorder(node, _infer_types)
+
+def _infer_types(node, typed):
+    ''' One step of infer_types, typed holds the (node, kind) pairs of the children '''
+    kind = node[0]
+
+    if kind == 'num':
+        return node, value_kind(node[1])
+
+    if kind == 'var':
+        return node, 'any'
+
+    if kind == 'convert':
+        return node, node[1]
+
+    if kind == 'function':
+        name = node[1]
+        args, kinds = zip(*typed) if typed else ((), ())
+        if name in INT_FUNCTIONS:
+            return ('function', name, *args), 'int'
+        if name in COUNTING_FUNCTIONS and len(kinds) == 2:
+            k = counting_kind(kinds)
+            if k != 'int':
+                args = [to_float(arg, a) for arg, a in zip(args, kinds)]
+            return ('function', name, *args), k
+        if name in SAME_KIND_FUNCTIONS:
+            return ('function', name, *args), kinds[0]
+        node = ('function', name, *(to_float(arg, k) for arg, k in zip(args, kinds)))
+        if name in BOOL_FUNCTIONS:
+            return node, 'bool'
+        if name in TUPLE_FUNCTIONS or name in SEQUENCE_FUNCTIONS:
+            return node, 'any'
+        return node, 'complex' if 'complex' in kinds else 'float'
+
+    if kind == 'map':
+        # Sequence values are not tracked, each element leaves the body as a float
+        (body, k), (source, _) = typed
+        return ('map', node[1], to_float(body, k), source), 'any'
+
+    if kind == 'series':
+        _, op, name = node[:3]
+        (lo, _), (hi, _), (body, k), *tol = typed
+        return ('series', op, name, lo, hi, to_float(body, k), *(n for n, _ in tol)), 'any'
+
+    if kind == 'calculus':
+        # Integrals, roots and minima are always evaluated in floats
+        _, op, name = node[:3]
+        (body, k), *args = typed
+        return ('calculus', op, name, to_float(body, k), *(to_float(*arg) for arg in args)), 'float'
+
+    if kind == 'postfix':
+        (inner, k), = typed
+        return ('postfix', node[1], inner), 'int' if node[1] == '!' else k
+
+    if kind == 'unary':
+        (inner, _), = typed
+        return ('unary', node[1], inner), 'int'
+
+    op = node[1]
+    (left, a), (right, b) = typed
+
+    if op in ARITHMETIC:
+        k = arithmetic_kind(op, a, b, right)
+        if k is None:
+            left, right = to_float(left, a), to_float(right, b)
+            k = arithmetic_kind(op, 'float' if a == 'decimal' else a, 'float' if b == 'decimal' else b, right)
+        return ('symbol', op, left, right), k
+
+    if op in ('P', 'C'):
+        k = counting_kind((a, b))
+        if k != 'int':
+            left, right = to_float(left, a), to_float(right, b)
+        return ('symbol', op, left, right), k
+
+    if op in ('&&', '||') and a != b:
+        # Either operand may be the result, so neither can be left as a Decimal next to a float
+        return ('symbol', op, to_float(left, a), to_float(right, b)), 'any'
+
+    node = ('symbol', op, left, right)
+    if op in COMPARISONS:
+        return node, 'bool'
+    if op in ('&&', '||'):
+        return node, a
+    # The bitwise operators
+    return node, 'int'
+
+def fold_constants(node, functions=function_list, operators=operators):
+    ''' Collapse pure constant subtrees into single num nodes '''
+    return postorder(node, lambda node, folded: _fold_constants(node, folded, functions, operators))
+
+def _fold_constants(node, folded, functions, operators):
+    ''' One step of fold_constants, folded holds the already folded children '''
+    kind = node[0]
+
+    if kind in ('num', 'var'):
+        return node
+
+    if kind == 'function':
+        name = node[1]
+        node = ('function', name, *folded)
+        if name in impure_functions or not all(is_constant(arg) for arg in folded):
+            return node
+        return _fold(node, functions[name], *(arg[1] for arg in folded))
+
+    if kind == 'map':
+        return ('map', node[1], *folded)
+
+    if kind in ('series', 'calculus'):
+        return (kind, node[1], node[2], *folded)
+
+    if kind == 'postfix':
+        op = node[1]
+        inner, = folded
+        if op in ('$', '£'):
+            return inner
+        node = ('postfix', op, inner)
+        if 'factorial' in impure_functions or not is_constant(inner):
+            return node
+        return _fold(node, functions['factorial'], inner[1])
+
+    if kind == 'convert':
+        target = node[1]
+        inner, = folded
+        node = ('convert', target, inner)
+        if not is_constant(inner):
+            return node
+        return _fold(node, conversions[target], inner[1])
+
+    if kind == 'unary':
+        inner, = folded
+        node = ('unary', node[1], inner)
+        if not is_constant(inner):
+            return node
+        return _fold(node, operators['~'], inner[1])
+
+    op = node[1]
+    left, right = folded
+    node = ('symbol', op, left, right)
+
+    # Short circuit operators only need a constant left hand side
+    if op in ('&&', '||') and is_constant(left):
+        a = left[1]
+        if op == '&&':
+            return right if a else left
+        return left if a else right
+
+    if not (is_constant(left) and is_constant(right)):
+        return node
+    if op in ('P', 'C') and ('perm' if op == 'P' else 'comb') in impure_functions:
+        return node
+    return _fold(node, operators[op], left[1], right[1])
+
+def _fold(node, fn, *args):
+    ''' Evaluate fn now, leaving node untouched if it raises so the error surfaces at evaluation '''
+    try:
+        return ('num', fn(*args))
+    except Exception:
+        return node
+
+def hash_cons(node):
+    ''' Merge structurally identical pure subtrees into one node, turning the AST into a DAG
+
+    Returns the DAG, the ids of its operator nodes with more than one parent, which are worth evaluating
+    once and reusing, and counts of the nodes in the tree, the distinct nodes and the shared ones. '''
+    table, parents = {}, {}
+    nodes = unmerged = 0
+
+    def visit(node, below):
+        nonlocal nodes, unmerged
+        nodes += 1
+        if node[0] == 'num':
+            key = constant_key(node[1])
+            pure = key is not None
+            key = ('num', key)
+        else:
+            # Children are already merged, so they are told apart by identity
+            below = iter(below)
+            node = tuple(next(below) if isinstance(part, tuple) else part for part in node)
+            parts = children(node)
+            key = (node[0],) + tuple(id(part) if isinstance(part, tuple) else part for part in node[1:])
+            pure = all(id(part) in parents for part in parts) and _pure(node)
+        if not pure:
+            # An impure node is never merged, nor is anything above it. Nor are constants without a key
+            unmerged += 1
+            return node
+        merged = table.get(key)
+        if merged is not None:
+            return merged
+        table[key] = node
+        parents[id(node)] = 0
+        for part in children(node):
+            if id(part) in parents:
+                parents[id(part)] += 1
+        return node
+
+    dag = postorder(node, visit)
+    # Leaves cost no more to evaluate than to look up, && and || are not kept once evaluated
+    shared = {id(part) for part in table.values()
+              if parents[id(part)] > 1 and part[0] not in ('num', 'var') and part[1] not in ('&&', '||')}
+    return dag, frozenset(shared), {'nodes': nodes, 'distinct': len(table) + unmerged, 'shared': len(shared)}
+
+def _pure(node):
+    ''' Whether node itself gives the same value every time it is evaluated with the same operands '''
+    kind = node[0]
+    if kind == 'function':
+        return node[1] not in impure_functions
+    if kind == 'postfix' and node[1] == '!':
+        return 'factorial' not in impure_functions
+    if kind == 'symbol' and node[1] in ('P', 'C'):
+        return ('perm' if node[1] == 'P' else 'comb') not in impure_functions
+    return True
@@ -0,0 +1,802 @@
+import math, decimal
+from decimal import Decimal
+from itertools import zip_longest
+from functions import function_list, functions, operators, constants
+from cache import LRUCache
+
+def precision_context(digits):
+    ''' Decimal context with the given number of significant digits '''
+    ctx = decimal.getcontext().copy()
+    ctx.prec = digits
+    return decimal.localcontext(ctx)
+
+class DecimalFunc:
+    ''' Decimal versions of Func, accurate to the precision of the current decimal context '''
+
+    def __init__(self):
+        # Digits carried above the caller's precision while a result is computed
+        self.GUARD = 10
+        self.LN10 = 2.302585092994046
+        # ln(10) / ln(2π), Spouge terms needed per decimal digit
+        self.SPOUGE_RATE = 1.2532
+        self.SPOUGE_CANCELLATION = 0.56
+        # Spouge tables are built for the working digits rounded up to a multiple of this, so nearby precisions share one
+        self.SPOUGE_BUCKET = 50
+        self.EXACT_GAMMA_LIMIT = 1000
+        # pi, e, ln2, ln10 and the Spouge coefficients, keyed by (name, precision)
+        self.cache = LRUCache(maxsize=64)
+
+    def _working(self, extra=0):
+        ''' Context with guard digits on top of the current precision '''
+        ctx = decimal.getcontext().copy()
+        ctx.prec += self.GUARD + extra
+        return decimal.localcontext(ctx)
+
+    def _dec(self, x):
+        if isinstance(x, Decimal):
+            return x
+        return Decimal(x)
+
+    def _constant(self, name, compute):
+        ''' Return a constant at the current precision, computing it once per precision '''
+        key = (name, decimal.getcontext().prec)
+        value = self.cache.get(key)
+        if value is None:
+            value = compute()
+            self.cache.put(key, value)
+        return value
+
+    def _chudnovsky(self, a, b):
+        ''' Binary splitting of the Chudnovsky series over the terms [a, b) '''
+        if b - a == 1:
+            if a == 0:
+                p = q = 1
+            else:
+                p = (6 * a - 5) * (2 * a - 1) * (6 * a - 1)
+                q = a * a * a * 10939058860032000
+            t = p * (13591409 + 545140134 * a)
+            return p, q, -t if a & 1 else t
+
+        m = (a + b) // 2
+        p1, q1, t1 = self._chudnovsky(a, m)
+        p2, q2, t2 = self._chudnovsky(m, b)
+        return p1 * p2, q1 * q2, q2 * t1 + p1 * t2
+
+    def _pi(self):
+        def compute():
+            # Each term of the series adds a little over 14 digits
+            _, q, t = self._chudnovsky(0, decimal.getcontext().prec // 14 + 2)
+            return 426880 * Decimal(10005).sqrt() * q / t
+        return self._constant('pi', compute)
+
+    def _e(self):
+        return self._constant('e', lambda: self._expm1(Decimal(1)) + 1)
+
+    def _ln2(self):
+        return self._constant('ln2', lambda: self._ln_newton(Decimal(2)))
+
+    def _ln10(self):
+        return self._constant('ln10', lambda: self._ln_newton(Decimal(10)))
+
+    def _expm1(self, x):
+        ''' expm1 from a Taylor series on x / 2 ** s followed by s doublings '''
+        if not x:
+            return x
+
+        # More halvings shorten the series, each doubling costs one multiply
+        s = math.isqrt(decimal.getcontext().prec) // 2
+        with self._working(s // 3):
+            prec = decimal.getcontext().prec
+            r = x / (1 << s)
+            total = term = r
+            k = 1
+            while term and term.adjusted() >= total.adjusted() - prec:
+                k += 1
+                term = term * r / k
+                total += term
+
+            # expm1(2r) = expm1(r) (expm1(r) + 2)
+            for _ in range(s):
+                total *= total + 2
+        return +total
+
+    def _exp(self, x):
+        ''' exp(x) as e ** n exp(f) with n the integer part of x '''
+        if x.is_nan():
+            return x
+        if x.is_infinite():
+            return Decimal(0) if x < 0 else x
+
+        n = int(x)
+        if n == 0:
+            return self._expm1(x) + 1
+
+        with self._working(len(str(abs(n)))):
+            r = (self._expm1(x - n) + 1) * self._e() ** n
+        return +r
+
+    def _ln_newton(self, x):
+        ''' ln(x) for moderate x by Halley steps on exp, tripling the precision each step '''
+        steps = []
+        p = decimal.getcontext().prec
+        while p > 15:
+            steps.append(p)
+            p = p // 3 + 1
+
+        y = Decimal(math.log(float(x)))
+        for p in reversed(steps):
+            with precision_context(p):
+                t = self._exp(y)
+                y = y + 2 * (x - t) / (x + t)
+        return +y
+
+    def _ln(self, x):
+        ''' ln(x) split into ln(m) + e ln(10), with extra digits when x is close to 1 '''
+        if Decimal('0.5') < x < 2:
+            m, e = x, 0
+        else:
+            e = x.adjusted()
+            m = x.scaleb(-e)
+
+        extra = 0
+        if e == 0 and m != 1:
+            extra = max(0, -(m - 1).adjusted())
+
+        with self._working(extra):
+            y = self._ln_newton(m)
+            if e:
+                y += e * self._ln10()
+        return +y
+
+    def _sin_reduced(self, r):
+        ''' sin from a Taylor series on r / 3 ** s followed by s triplings '''
+        if not r:
+            return r
+
+        s = math.isqrt(decimal.getcontext().prec) // 2
+        with self._working(s // 2):
+            prec = decimal.getcontext().prec
+            r = r / Decimal(3) ** s
+            r2 = r * r
+            total = term = r
+            k = 1
+            while term and term.adjusted() >= total.adjusted() - prec:
+                term = -term * r2 / ((k + 1) * (k + 2))
+                k += 2
+                total += term
+
+            # sin(3r) = sin(r) (3 - 4 sin(r) ** 2)
+            for _ in range(s):
+                total *= 3 - 4 * total * total
+        return +total
+
+    def _sincos(self, x):
+        ''' sin and cos together, reducing by π/2 with as many digits of π as x has integer digits '''
+        with self._working(max(x.adjusted(), 0)):
+            half_pi = self._pi() / 2
+            n = (x / half_pi).to_integral_value()
+            r = x - n * half_pi
+            s = self._sin_reduced(r)
+            # |r| <= π/4 so cos is at least 0.7 and the square root keeps its digits
+            c = ((1 - s) * (1 + s)).sqrt()
+            q = int(n) % 4
+
+        if q & 1:
+            s, c = c, s
+        if q >= 2:
+            s = -s
+        if q == 1 or q == 2:
+            c = -c
+        return +s, +c
+
+    def _atan(self, x):
+        ''' atan from argument halving and a Taylor series '''
+        if x < 0:
+            return -self._atan(-x)
+        if x > 1:
+            with self._working():
+                r = self._pi() / 2 - self._atan(1 / x)
+            return +r
+        if not x:
+            return x
+
+        h = math.isqrt(decimal.getcontext().prec) // 4
+        with self._working(h // 3):
+            prec = decimal.getcontext().prec
+            # atan(x) = 2 atan(x / (1 + sqrt(1 + x²)))
+            for _ in range(h):
+                x = x / (1 + (1 + x * x).sqrt())
+            x2 = -x * x
+            total = term = x
+            k = 1
+            while term.adjusted() >= total.adjusted() - prec:
+                term *= x2
+                k += 2
+                total += term / k
+            total *= 1 << h
+        return +total
+
+    def _erf_series(self, x):
+        ''' erf(x) = 2/√π e^(-x²) Σ x (2x²)^n / (2n + 1)!!, every term positive '''
+        if not x:
+            return x
+        prec = decimal.getcontext().prec
+        x2 = x * x
+        total = term = x
+        k = 1
+        while term.adjusted() >= total.adjusted() - prec:
+            k += 2
+            term = term * 2 * x2 / k
+            total += term
+        return 2 / self._pi().sqrt() * self._exp(-x2) * total
+
+    def _erfc_asymptotic(self, x):
+        ''' erfc(x) ~ e^(-x²) / (x√π) Σ (-1)^n (2n - 1)!! / (2x²)^n, stopped at its smallest term '''
+        prec = decimal.getcontext().prec
+        x2 = 2 * x * x
+        total = term = Decimal(1)
+        n = 0
+        while term.adjusted() >= -prec:
+            n += 1
+            following = -term * (2 * n - 1) / x2
+            if abs(following) >= abs(term):
+                break
+            term = following
+            total += term
+        return self._exp(-x * x) / (x * self._pi().sqrt()) * total
+
+    def _spouge_digits(self):
+        ''' Digits the Spouge approximation is built for, the current precision and its guard digits rounded up to a bucket '''
+        return -(-(decimal.getcontext().prec + self.GUARD) // self.SPOUGE_BUCKET) * self.SPOUGE_BUCKET
+
+    def _spouge_terms(self):
+        ''' Number of Spouge coefficients for the current precision and its guard digits '''
+        return int(self._spouge_digits() * self.SPOUGE_RATE) + 2
+
+    def _spouge(self, a):
+        ''' Spouge coefficients c_0 = √(2π), c_k = (-1)^(k-1) (a - k)^(k - 1/2) e^(a - k) / (k - 1)! '''
+        def compute():
+            prec = decimal.getcontext().prec
+            scale = 10 ** (2 * prec)
+            coeffs = [(2 * self._pi()).sqrt()]
+            # e^(a - k) / (k - 1)!, one division by e and one by k per step
+            e = self._e()
+            t = self._exp(Decimal(a - 1))
+            for k in range(1, a):
+                m = a - k
+                # Integer square roots are far cheaper than Decimal.sqrt at this precision
+                root = Decimal(math.isqrt(m * scale)).scaleb(-prec)
+                c = Decimal(m) ** (k - 1) * root * t
+                coeffs.append(c if k & 1 else -c)
+                t = t / e / k
+            return coeffs
+        return self._constant(('spouge', a), compute)
+
+    def _spouge_sum(self, x, a):
+        ''' The Spouge sum at x, carried past its cancellation at a precision that depends only on the caller's,
+        so the coefficients are built once whatever the size of x '''
+        with precision_context(self._spouge_digits() + self._cancellation_digits(a)):
+            coeffs = self._spouge(a)
+            z = x - 1
+            s = coeffs[0]
+            for k in range(1, a):
+                s += coeffs[k] / (z + k)
+        return s
+
+    def _spouge_log(self, x, a):
+        ''' Return (z + 1/2) ln(z + a) - (z + a), with Γ(x) = exp of it times the Spouge sum '''
+        z = x - 1
+        t = z + a
+        return (z + Decimal('0.5')) * self._ln(t) - t
+
+    def _cancellation_digits(self, a):
+        ''' Digits lost in the Spouge sum, the largest coefficient is near 10 ** (0.55 a) and the sum tends to √(2π) '''
+        return int(a * self.SPOUGE_CANCELLATION) + 2
+
+    def sinFn(self, x):
+        ''' Compute sine '''
+        return self._sincos(self._dec(x))[0]
+
+    def cosFn(self, x):
+        ''' Compute cosine '''
+        return self._sincos(self._dec(x))[1]
+
+    def sincosFn(self, x):
+        ''' Compute sine and cosine together '''
+        return self._sincos(self._dec(x))
+
+    def tanFn(self, x):
+        ''' Compute tangent '''
+        with self._working():
+            s, c = self._sincos(self._dec(x))
+            r = s / c
+        return +r
+
+    def cotFn(self, x):
+        ''' Compute cotangent '''
+        with self._working():
+            s, c = self._sincos(self._dec(x))
+            r = c / s
+        return +r
+
+    def secFn(self, x):
+        ''' Compute secant '''
+        with self._working():
+            r = 1 / self._sincos(self._dec(x))[1]
+        return +r
+
+    def cscFn(self, x):
+        ''' Compute cosecant '''
+        with self._working():
+            r = 1 / self._sincos(self._dec(x))[0]
+        return +r
+
+    def cosecFn(self, x):
+        ''' Compute cosecant '''
+        return self.cscFn(x)
+
+    def atanFn(self, x):
+        ''' Compute arctangent '''
+        return self._atan(self._dec(x))
+
+    def asinFn(self, x):
+        ''' Compute arcsine '''
+        x = self._dec(x)
+        if x < -1 or x > 1:
+            raise ValueError('X must be in range [-1, 1] for asin')
+        with self._working():
+            if abs(x) == 1:
+                r = x * self._pi() / 2
+            else:
+                r = self._atan(x / ((1 - x) * (1 + x)).sqrt())
+        return +r
+
+    def acosFn(self, x):
+        ''' Compute arccosine as 2 atan(sqrt((1 - x) / (1 + x))) '''
+        x = self._dec(x)
+        if x < -1 or x > 1:
+            raise ValueError('X must be in range [-1, 1] for acos')
+        with self._working():
+            if x == -1:
+                r = self._pi()
+            else:
+                r = 2 * self._atan(((1 - x) / (1 + x)).sqrt())
+        return +r
+
+    def atan2Fn(self, y, x):
+        ''' Compute arctangent two '''
+        y, x = self._dec(y), self._dec(x)
+        with self._working():
+            if x > 0:
+                r = self._atan(y / x)
+            elif x < 0:
+                r = self._atan(y / x) + (self._pi() if y >= 0 else -self._pi())
+            elif y:
+                r = self._pi() / 2 if y > 0 else -self._pi() / 2
+            else:
+                r = Decimal(0)
+        return +r
+
+    def sqrtFn(self, x):
+        ''' Compute square root '''
+        x = self._dec(x)
+        if x < 0:
+            raise ValueError('X cannot be negative for sqrt')
+        return x.sqrt()
+
+    def cbrtFn(self, x):
+        ''' Compute cube root by Newton steps from the float estimate '''
+        x = self._dec(x)
+        if not x:
+            return x
+        if x < 0:
+            return -self.cbrtFn(-x)
+
+        with self._working():
+            e = x.adjusted() // 3 * 3
+            m = x.scaleb(-e)
+            y = Decimal(float(m) ** (1 / 3))
+            prec = decimal.getcontext().prec
+            digits = 15
+            while True:
+                y = y - (y * y * y - m) / (3 * y * y)
+                if digits >= prec:
+                    break
+                digits *= 2
+            y = y.scaleb(e // 3)
+        return +y
+
+    def expFn(self, x):
+        ''' Compute exponential '''
+        return self._exp(self._dec(x))
+
+    def expm1Fn(self, x):
+        ''' Compute exp(x) - 1 without cancellation near zero '''
+        x = self._dec(x)
+        if abs(x) < 1:
+            return self._expm1(x)
+        with self._working():
+            r = self._exp(x) - 1
+        return +r
+
+    def exp2Fn(self, x):
+        ''' Compute 2 raised to the power x '''
+        return self.powFn(2, x)
+
+    def lnFn(self, x):
+        ''' Compute natural logarithm '''
+        x = self._dec(x)
+        if x <= 0:
+            raise ValueError('X must be positive for ln')
+        if x.is_infinite() or x.is_nan():
+            return x
+        return self._ln(x)
+
+    def logFn(self, x):
+        ''' Compute natural logarithm '''
+        return self.lnFn(x)
+
+    def log10Fn(self, x):
+        ''' Compute base-10 logarithm, exact for powers of ten '''
+        x = self._dec(x)
+        if x <= 0:
+            raise ValueError('X must be positive for ln')
+        e = x.adjusted()
+        m = x.scaleb(-e)
+        if m == 1:
+            return Decimal(e)
+        with self._working():
+            r = self._ln(x) / self._ln10()
+        return +r
+
+    def lgFn(self, x):
+        ''' Compute base-10 logarithm '''
+        return self.log10Fn(x)
+
+    def log2Fn(self, x):
+        ''' Compute base-2 logarithm '''
+        x = self._dec(x)
+        if x <= 0:
+            raise ValueError('X must be positive for ln')
+        with self._working():
+            r = self._ln(x) / self._ln2()
+        return +r
+
+    def log1pFn(self, x):
+        ''' Compute ln(1 + x), keeping the digits of small x '''
+        x = self._dec(x)
+        if x <= -1:
+            raise ValueError('X must be positive for ln')
+        with self._working(max(0, -x.adjusted())):
+            r = self._ln(1 + x)
+        return +r
+
+    def sinhFn(self, x):
+        ''' Compute hyperbolic sine from expm1(|x|) '''
+        x = self._dec(x)
+        with self._working():
+            u = self.expm1Fn(abs(x))
+            r = (u + u / (u + 1)) / 2
+        return +r if x >= 0 else -r
+
+    def coshFn(self, x):
+        ''' Compute hyperbolic cosine '''
+        with self._working():
+            ex = self._exp(abs(self._dec(x)))
+            r = (ex + 1 / ex) / 2
+        return +r
+
+    def tanhFn(self, x):
+        ''' Compute hyperbolic tangent from expm1(2|x|) '''
+        x = self._dec(x)
+        with self._working():
+            u = self.expm1Fn(2 * abs(x))
+            r = u / (u + 2)
+        return +r if x >= 0 else -r
+
+    def asinhFn(self, x):
+        ''' Compute inverse hyperbolic sine as log1p(|x| + x² / (1 + sqrt(1 + x²))) '''
+        x = self._dec(x)
+        with self._working():
+            a = abs(x)
+            r = self.log1pFn(a + a * a / (1 + (1 + a * a).sqrt()))
+        return +r if x >= 0 else -r
+
+    def acoshFn(self, x):
+        ''' Compute inverse hyperbolic cosine '''
+        x = self._dec(x)
+        if x < 1:
+            raise ValueError('X must be at least 1 for acosh')
+        with self._working():
+            r = self.log1pFn((x - 1) + ((x - 1) * (x + 1)).sqrt())
+        return +r
+
+    def atanhFn(self, x):
+        ''' Compute inverse hyperbolic tangent as log1p(2x / (1 - x)) / 2 '''
+        x = self._dec(x)
+        if x <= -1 or x >= 1:
+            raise ValueError('X must be in range (-1, 1) for atanh')
+        with self._working():
+            r = self.log1pFn(2 * x / (1 - x)) / 2
+        return +r
+
+    def powFn(self, x, y):
+        ''' Compute x to power of y, exactly for integer powers '''
+        x, y = self._dec(x), self._dec(y)
+        if y == y.to_integral_value():
+            return x ** int(y)
+        if x < 0:
+            raise ValueError('X cannot be negative for a fractional power')
+        if not x:
+            return x
+
+        # Every integer digit of y ln(x) costs a significant digit of the result
+        with precision_context(20):
+            size = (y * self._ln(x)).adjusted()
+        with self._working(max(size, 0)):
+            r = self._exp(y * self._ln(x))
+        return +r
+
+    def ldexpFn(self, x, i):
+        ''' Compute x * (2 ** i) '''
+        return self._dec(x) * Decimal(2) ** int(i)
+
+    def radiansFn(self, deg):
+        ''' Convert degrees to radians '''
+        with self._working():
+            r = self._dec(deg) * self._pi() / 180
+        return +r
+
+    def degreesFn(self, rad):
+        ''' Convert radians to degrees '''
+        with self._working():
+            r = self._dec(rad) * 180 / self._pi()
+        return +r
+
+    def hypotFn(self, x, y):
+        ''' Compute hypotenuse using sqrt(x^2 + y^2) '''
+        x, y = self._dec(x), self._dec(y)
+        with self._working():
+            r = (x * x + y * y).sqrt()
+        return +r
+
+    def distFn(self, p, q):
+        ''' Compute Euclidean distance between two points '''
+        with self._working():
+            s = Decimal(0)
+            for a, b in zip_longest(p, q):
+                if a is None or b is None:
+                    raise ValueError('Points must have the same dimension for dist')
+                s += (self._dec(a) - self._dec(b)) ** 2
+            r = s.sqrt() if s else Decimal(0)
+        return +r
+
+    def fmaFn(self, a, b, c):
+        ''' Compute fused multiply-add a * b + c with a single rounding '''
+        return self._dec(a).fma(self._dec(b), self._dec(c))
+
+    def fmodFn(self, x, y):
+        ''' Compute modulus with the sign of x '''
+        return self._dec(x) % self._dec(y)
+
+    def remainderFn(self, x, y):
+        ''' Compute remainder of x divided by y, rounding the quotient to nearest '''
+        return self._dec(x).remainder_near(self._dec(y))
+
+    def modfFn(self, x):
+        ''' Return fractional and integer parts of x '''
+        x = self._dec(x)
+        i = x.to_integral_value(decimal.ROUND_DOWN)
+        return (x - i, i)
+
+    def fsumFn(self, arr):
+        ''' Compute sum of iterable with guard digits '''
+        with self._working():
+            s = sum((self._dec(v) for v in arr), Decimal(0))
+        return +s
+
+    def iscloseFn(self, a, b, rel_tol=1e-09, abs_tol=0.0):
+        ''' Check if two values are close '''
+        a, b = self._dec(a), self._dec(b)
+        if a == b:
+            return True
+        if not (a.is_finite() and b.is_finite()):
+            return False
+        diff = abs(a - b)
+        return diff <= max(self._dec(rel_tol) * max(abs(a), abs(b)), self._dec(abs_tol))
+
+    def erfFn(self, x):
+        ''' Compute error function '''
+        x = self._dec(x)
+        if not x:
+            return x
+        # Past this point erfc(x) is below the last digit
+        if x * x > (decimal.getcontext().prec + 1) * self.LN10:
+            return Decimal(1) if x > 0 else Decimal(-1)
+        with self._working():
+            r = self._erf_series(abs(x))
+        return +r if x > 0 else -r
+
+    def erfcFn(self, x):
+        ''' Compute complementary error function without cancellation for large x '''
+        x = self._dec(x)
+        with self._working():
+            if x <= 0:
+                r = 1 + self._erf_series(-x)
+            elif x * x > decimal.getcontext().prec * self.LN10:
+                r = self._erfc_asymptotic(x)
+            else:
+                with self._working(int(x * x / Decimal(self.LN10)) + 1):
+                    r = 1 - self._erf_series(x)
+        return +r
+
+    def gammaFn(self, x):
+        ''' Compute gamma function, exactly at integers and by Spouge's approximation elsewhere '''
+        x = self._dec(x)
+        if x <= 0:
+            raise ValueError('X must be positive for gamma function')
+        if x == x.to_integral_value() and x <= self.EXACT_GAMMA_LIMIT:
+            return +Decimal(functions.factorialFn(int(x) - 1))
+
+        # exp(log) turns every integer digit of log into a lost significant digit
+        size = float(x) * math.log(float(x) + 1)
+        a = self._spouge_terms()
+        s = self._spouge_sum(x, a)
+        with self._working(self._cancellation_digits(a) + len(str(int(size)))):
+            r = self._exp(self._spouge_log(x, a)) * s
+        return +r
+
+    def lgammaFn(self, x):
+        ''' Compute natural logarithm of gamma function '''
+        x = self._dec(x)
+        if x <= 0:
+            raise ValueError('X must be positive for gamma function')
+        if x == 1 or x == 2:
+            return Decimal(0)
+
+        a = self._spouge_terms()
+        s = self._spouge_sum(x, a)
+        with self._working(self._cancellation_digits(a)):
+            r = self._spouge_log(x, a) + self._ln(s)
+        return +r
+
+    def _lgamma_sum(self, n, *ks):
+        ''' exp(lgamma(n + 1) - Σ lgamma(k + 1)), with a digit for every integer digit of the logarithms '''
+        size = float(n) * math.log(float(n) + 2)
+        with self._working(len(str(int(size)))):
+            log = self.lgammaFn(n + 1)
+            for k in ks:
+                log -= self.lgammaFn(k + 1)
+            r = self._exp(log)
+        return +r
+
+    def permFn(self, n, k):
+        ''' Compute permutations P(n, k), exactly for integers and through lgamma otherwise '''
+        if n == int(n) and k == int(k):
+            return functions.permFn(int(n), int(k))
+        n, k = self._dec(n), self._dec(k)
+        if n < 0 or k < 0:
+            raise ValueError('N and K cannot be negative')
+        return self._lgamma_sum(n, n - k)
+
+    def combFn(self, n, k):
+        ''' Compute combinations C(n, k), exactly for integers and through lgamma otherwise '''
+        if n == int(n) and k == int(k):
+            return functions.combFn(int(n), int(k))
+        n, k = self._dec(n), self._dec(k)
+        if n < 0 or k < 0:
+            raise ValueError('N and K cannot be negative')
+        return self._lgamma_sum(n, k, n - k)
+
+    def normpdfFn(self, x, mu=0, sigma=1):
+        ''' Compute the normal probability density '''
+        x, mu, sigma = self._dec(x), self._dec(mu), self._dec(sigma)
+        if sigma <= 0:
+            raise ValueError('Sigma must be positive for normpdf')
+        with self._working():
+            z = (x - mu) / sigma
+            r = self._exp(-z * z / 2) / ((2 * self._pi()).sqrt() * sigma)
+        return +r
+
+    def normcdfFn(self, x, mu=0, sigma=1):
+        ''' Compute the normal cumulative distribution through erfc, which keeps the lower tail relative '''
+        x, mu, sigma = self._dec(x), self._dec(mu), self._dec(sigma)
+        if sigma <= 0:
+            raise ValueError('Sigma must be positive for normcdf')
+        with self._working():
+            r = self.erfcFn((mu - x) / (sigma * Decimal(2).sqrt())) / 2
+        return +r
+
+    def invnormFn(self, p, mu=0, sigma=1):
+        ''' Compute the normal quantile by Newton steps from the float quantile '''
+        p, mu, sigma = self._dec(p), self._dec(mu), self._dec(sigma)
+        if sigma <= 0:
+            raise ValueError('Sigma must be positive for invnorm')
+        if p <= 0 or p >= 1:
+            raise ValueError('P must be between 0 and 1 for invnorm')
+        with self._working():
+            x = Decimal(functions.invnormFn(float(p)))
+            tolerance = Decimal(10) ** -decimal.getcontext().prec
+            # Each step doubles the 15 correct digits of the float start
+            while True:
+                step = (self.normcdfFn(x) - p) / self.normpdfFn(x)
+                x -= step
+                if abs(step) <= tolerance * max(abs(x), tolerance):
+                    break
+            r = mu + sigma * x
+        return +r
+
+decimal_functions = DecimalFunc()
+
+def _decimal_function_list():
+    ''' Map every function_list entry to the DecimalFunc method of the same name '''
+    table = {}
+    for name, fn in function_list.items():
+        # Integer and sign functions are already exact, so they are shared
+        table[name] = getattr(decimal_functions, getattr(fn, '__name__', ''), None) or fn
+    return table
+
+decimal_function_list = _decimal_function_list()
+
+def _promote(a, b):
+    ''' Convert float operands to Decimal so the result keeps the working precision '''
+    if isinstance(a, float):
+        a = Decimal(a)
+    if isinstance(b, float):
+        b = Decimal(b)
+    return a, b
+
+def _arithmetic(fn):
+    return lambda a, b: fn(*_promote(a, b))
+
+def _divide(a, b):
+    ''' Division that never falls back to float, even for two integers '''
+    a, b = _promote(a, b)
+    return Decimal(a) / b
+
+def _power(a, b):
+    if isinstance(a, int) and isinstance(b, int) and b >= 0:
+        return a ** b
+    return decimal_functions.powFn(a, b)
+
+decimal_operators = dict(operators)
+decimal_operators.update({
+    "+": _arithmetic(operators["+"]),
+    "-": _arithmetic(operators["-"]),
+    "*": _arithmetic(operators["*"]),
+    ".": _arithmetic(operators["."]),
+    "//": _arithmetic(operators["//"]),
+    "%": _arithmetic(operators["%"]),
+    "/": _divide,
+    "^": _power,
+    "P": decimal_functions.permFn,
+    "C": decimal_functions.combFn,
+})
+
+def decimal_constants(digits):
+    ''' The constants table evaluated to the given number of digits '''
+    def compute():
+        f = decimal_functions
+        exact = {
+            "pi": f._pi,
+            "e": f._e,
+            "tau": lambda: 2 * f._pi(),
+            "ln1_1": lambda: f._ln(Decimal('1.1')),
+            "ln2": f._ln2,
+            "ln10": f._ln10,
+            "sqrt2": lambda: Decimal(2).sqrt(),
+            "sqrt_2pi": lambda: (2 * f._pi()).sqrt(),
+        }
+        table = {}
+        for name, value in constants.items():
+            if name in exact:
+                with f._working():
+                    value = exact[name]()
+                value = +value
+            elif isinstance(value, float):
+                value = Decimal(repr(value))
+            table[name] = value
+        return table
+
+    with precision_context(digits):
+        return decimal_functions._constant('constants', compute)
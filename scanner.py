@@ -0,0 +1,73 @@
+import decimal
+
+class ParseError(ValueError):
+    ''' Malformed expression, raised while parsing instead of at evaluation '''
+
+DIGITS = frozenset('0123456789')
+LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+NAME_CHARACTERS = DIGITS | LETTERS
+# Operators by length, the longest one that matches is taken
+OPERATORS_3 = frozenset(('!==', '===', '<==', '>=='))
+OPERATORS_2 = frozenset(('&&', '||', '<=', '>=', '==', '!=', '<<', '>>', '//', '**'))
+OPERATORS_1 = frozenset('<>+*/(),!$£%-^.&|~')
+
+def scan(expression, functions, constants):
+    ''' Yield the tokens of expression in one pass as (kind, value, offset) tuples.
+
+    Numbers have kind 'num' and an int or Decimal value. Names are classified once here as 'function',
+    'constant' or 'name', operators and brackets have kind 'op'. The last token is ('end', None, len)
+    and repeats forever, so the parser can look past the end without checking. '''
+    i, n = 0, len(expression)
+    while i < n:
+        c = expression[i]
+        # Spaces separate most tokens, skip them before anything else
+        if c == ' ':
+            i += 1
+            continue
+
+        if c in DIGITS:
+            j = i + 1
+            while j < n and expression[j] in DIGITS:
+                j += 1
+            # A dot only belongs to the number when digits follow, 2.pi multiplies
+            if j + 1 < n and expression[j] == '.' and expression[j + 1] in DIGITS:
+                j += 2
+                while j < n and expression[j] in DIGITS:
+                    j += 1
+                yield ('num', decimal.Decimal(expression[i:j]), i)
+            else:
+                yield ('num', int(expression[i:j]), i)
+            i = j
+            continue
+
+        if c in LETTERS:
+            j = i + 1
+            while j < n and expression[j] in NAME_CHARACTERS:
+                j += 1
+            name = expression[i:j]
+            yield ('function' if name in functions else 'constant' if name in constants else 'name', name, i)
+            i = j
+            continue
+
+        if c in OPERATORS_1 or c == '=':
+            if expression[i:i + 3] in OPERATORS_3:
+                yield ('op', expression[i:i + 3], i)
+                i += 3
+            elif expression[i:i + 2] in OPERATORS_2:
+                yield ('op', expression[i:i + 2], i)
+                i += 2
+            elif c != '=':
+                yield ('op', c, i)
+                i += 1
+            else:
+                raise ParseError(f"Unexpected character '=' at offset {i}")
+            continue
+
+        if c.isspace():
+            i += 1
+            continue
+
+        raise ParseError(f'Unexpected character {c!r} at offset {i}')
+
+    while True:
+        yield ('end', None, n)
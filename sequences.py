@@ -0,0 +1,102 @@
+import math
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Values evaluated at a time when a sequence is streamed
+CHUNK_SIZE = 4096
+
+class Range:
+    ''' Lazy arithmetic progression start, start + step, ... stopping before stop '''
+
+    def __init__(self, start, stop, step=1):
+        if not step:
+            raise ValueError('Step must not be zero for range')
+        self.start = start
+        self.stop = stop
+        self.step = step
+        # Integer ranges are exact and already lazy, the rest compute start + i * step
+        if all(isinstance(v, int) for v in (start, stop, step)):
+            self.integers = range(start, stop, step)
+            self.length = len(self.integers)
+        else:
+            self.integers = None
+            self.length = max(0, math.ceil((stop - start) / step))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        if self.integers is not None:
+            return iter(self.integers)
+        return (self.start + i * self.step for i in range(self.length))
+
+    def chunks(self, size):
+        ''' Yield consecutive slices of at most size values '''
+        for i in range(0, self.length, size):
+            j = min(i + size, self.length)
+            if self.integers is not None:
+                yield self.integers[i:j]
+            else:
+                yield [self.start + k * self.step for k in range(i, j)]
+
+    def __repr__(self):
+        if self.step == 1:
+            return f'range({self.start}, {self.stop})'
+        return f'range({self.start}, {self.stop}, {self.step})'
+
+class Mapped:
+    ''' Lazy sequence of an expression evaluated with name bound to each value of source '''
+
+    def __init__(self, name, body, source, variables, vector=None, chunksize=CHUNK_SIZE):
+        # body evaluates the expression from a variable mapping, vector from a mapping of NumPy arrays
+        self.name = name
+        self.body = body
+        self.source = source
+        self.variables = dict(variables)
+        self.vector = vector
+        self.chunksize = chunksize
+
+    def __len__(self):
+        return len(self.source)
+
+    def __iter__(self):
+        vector = self.vector
+        scope = dict(self.variables)
+        for chunk in chunks(self.source, self.chunksize):
+            if vector is not None:
+                try:
+                    values = self._vectorized(vector, chunk)
+                except Exception:
+                    # Whatever the array kernels reject or would round differently runs one value at a time from here on
+                    vector = None
+                else:
+                    yield from values
+                    continue
+            for value in chunk:
+                scope[self.name] = value
+                yield self.body(scope)
+
+    def _vectorized(self, vector, chunk):
+        ''' Evaluate a whole chunk at once, raising on any floating point exception '''
+        if isinstance(chunk, range):
+            array = np.arange(chunk.start, chunk.stop, chunk.step, dtype=float)
+        else:
+            array = np.asarray(chunk, dtype=float)
+        with np.errstate(divide='raise', over='raise', invalid='raise'):
+            values = vector({**self.variables, self.name: array})
+        return np.broadcast_to(values, array.shape).tolist()
+
+    def __repr__(self):
+        return f'<sequence of {len(self)} values>' if hasattr(self.source, '__len__') else '<sequence>'
+
+def chunks(values, size):
+    ''' Split any iterable into consecutive slices of at most size values without materializing it '''
+    if isinstance(values, Range):
+        yield from values.chunks(size)
+        return
+    values = iter(values)
+    yield from iter(lambda: list(islice(values, size)), [])
@@ -0,0 +1,373 @@
+import math, decimal
+from itertools import chain, islice
+from functions import functions as scalar, conversions
+from optimizer import free_variables
+
+# Highest polynomial degree summed in closed form
+MAX_DEGREE = 12
+# Terms evaluated before an infinite series is given up on
+MAX_TERMS = 1 << 20
+# Terms of an alternating series given to the epsilon algorithm
+WYNN_TERMS = 120
+# Terms summed before the first Richardson step, doubled at every step after it
+FIRST_TERMS = 8
+# Relative tolerance of infinite series in float mode, Decimal mode gives up the last three digits
+TOLERANCE = 1e-14
+
+INF = float('inf')
+
+def _power_sums(n, degree):
+    ''' Exact sums of k^j over k = 1..n for j up to degree, as polynomials in n so any integer n works '''
+    sums = []
+    for j in range(degree + 1):
+        # (n + 1)^(j + 1) - 1 = sum over i <= j of comb(j + 1, i) S_i(n)
+        s = (n + 1) ** (j + 1) - 1 - sum(math.comb(j + 1, i) * sums[i] for i in range(j))
+        sums.append(s // (j + 1))
+    return sums
+
+def _poly_add(a, b, op):
+    n = max(len(a), len(b))
+    return [op(x, y) for x, y in zip(a + [0] * (n - len(a)), b + [0] * (n - len(b)))]
+
+def _poly_multiply(a, b, ops):
+    c = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            c[i + j] = ops['+'](c[i + j], ops['*'](x, y))
+    return c
+
+def _poly_power(a, e, ops):
+    c = [1]
+    for _ in range(e):
+        c = _poly_multiply(c, a, ops)
+    return c
+
+class Series:
+    ''' Sum or product of body over name = lo, lo + 1, ..., hi, its closed form if any found once when built '''
+
+    def __init__(self, op, name, body, compile, functions, operators):
+        # compile turns an AST into a closure taking the variable mapping
+        self.op = op
+        self.name = name
+        self.compile = compile
+        self.functions = functions
+        self.operators = operators
+        self.body = compile(body)
+        polynomial = self._polynomial(body)
+        self.polynomial = polynomial and polynomial[1]
+        self.geometric = None if polynomial else self._geometric(body)
+
+    def _free(self, node):
+        return self.name not in free_variables(node)
+
+    def _polynomial(self, node):
+        ''' Degree and a closure returning the coefficients of node as a polynomial in the index, None if it is not one '''
+        ops = self.operators
+        if self._free(node):
+            fn = self.compile(node)
+            return 0, lambda v: [fn(v)]
+
+        kind = node[0]
+        if kind == 'var':
+            return 1, lambda v: [0, 1]
+        if kind == 'postfix' and node[1] in ('$', '£'):
+            return self._polynomial(node[2])
+        if kind == 'convert':
+            inner = self._polynomial(node[2])
+            if inner is None:
+                return None
+            degree, fn = inner
+            convert = conversions[node[1]]
+            return degree, lambda v: [convert(c) for c in fn(v)]
+        if kind != 'symbol':
+            return None
+
+        _, op, left, right = node
+        if op == '^':
+            e = right[1] if right[0] == 'num' else None
+            base = self._polynomial(left)
+            if base is None or type(e) is not int or e < 0 or base[0] * e > MAX_DEGREE:
+                return None
+            fn = base[1]
+            return base[0] * e, lambda v: _poly_power(fn(v), e, ops)
+        if op == '/':
+            a = self._polynomial(left)
+            if a is None or not self._free(right):
+                return None
+            fn, d = a[1], self.compile(right)
+            return a[0], lambda v: [ops['/'](c, d(v)) for c in fn(v)]
+        if op not in ('+', '-', '*', '.'):
+            return None
+
+        a, b = self._polynomial(left), self._polynomial(right)
+        if a is None or b is None:
+            return None
+        fa, fb = a[1], b[1]
+        if op in ('+', '-'):
+            combine = ops[op]
+            return max(a[0], b[0]), lambda v: _poly_add(fa(v), fb(v), combine)
+        if a[0] + b[0] > MAX_DEGREE:
+            return None
+        return a[0] + b[0], lambda v: _poly_multiply(fa(v), fb(v), ops)
+
+    def _geometric(self, node):
+        ''' Closure returning c and r with node equal to c r^index, None if it has no such form '''
+        ops = self.operators
+        if self._free(node):
+            fn = self.compile(node)
+            return lambda v: (fn(v), 1)
+
+        kind = node[0]
+        if kind == 'postfix' and node[1] in ('$', '£'):
+            return self._geometric(node[2])
+        if kind == 'convert':
+            inner = self._geometric(node[2])
+            if inner is None:
+                return None
+            convert = conversions[node[1]]
+            return lambda v: tuple(convert(x) for x in inner(v))
+        if kind != 'symbol':
+            return None
+
+        _, op, left, right = node
+        if op == '^':
+            exponent = self._polynomial(right)
+            if not self._free(left) or exponent is None or exponent[0] > 1:
+                return None
+            base, fn = self.compile(left), exponent[1]
+            def form(v):
+                b, c = base(v), fn(v) + [0]
+                return ops['^'](b, c[0]), ops['^'](b, c[1])
+            return form
+        if op not in ('*', '.', '/'):
+            return None
+
+        a, b = self._geometric(left), self._geometric(right)
+        if a is None or b is None:
+            return None
+        combine = ops['/'] if op == '/' else ops['*']
+        return lambda v: tuple(combine(x, y) for x, y in zip(a(v), b(v)))
+
+    def _bound(self, x):
+        try:
+            k = int(x)
+        except (ValueError, OverflowError):
+            k = None
+        if k is None or k != x:
+            raise ValueError(f'Bounds of {self.op} must be integers, got {x}')
+        return k
+
+    def evaluate(self, lo, hi, variables, tol=None):
+        ''' Value of the series for these bounds, hi may be inf '''
+        lo = self._bound(lo)
+        if hi == INF:
+            return self._infinite(lo, variables, tol)
+        hi = self._bound(hi)
+        if hi < lo:
+            return 0 if self.op == 'sum' else 1
+        value = self._closed(lo, hi, variables)
+        if value is not None:
+            return value
+        return self._loop(lo, hi, variables)
+
+    def _closed(self, lo, hi, variables):
+        ''' Closed form over lo..hi, None when the body has none '''
+        ops = self.operators
+        n = hi - lo + 1
+        if self.polynomial:
+            c = self.polynomial(variables)
+            if self.op == 'sum':
+                upper, lower = _power_sums(hi, len(c) - 1), _power_sums(lo - 1, len(c) - 1)
+                total = 0
+                for coefficient, a, b in zip(c, upper, lower):
+                    total = ops['+'](total, ops['*'](coefficient, a - b))
+                return total
+            if len(c) == 1:
+                return ops['^'](c[0], n)
+            if len(c) == 2 and all(type(x) is int for x in c) and c[1] and c[0] % c[1] == 0:
+                return c[1] ** n * self._shifted_product(lo + c[0] // c[1], hi + c[0] // c[1])
+            return None
+
+        if self.geometric:
+            c, r = self.geometric(variables)
+            if self.op == 'product':
+                s = _power_sums(hi, 1)[1] - _power_sums(lo - 1, 1)[1]
+                return ops['*'](ops['^'](c, n), ops['^'](r, s))
+            return ops['*'](c, self._geometric_sum(r, lo, hi))
+        return None
+
+    def _shifted_product(self, lo, hi):
+        ''' Exact product of the integers lo..hi '''
+        if lo <= 0 <= hi:
+            return 0
+        if lo > 0:
+            return scalar._range_product(lo, hi + 1)
+        return (-1) ** (hi - lo + 1) * scalar._range_product(-hi, -lo + 1)
+
+    def _geometric_sum(self, r, lo, hi):
+        ''' Sum of r^k over lo..hi '''
+        ops = self.operators
+        n = hi - lo + 1
+        if r == 1:
+            return n
+        if type(r) is int and lo >= 0:
+            return (r ** (hi + 1) - r ** lo) // (r - 1)
+        if isinstance(r, float) and r > 0:
+            # 1 - r^n through expm1 and log1p keeps its digits when r is close to 1
+            return r ** lo * -self.functions['expm1'](n * self.functions['log1p'](r - 1)) / (1 - r)
+        return ops['/'](ops['-'](ops['^'](r, lo), ops['^'](r, hi + 1)), ops['-'](1, r))
+
+    def _terms(self, lo, hi, variables):
+        scope = dict(variables)
+        body, name = self.body, self.name
+        k = lo
+        while k <= hi:
+            scope[name] = k
+            yield body(scope)
+            k += 1
+
+    def _loop(self, lo, hi, variables):
+        ''' Evaluate the compiled body term by term '''
+        terms = self._terms(lo, hi, variables)
+        if self.op == 'product':
+            multiply = self.operators['*']
+            total = 1
+            for v in terms:
+                total = multiply(total, v)
+            return total
+
+        # Exact while the terms are integers, then one correctly rounded fsum over the rest
+        total = 0
+        for v in terms:
+            if type(v) is int or isinstance(v, bool):
+                total += v
+            elif isinstance(v, (float, decimal.Decimal)):
+                return self.functions['fsum'](chain((total, v), terms))
+            else:
+                total = self.operators['+'](total, v)
+        return total
+
+    def _infinite(self, lo, variables, tol):
+        ''' Limit of the series as hi goes to infinity '''
+        ops = self.operators
+        terms = self._terms(lo, INF, variables)
+        if self.op == 'product':
+            # Infinite products converge through the sum of the logarithms of their terms
+            ln = self.functions['ln']
+            def logs():
+                for v in terms:
+                    if v <= 0:
+                        raise ValueError('Infinite products need positive terms')
+                    yield ln(v)
+            return self.functions['exp'](self._accelerate(logs(), tol))
+
+        if self.polynomial:
+            if any(self.polynomial(variables)):
+                raise ValueError('Series diverges')
+            return 0
+        if self.geometric:
+            c, r = self.geometric(variables)
+            if not c:
+                return c
+            if abs(r) >= 1:
+                raise ValueError('Series diverges')
+            return ops['/'](ops['*'](c, ops['^'](r, lo)), ops['-'](1, r))
+        return self._accelerate(terms, tol)
+
+    def _accelerate(self, terms, tol):
+        ''' Shanks transformation for alternating series, Richardson extrapolation for the rest '''
+        first = list(islice(terms, FIRST_TERMS))
+        if tol is None:
+            if any(isinstance(a, decimal.Decimal) for a in first):
+                tol = decimal.Decimal(10) ** (3 - decimal.getcontext().prec)
+            else:
+                tol = TOLERANCE
+        terms = chain(first, terms)
+        nonzero = [a for a in first if a]
+        if len(nonzero) > 2 and all(a * b < 0 for a, b in zip(nonzero, nonzero[1:])):
+            return self._shanks(terms, tol)
+        return self._richardson(terms, tol)
+
+    def _shanks(self, terms, tol):
+        ''' Limit of the partial sums from Wynn's epsilon algorithm, one antidiagonal per term '''
+        total = 0
+        previous = []
+        estimate = None
+        agreed = 0
+        for a in islice(terms, WYNN_TERMS):
+            if not a:
+                continue
+            total += a
+            row = [total]
+            for j in range(1, len(previous) + 1):
+                diff = row[j - 1] - previous[j - 1]
+                if not diff:
+                    # The table has converged as far as the arithmetic can tell
+                    return row[(j - 1) // 2 * 2]
+                row.append((previous[j - 2] if j > 1 else 0) + 1 / diff)
+            best = row[(len(row) - 1) // 2 * 2]
+            if estimate is not None and abs(best - estimate) <= tol * abs(best):
+                agreed += 1
+                if agreed == 2:
+                    return best
+            else:
+                agreed = 0
+            estimate = best
+            previous = row
+        raise ArithmeticError(f'Alternating {self.op} did not converge to {tol} within {WYNN_TERMS} terms')
+
+    def _richardson(self, terms, tol):
+        ''' Limit of the partial sums at doubling term counts, extrapolated in powers of 1 / count '''
+        # Neumaier summation keeps a million partial sums from drifting
+        s = c = 0
+        count = 0
+        target = FIRST_TERMS
+        sums = []
+        for a in terms:
+            t = s + a
+            c += (s - t) + a if abs(s) >= abs(a) else (a - t) + s
+            s = t
+            count += 1
+            if count < target:
+                continue
+
+            sums.append(s + c)
+            # Quickly converging series settle before the extrapolation does
+            if len(sums) > 1 and abs(sums[-1] - sums[-2]) <= tol * abs(sums[-1]):
+                return sums[-1]
+            diagonal = self._extrapolate(sums)
+            if len(diagonal) > 1 and abs(diagonal[-1] - diagonal[-2]) <= tol * abs(diagonal[-1]):
+                return diagonal[-1]
+            target *= 2
+            if target > MAX_TERMS:
+                break
+        raise ArithmeticError(f'{self.op.capitalize()} did not converge to {tol} within {MAX_TERMS} terms')
+
+    def _extrapolate(self, sums):
+        ''' Diagonal of the Richardson table for errors in powers p, p + 1, ... of 1 / count '''
+        p = _order(sums)
+        diagonal = []
+        row = []
+        for s in sums:
+            new = [s]
+            for m, r in enumerate(row, 1):
+                f = 2 ** (p + m - 1)
+                if isinstance(s, decimal.Decimal):
+                    f = decimal.Decimal(2) ** decimal.Decimal(repr(p + m - 1))
+                new.append(new[m - 1] + (new[m - 1] - r) / (f - 1))
+            row = new
+            diagonal.append(row[-1])
+        return diagonal
+
+def _order(sums):
+    ''' Leading power of 1 / count in the error of the partial sums, 1 until three sums are known
+
+    Tails of power laws like 1 / k^1.5 decay as a fractional power, estimated from the last three sums and
+    rounded to a multiple of 0.05 so the extrapolation removes it exactly once the estimate settles.
+    '''
+    if len(sums) < 3:
+        return 1
+    d1, d2 = sums[-2] - sums[-3], sums[-1] - sums[-2]
+    if not d2 or not d1 / d2 > 1:
+        return 1
+    return max(round(math.log2(float(d1 / d2)) * 20) / 20, 0.05)
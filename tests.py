@@ -1,5 +1,13 @@
-import math
-from functions import function_list
+import io, math, decimal, statistics, tracemalloc
+from functions import function_list, constants, impure_functions, mark_impure, memoize, unmemoize, memo_stats
+from main import Parse
+import main
+from cache import LRUCache
+from scanner import scan
+from vectorized import np
+from precise import decimal_functions
+if np is not None:
+    from vectorized import array_function_list
 
 PI = math.pi
 
@@ -349,3 +357,550 @@ test_case(function_list['gamma'], (5.0,), math.gamma(5.0), 5e-12, 5e-12)
 
 test_case(function_list['copysign'], (0.0, -1.0), -0.0, 0.0, 0.0)
 test_case(function_list['copysign'], (0.0, 1.0), 0.0, 0.0, 0.0)
+
+def evaluate(expression):
+    return Parse(expression).evaluate()
+
+def cache_hits(expression, repeats):
+    Parse.cache.clear()
+    for _ in range(repeats):
+        Parse(expression)
+    return Parse.cache.stats()['hits']
+
+def lru_evictions(maxsize, keys):
+    cache = LRUCache(maxsize)
+    for k in keys:
+        cache.put(k, k)
+        cache.get(keys[0])
+    return (cache.evictions, tuple(cache.data))
+
+test_case(evaluate, ('(10 C 3) * (8 P 2) + (6! / (3! * 2!))',), 6780)
+test_case(evaluate, ('((12345 & 255) | (42 << 8)) xor (999 % 256)',), 10974)
+test_case(evaluate, ('((10 C 3) == 120) && ((gamma(6) === 120) || (gamma(6) == 120))',), True)
+
+test_case(cache_hits, ('sqrt(2)^2 + sqrt(2)', 1), 0)
+test_case(cache_hits, ('sqrt(2)^2 + sqrt(2)', 5), 4)
+test_case(lru_evictions, (2, ['a', 'b', 'c', 'd']), (2, ('d', 'a')))
+test_case(lru_evictions, (0, ['a', 'b']), (0, ()))
+
+def compiled(expression):
+    return Parse(expression).compile()()
+
+test_case(compiled, ('(10 C 3) * (8 P 2) + (6! / (3! * 2!))',), 6780)
+test_case(compiled, ('((12345 & 255) | (42 << 8)) XOR (999 % 256)',), 10974)
+test_case(compiled, ('((10 C 3) == 120) && ((gamma(6) === 120) || (gamma(6) == 120))',), True)
+test_case(compiled, ('~5 + 2^3^2',), 506)
+test_case(evaluate, ('~5 + 2^3^2',), 506)
+
+def folded(expression):
+    return Parse(expression).ast[0]
+
+def folded_impure(expression, name):
+    mark_impure(name)
+    try:
+        return Parse(expression).ast
+    finally:
+        impure_functions.discard(name)
+
+test_case(folded, ('sin( (pi/2) - asin( sin(pi/6) ) ) + cos( acos( half ) )',), 'num')
+test_case(folded, ('£(10 C 3) + $5! + 2.pi',), 'num')
+test_case(folded, ('1 / 0',), 'symbol')
+test_case(folded_impure, ('gamma(3) + 1', 'gamma'), ('symbol', '+', ('function', 'gamma', ('num', 3)), ('num', 1)))
+test_case(evaluate, ('sin( (pi/2) - asin( sin(pi/6) ) ) + cos( acos( half ) )',), 1.3660254037844384, 5e-12, 5e-12)
+
+def evaluate_with(expression, x):
+    return Parse(expression).evaluate(x=x)
+
+def compiled_with(expression, x, y):
+    return Parse(expression).compile()(x=x, y=y)
+
+def variables(expression):
+    return sorted(Parse(expression).variables)
+
+def batch(expression, x, y=0):
+    return tuple(Parse(expression).evaluate_batch(x=x, y=y).tolist())
+
+test_case(evaluate_with, ('sin(x)^2 + ln(x)', 2.0), math.sin(2.0) ** 2 + math.log(2.0), 5e-12, 5e-12)
+test_case(compiled_with, ('x * y + 2 ^ x', 3, 4), 20)
+test_case(variables, ('x + y * sin(x) + pi',), ['x', 'y'])
+
+if np is not None:
+    test_case(batch, ('sin(x)^2 + ln(x)', [0.5, 1.0, 2.0]), tuple(math.sin(x) ** 2 + math.log(x) for x in (0.5, 1.0, 2.0)), 5e-12, 5e-12)
+    test_case(batch, ('x * y + 1.5', [1, 2, 3], 2), (3.5, 5.5, 7.5))
+    test_case(batch, ('pi', [1, 2]), (PI, PI))
+
+def array_case(name, *values):
+    return tuple(array_function_list[name](*(np.array(v) for v in values)).tolist())
+
+if np is not None:
+    for name, reference, values, tol in [
+        ('sin', math.sin, [0.0, PI / 7.0, -2.345678901, 123.456789, 1e5], 5e-12),
+        ('cos', math.cos, [0.0, PI / 7.0, -2.345678901, 123.456789, 1e5], 5e-12),
+        ('tan', math.tan, [0.0, PI / 4.0, -1.23456789, 0.000000001], 5e-12),
+        ('cot', lambda x: 1 / math.tan(x), [PI / 4.0, -PI / 3.0, 1.1111], 5e-12),
+        ('exp', math.exp, [0.0, 1.0, -10.0, 700.0, -700.0], 5e-12),
+        ('expm1', math.expm1, [0.0, 1e-9, -20.0, 0.3], 5e-12),
+        ('ln', math.log, [1.0, math.e, 1e-12, 1e-300, 1e300], 5e-12),
+        ('log10', math.log10, [1000.0, 1.0, 0.01], 5e-12),
+        ('log1p', math.log1p, [0.0, 1e-12, -0.5], 5e-12),
+        ('atan', math.atan, [0.0, 1.0, 1e20, -10.0, 0.3], 5e-12),
+        ('asin', math.asin, [0.0, 0.5, -0.999999999999, 1.0], 5e-9),
+        ('acos', math.acos, [0.0, 0.5, -0.999999999999], 5e-9),
+        ('sinh', math.sinh, [0.0, -1.2, 3.4, 1e-10], 5e-12),
+        ('cosh', math.cosh, [0.0, -1.2, 3.4], 5e-12),
+        ('tanh', math.tanh, [0.0, -1.2, 3.4, 50.0], 5e-12),
+        ('asinh', math.asinh, [0.0, -2.3, 123.0], 5e-12),
+        ('acosh', math.acosh, [1.0, 2.0, 10.0], 5e-12),
+        ('atanh', math.atanh, [0.0, 0.5, -0.9], 5e-12),
+        ('erf', math.erf, [0.0, 1.0, -2.0, 3.0, 7.0], 5e-12),
+        ('erfc', math.erfc, [0.0, 1.0, -2.0, 5.0], 5e-12),
+        ('gamma', math.gamma, [1.0, 0.5, 5.0, 0.1, 170.5], 5e-12),
+        ('lgamma', math.lgamma, [1.5, 0.5, 10.0, 1e6], 5e-12),
+        ('sqrt', math.sqrt, [0.0, 2.0, 25.0], 5e-12),
+        ('factorial', math.factorial, [0, 5, 10, 20], 5e-15),
+        ('floor', math.floor, [1.9, -1.1, 3.0], 0.0),
+        ('isqrt', math.isqrt, [0, 15, 16, 10 ** 12], 0.0),
+    ]:
+        test_case(array_case, (name, values), tuple(reference(v) for v in values), tol, tol)
+
+    test_case(batch, ('sin(x)', [1e8, 1e15, 1e22, -1e300]), tuple(math.sin(x) for x in (1e8, 1e15, 1e22, -1e300)), 1e-15, 1e-15)
+    test_case(batch, ('cos(x)', [1e8, 1e15, 1e22, -1e300]), tuple(math.cos(x) for x in (1e8, 1e15, 1e22, -1e300)), 1e-15, 1e-15)
+    test_case(array_case, ('atan2', [0.0, 1.0, 1.0, -1.0], [1.0, 0.0, -1.0, -1.0]), tuple(math.atan2(y, x) for y, x in [(0.0, 1.0), (1.0, 0.0), (1.0, -1.0), (-1.0, -1.0)]), 5e-12, 5e-12)
+    test_case(array_case, ('comb', [5, 10, 52, 1000], [2, 0, 5, 3]), (10, 1, 2598960, 166167000), 5e-12, 5e-12)
+    test_case(array_case, ('perm', [5, 10, 200], [2, 10, 2]), (20, 3628800, 39800), 5e-12, 5e-12)
+    test_case(array_case, ('comb', [5, 1000, 200], [6, 500, 100]), (0, math.comb(1000, 500), math.comb(200, 100)), 5e-12, 5e-12)
+    test_case(array_case, ('perm', [5, 1000], [6, 20]), (0, math.perm(1000, 20)), 5e-12, 5e-12)
+    test_case(array_case, ('erfc', [0.7, 6.5, 27.0, -3.1]), tuple(math.erfc(x) for x in (0.7, 6.5, 27.0, -3.1)), 1e-14, 0.0)
+    test_case(array_case, ('hypot', [3.0, 1e5], [4.0, 1e5]), (5.0, math.hypot(1e5, 1e5)), 5e-12, 5e-12)
+    test_case(array_case, ('fmod', [5.5, -5.5], [2.0, 2.0]), (math.fmod(5.5, 2.0), math.fmod(-5.5, 2.0)), 5e-12, 5e-12)
+    test_case(array_case, ('fsum', [[1e10, 1.0, 1.0, 1.0, -1e10], [0.1] * 5]), (3.0, math.fsum([0.1] * 5)), 1e-15, 1e-15)
+    test_case(array_case, ('dist', [[0.0, 0.0], [1.0, 2.0]], [[3.0, 4.0], [4.0, 6.0]]), (5.0, 5.0), 5e-12, 5e-12)
+
+def run_batch(text, workers, chunksize):
+    output = io.StringIO()
+    failures = main.batch(io.StringIO(text), output, workers, chunksize, errors=io.StringIO())
+    return (failures, output.getvalue())
+
+BATCH_INPUT = '1 + 2\n\n1 / 0\n(10 C 3) * 2\n2 ^ 10\n'
+BATCH_OUTPUT = (1, '3\n\nerror: ZeroDivisionError: division by zero\n240\n1024\n')
+
+test_case(run_batch, (BATCH_INPUT, 1, 2), BATCH_OUTPUT)
+
+if __name__ == '__main__':
+    test_case(run_batch, (BATCH_INPUT, 2, 2), BATCH_OUTPUT)
+
+test_case(function_list['factorial'], (1000,), math.factorial(1000))
+test_case(function_list['factorial'], (4097,), math.factorial(4097))
+test_case(function_list['perm'], (1000, 500), math.perm(1000, 500))
+test_case(function_list['perm'], (5, 6), 0)
+test_case(function_list['comb'], (100000, 3), math.comb(100000, 3))
+test_case(function_list['comb'], (3000, 1400), math.comb(3000, 1400))
+test_case(function_list['comb'], (5, 6), 0)
+test_case(function_list['comb'], (10 ** 7, 64), math.comb(10 ** 7, 64))
+test_case(function_list['comb'], (10 ** 7, 65), math.comb(10 ** 7, 65))
+test_case(function_list['comb'], (10 ** 6, 40000), math.comb(10 ** 6, 40000))
+test_case(evaluate, ('(100000 C 3) + (1000 P 2) + 20!',), math.comb(100000, 3) + math.perm(1000, 2) + math.factorial(20))
+
+BIG_A = 3 ** 20000 + 7
+BIG_B = 7 ** 15000 * 11 + 3 ** 300 * 5
+
+test_case(function_list['isqrt'], (10 ** 40,), 10 ** 20)
+test_case(function_list['isqrt'], (10 ** 40 - 1,), 10 ** 20 - 1)
+test_case(function_list['isqrt'], (BIG_A,), math.isqrt(BIG_A))
+test_case(function_list['isqrt'], (15.9,), 3)
+test_case(function_list['gcd'], (BIG_A * 12345678910111213, BIG_B * 12345678910111213), math.gcd(BIG_A, BIG_B) * 12345678910111213)
+test_case(function_list['gcd'], (12, 18, 8), 2)
+test_case(function_list['gcd'], (), 0)
+test_case(function_list['lcm'], (4, 6, 10), 60)
+test_case(function_list['lcm'], (BIG_A, BIG_B), math.lcm(BIG_A, BIG_B))
+test_case(function_list['lcm'], (), 1)
+
+test_case(function_list['sincos'], (1.0,), (math.sin(1.0), math.cos(1.0)), 5e-12, 5e-12)
+test_case(function_list['sincos'], (-2.345678901,), (math.sin(-2.345678901), math.cos(-2.345678901)), 5e-12, 5e-12)
+test_case(function_list['sincos'], (123.456789,), (math.sin(123.456789), math.cos(123.456789)), 5e-10, 5e-10)
+test_case(function_list['sinh'], (1e-10,), math.sinh(1e-10), 5e-12, 0.0)
+test_case(function_list['tanh'], (-30.0,), math.tanh(-30.0), 5e-12, 5e-12)
+test_case(function_list['expm1'], (1e-9,), math.expm1(1e-9), 5e-12, 0.0)
+
+test_case(function_list['sin'], (1e22,), math.sin(1e22), 5e-15, 0.0)
+test_case(function_list['cos'], (-1e300,), math.cos(-1e300), 5e-15, 0.0)
+test_case(function_list['sincos'], (2.0 ** 60,), (math.sin(2.0 ** 60), math.cos(2.0 ** 60)), 5e-15, 0.0)
+test_case(function_list['ln'], (5e-324,), math.log(5e-324), 5e-15, 0.0)
+test_case(function_list['ln'], (1.7976931348623157e308,), math.log(1.7976931348623157e308), 5e-15, 0.0)
+test_case(function_list['exp'], (-745.0,), math.exp(-745.0), 0.0, 1e-320)
+test_case(function_list['exp'], (709.7,), math.exp(709.7), 5e-15, 0.0)
+test_case(function_list['atan'], (1e300,), math.atan(1e300), 5e-15, 0.0)
+test_case(function_list['erf'], (2.75,), math.erf(2.75), 5e-15, 0.0)
+test_case(function_list['erf'], (-5.99,), math.erf(-5.99), 5e-15, 0.0)
+
+def precise(expression, digits=50):
+    return str(Parse(expression, precision=digits))
+
+test_case(precise, ('pi',), '3.1415926535897932384626433832795028841971693993751')
+test_case(precise, ('exp(1)',), '2.7182818284590452353602874713526624977572470937')
+test_case(precise, ('sin(1)',), '0.84147098480789650665250232163029899962256306079837')
+test_case(precise, ('ln(10)',), '2.3025850929940456840179914546843642076011014886288')
+test_case(precise, ('gamma(2.5)',), '1.3293403881791370204736256125058588870981620920918')
+test_case(precise, ('erf(0.5)',), '0.52049987781304653768274665389196452873645157575796')
+test_case(precise, ('atan(0.5)',), '0.46364760900080611621425623146121440202853705428612')
+test_case(precise, ('cos(1000000000000000000000000000000)',), '-0.99593119440539570239424858799704864113024773495505')
+test_case(precise, ('1/3', 20), '0.33333333333333333333')
+test_case(precise, ('2.5 + pi - pi', 20), '2.5')
+test_case(precise, ('(10 C 3) + 5! + 2^10', 20), '1264')
+test_case(precise, ('lg(1000)',), '3')
+test_case(precise, ('comb(5.5, 2) + 0.5', 20), '12.875')
+test_case(precise, ('5.5 P 2.5',), '47.980879635840726832719924451383344206199288011438')
+test_case(lambda: Parse('comb(5.5, 2) + 0.5').evaluate(), (), 12.875, 1e-14, 0.0)
+test_case(lambda: Parse('(5.5 C 2) + 0.5').evaluate(), (), 12.875, 1e-14, 0.0)
+test_case(lambda: Parse('(x P 2) + 0.5').evaluate(x=5.5), (), 25.25, 1e-14, 0.0)
+test_case(lambda: len(precise('pi', 1000)), (), 1001)
+
+def spouge_tables(expressions, digits):
+    decimal_functions.cache.clear()
+    for expression in expressions:
+        precise(expression, digits)
+    return sum(1 for name, _ in decimal_functions.cache.data if isinstance(name, tuple) and name[0] == 'spouge')
+
+test_case(spouge_tables, (('gamma(2.5)', 'gamma(250.5)', 'gamma(25000.5)', 'lgamma(2.5)', 'lgamma(25000.5)'), 60), 1)
+test_case(lambda: Parse('x / 3', precision=30).evaluate(x=1.5), (), decimal.Decimal('0.5'))
+test_case(lambda: Parse('x / 3', precision=30).compile()(x=1), (), decimal.Decimal('0.333333333333333333333333333333'))
+
+def inferred(expression):
+    return Parse(expression, fold=False).ast
+
+test_case(evaluate, ('2.5 * pi',), 2.5 * math.pi)
+test_case(evaluate, ('ln(2.5) + 0.5',), math.log(2.5) + 0.5)
+test_case(evaluate, ('(1.5 + 2) * e',), 3.5 * math.e)
+test_case(evaluate, ('0.1 + 0.2',), decimal.Decimal('0.3'))
+test_case(evaluate, ('5! + 1.5',), decimal.Decimal('121.5'))
+test_case(evaluate_with, ('(0.1 + 0.2) * x', 2.0), 0.6000000000000001)
+test_case(compiled_with, ('x * 1.5 + y', 2.0, 0.25), 3.25)
+test_case(inferred, ('1.5 * pi',), ('symbol', '*', ('num', 1.5), ('num', math.pi)))
+test_case(inferred, ('(0.1 + 0.2) * x',), ('symbol', '*', ('convert', 'float', ('symbol', '+', ('num', decimal.Decimal('0.1')), ('num', decimal.Decimal('0.2')))), ('var', 'x')))
+test_case(inferred, ('2 ^ 10 + 3',), ('symbol', '+', ('symbol', '^', ('num', 2), ('num', 10)), ('num', 3)))
+test_case(inferred, ('0.5 < pi',), ('symbol', '<', ('num', decimal.Decimal('0.5')), ('num', math.pi)))
+test_case(lambda: Parse('(x && 2.5) + pi').evaluate(x=1), (), 2.5 + math.pi)
+test_case(lambda: Parse('(x || 2.5) + pi').evaluate(x=0), (), 2.5 + math.pi)
+
+def adaptive(expression, digits=15, **values):
+    value, escalations = Parse(expression).evaluate_adaptive(digits, **values)
+    return str(value)[:digits + 1], escalations > 0
+
+test_case(adaptive, ('sqrt(2)^2 + sqrt(2) - (2 - sqrt(2))',), ('2.82842712474618', False))
+test_case(adaptive, ('1 + 2',), ('3', False))
+test_case(adaptive, ('gamma(0.5)^2',), ('3.14159265358979', True))
+test_case(adaptive, ('cos(pi/2) + 1',), ('1.00000000000000', True))
+test_case(adaptive, ('((10 C 3) == 120) && ((gamma(6) === 120) || (gamma(6) == 120))',), ('True', True))
+test_case(lambda: Parse('x^2 - 2').evaluate_adaptive(x=1.4142135623730951)[0], (), decimal.Decimal('2.73432346306476928E-16'))
+test_case(lambda: Parse('x && ln(x)').evaluate_adaptive(x=0), (), (0, 0))
+test_case(lambda: Parse('1 || ln(0)').evaluate_adaptive(), (), (1, 0))
+test_case(adaptive, ('sqrt(2)' + ' + 1' * 1500,), ('1501.41421356237', True))
+test_case(adaptive, (' + '.join(str(i) for i in range(1, 3001)),), ('4501500', False))
+
+def memoized_calls(name, args):
+    memoize(name, maxsize=2)
+    try:
+        results = [function_list[name](a) for a in args]
+        stats = memo_stats()[name]
+        return results, stats['hits'], stats['misses'], stats['evictions']
+    finally:
+        unmemoize(name)
+
+test_case(memoized_calls, ('sqrt', [4.0, 4.0, 9.0, 4.0]), ([2.0, 2.0, 3.0, 2.0], 2, 2, 0))
+test_case(memoized_calls, ('sgn', [1, 1.0, True, -2]), ([1, 1, 1, -1], 0, 4, 2))
+test_case(memoized_calls, ('fsum', [[1.0, 2.0], [1.0, 2.0]]), ([3.0, 3.0], 0, 0, 0))
+test_case(lambda: [math.copysign(1, r) for r in memoized_calls('radians', [0.0, -0.0, 0.0])[0]], (), [1.0, -1.0, 1.0])
+test_case(lambda: memoized_calls('radians', [float('nan') for _ in range(3)])[1:], (), (2, 1, 0))
+test_case(lambda: (function_list['gamma'](6), function_list['factorial'](20), function_list['gamma'](171) == float(math.factorial(170))), (), (120.0, 2432902008176640000, True))
+test_case(evaluate, ('gamma(6) == 120',), True)
+
+test_case(function_list['lgamma'], (200.0,), math.lgamma(200.0), 1e-15, 0.0)
+test_case(function_list['lgamma'], (1e6 + 0.3,), math.lgamma(1e6 + 0.3), 1e-15, 0.0)
+test_case(function_list['lgamma'], (1e300,), math.lgamma(1e300), 1e-15, 0.0)
+test_case(function_list['lgamma'], (0.001,), math.lgamma(0.001), 1e-15, 0.0)
+test_case(function_list['lgamma'], (7.3,), math.lgamma(7.3), 1e-14, 0.0)
+test_case(function_list['gamma'], (0.25,), math.gamma(0.25), 1e-14, 0.0)
+test_case(function_list['gamma'], (10.5,), math.gamma(10.5), 1e-15, 0.0)
+test_case(function_list['gamma'], (150.2,), math.gamma(150.2), 1e-14, 0.0)
+test_case(function_list['gamma'], (171.5,), math.gamma(171.5), 1e-14, 0.0)
+test_case(function_list['comb'], (5.5, 2), 12.375, 1e-14, 0.0)
+test_case(function_list['comb'], (1e6 + 0.5, 3), (1e6 + 0.5) * (1e6 - 0.5) * (1e6 - 1.5) / 6, 1e-14, 0.0)
+test_case(function_list['perm'], (4.5, 3), 39.375, 1e-14, 0.0)
+test_case(function_list['perm'], (2.5, 2.5), math.gamma(3.5), 1e-14, 0.0)
+
+NORMAL = statistics.NormalDist()
+
+test_case(function_list['normcdf'], (1.3,), NORMAL.cdf(1.3), 1e-15, 0.0)
+test_case(function_list['normcdf'], (-0.2,), NORMAL.cdf(-0.2), 1e-15, 0.0)
+test_case(function_list['normcdf'], (-30.0,), 4.906713927148187e-198, 1e-14, 0.0)
+test_case(function_list['normcdf'], (1.5, 1.0, 2.0), NORMAL.cdf(0.25), 1e-15, 0.0)
+test_case(function_list['normpdf'], (0.7,), NORMAL.pdf(0.7), 1e-15, 0.0)
+test_case(function_list['normpdf'], (-35.0,), 3.940396277136024e-267, 1e-14, 0.0)
+test_case(function_list['invnorm'], (0.975,), NORMAL.inv_cdf(0.975), 1e-15, 0.0)
+test_case(function_list['invnorm'], (0.3,), NORMAL.inv_cdf(0.3), 1e-15, 0.0)
+test_case(function_list['invnorm'], (1e-100,), -21.273453560965324, 1e-15, 0.0)
+test_case(function_list['invnorm'], (0.5,), 0.0)
+test_case(function_list['erfc'], (10.0,), 2.0884875837625448e-45, 1e-14, 0.0)
+test_case(evaluate, ('invnorm(normcdf(1.25))',), 1.25, 1e-15, 0.0)
+test_case(precise, ('normcdf(0.3)', 40), '0.6179114221889526373065289631214176480512')
+test_case(precise, ('invnorm(0.975)', 40), '1.959963984540054235524594430520551527956')
+test_case(precise, ('erfc(0)', 20), '1')
+
+if np is not None:
+    test_case(array_case, ('normcdf', [1.3, -0.2, -30.0]), (NORMAL.cdf(1.3), NORMAL.cdf(-0.2), 4.906713927148187e-198), 1e-14, 0.0)
+    test_case(array_case, ('normpdf', [0.7, -35.0]), (NORMAL.pdf(0.7), 3.940396277136024e-267), 1e-14, 0.0)
+    test_case(array_case, ('invnorm', [0.975, 1e-100, 0.5]), (NORMAL.inv_cdf(0.975), -21.273453560965324, 0.0), 1e-14, 0.0)
+    test_case(lambda: np.isnan(array_function_list['invnorm'](np.array([0.0, 1.0, 1.5]))).tolist(), (), [True, True, True])
+
+def parse_error(expression):
+    try:
+        Parse(expression)
+    except main.ParseError as e:
+        return str(e)
+
+test_case(evaluate, ('atan2(1, 2)',), math.atan2(1, 2), 1e-15, 0.0)
+test_case(evaluate, ('hypot(3, 4) + gcd(12, 18, 27) + lcm(4, 6)',), 20.0)
+test_case(evaluate, ('fma(2, 3, 4) + ldexp(1.5, 3) + copysign(2, 0 - 1)',), 20.0)
+test_case(evaluate, ('isclose(0.1 + 0.2, 0.3)',), True)
+test_case(evaluate, ('log10(1000) + log2(8)',), 6.0, 1e-15, 0.0)
+test_case(evaluate_with, ('normcdf(x, 1, 2)', 1.5), statistics.NormalDist(1, 2).cdf(1.5), 1e-15, 0.0)
+test_case(compiled_with, ('atan2(x, y) + fma(x, y, 1)', 2.0, 0.5), math.atan2(2.0, 0.5) + 2.0, 1e-15, 0.0)
+test_case(compiled, ('gcd()',), 0)
+test_case(precise, ('hypot(3, 4)', 20), '5')
+test_case(lambda: Parse('atan2(y, 2)', fold=False).ast, (), ('function', 'atan2', ('var', 'y'), ('num', 2)))
+test_case(lambda: Parse('hypot(x2, 3)').evaluate_adaptive(x2=4), (), (5.0, 0))
+test_case(parse_error, ('sin(1, 2)',), "Function 'sin' takes 1 argument, got 2")
+test_case(parse_error, ('atan2(1)',), "Function 'atan2' takes 2 arguments, got 1")
+test_case(parse_error, ('isclose(1)',), "Function 'isclose' takes 2 to 4 arguments, got 1")
+test_case(parse_error, ('hypot(3, 4',), "Missing ')' after the arguments of 'hypot'")
+test_case(parse_error, ('sin 1',), "Function 'sin' must be followed by '('")
+test_case(parse_error, ('gcd(1, 2, 3, 4)',), None)
+
+if np is not None:
+    test_case(lambda: Parse('atan2(y, x) + hypot(x, y)').evaluate_batch(x=np.array([1.0, 2.0]), y=np.array([1.0, 0.5])).tolist(), (), [math.atan2(1, 1) + math.hypot(1, 1), math.atan2(0.5, 2) + math.hypot(2, 0.5)], 1e-15, 0.0)
+
+def streamed_peak(expression, n):
+    tracemalloc.start()
+    try:
+        value = Parse(expression).evaluate(n=n)
+        return value, tracemalloc.get_traced_memory()[1] < 1 << 20
+    finally:
+        tracemalloc.stop()
+
+def vectorized(expression, x=0.0):
+    return Parse(expression, vectorize=True).evaluate(x=x)
+
+test_case(evaluate, ('fsum(k^2 for k in range(1, 11))',), 385.0)
+test_case(evaluate, ('prod(k for k in range(1, 21))',), math.factorial(20))
+test_case(evaluate, ('fsum(range(0, 1, 0.1)) + fsum(0.1 for k in range(10))',), 5.5)
+test_case(evaluate, ('sumprod((k for k in range(3)), (k + 1 for k in range(3)))',), 8)
+test_case(evaluate, ('fsum(fsum(j for j in range(k)) for k in range(5))',), 10.0)
+test_case(evaluate_with, ('dist((x * k for k in range(3)), range(3))', 2), math.sqrt(5), 1e-15, 0.0)
+test_case(compiled_with, ('fsum(x / k for k in range(1, 4)) + y',  6.0, 1.0), 12.0)
+test_case(variables, ('fsum(x * k for k in range(n))',), ['n', 'x'])
+test_case(precise, ('fsum(k * 0.1 for k in range(10))', 20), '4.5')
+test_case(lambda: Parse('fsum(k for k in range(1, 10))', fold=False).ast[2], (), ('map', 'k', ('var', 'k'), ('function', 'range', ('num', 1), ('num', 10))))
+test_case(lambda: str(Parse('range(1, 10)')) + str(Parse('(k for k in range(4))')), (), 'range(1, 10)<sequence of 4 values>')
+test_case(streamed_peak, ('fsum(k for k in range(n))', 200000), (19999900000.0, True))
+test_case(function_list['fsum'], ([1e100, 1.0, -1e100, 1e-100, 1e50, -1.0, -1e50],), 1e-100, 0.0, 0.0)
+test_case(function_list['fsum'], ([2.0 ** 53, 1.0, 2.0 ** -60],), 2.0 ** 53 + 2.0, 0.0, 0.0)
+test_case(function_list['fsum'], (range(1, 1001),), 500500.0, 0.0, 0.0)
+test_case(lambda: math.isnan(function_list['fsum']([math.inf, 1.0, -math.inf])), (), True)
+test_case(function_list['dist'], (iter([0.0, 0.0]), iter([3.0, 4.0])), 5.0)
+test_case(parse_error, ('fsum(k for 2 in range(3))',), "Expected a variable name after 'for', got '2'")
+test_case(parse_error, ('fsum(k for k range(3))',), "Expected 'in' after 'for k'")
+
+if np is not None:
+    test_case(vectorized, ('fsum(1 / k^2 for k in range(1, 10001))',), math.fsum(1 / k ** 2 for k in range(1, 10001)), 1e-15, 0.0)
+    test_case(vectorized, ('fsum(x * sin(k) for k in range(10000))', 2.0), 2 * math.fsum(math.sin(k) for k in range(10000)), 1e-12, 1e-12)
+    test_case(vectorized, ('prod(k for k in range(1, 30))',), math.factorial(29))
+    test_case(vectorized, ('fsum(fsum(j for j in range(k)) for k in range(5))',), 10.0)
+    test_case(lambda: Parse('fsum(range(x))').evaluate_batch(x=np.array(4.0)).tolist(), (), 6.0)
+    test_case(lambda: Parse('gcd(x, 6, 9)').evaluate_batch(x=np.array([12, 18])).tolist(), (), [3, 3])
+    test_case(lambda: Parse('x && 3').evaluate_batch(x=np.array([12, 0])).tolist(), (), [3, 0])
+    test_case(lambda: Parse('x || 3').evaluate_batch(x=np.array([12, 0])).tolist(), (), [12, 3])
+    test_case(lambda: Parse('lcm(x, 4, 6)').evaluate_batch(x=np.array([5, 3])).tolist(), (), [60, 12])
+
+def series_error(expression):
+    try:
+        Parse(expression).evaluate()
+    except (ValueError, ArithmeticError) as e:
+        return f'{type(e).__name__}: {e}'
+
+test_case(evaluate, ('sum(k, 1, 10, k^2)',), 385)
+test_case(evaluate, ('sum(k, 1, 10^8, k^2)',), 333333338333333350000000)
+test_case(evaluate, ('sum(k, 0 - 5, 5, k^3 + k^2)',), 110)
+test_case(evaluate, ('sum(k, 0, 30, 2^k) + sum(k, 1, 0, k)',), 2 ** 31 - 1)
+test_case(evaluate, ('sum(k, 1, 100, k / 3)',), 5050 / 3, 1e-15, 0.0)
+test_case(evaluate, ('sum(k, 1, 1000, 1 / k^2)',), math.fsum(1 / k ** 2 for k in range(1, 1001)), 0.0, 0.0)
+test_case(evaluate, ('sum(i, 1, 3, sum(j, 1, i, i * j))',), 25)
+test_case(evaluate_with, ('sum(k, 1, 10, x^k)', 0.999999), math.fsum(0.999999 ** k for k in range(1, 11)), 1e-15, 0.0)
+test_case(evaluate, ('product(k, 1, 20, k)',), math.factorial(20))
+test_case(evaluate, ('product(k, 1, 10, 2 * k + 4)',), math.prod(2 * k + 4 for k in range(1, 11)))
+test_case(evaluate, ('product(k, 1, 10, 2^k)',), 2 ** 55)
+test_case(evaluate, ('product(k, 1, 10, 1 + 1 / k)',), 11.0, 1e-15, 0.0)
+test_case(evaluate, ('sum(k, 1, inf, 1 / k^2)',), math.pi ** 2 / 6, 1e-14, 0.0)
+test_case(evaluate, ('sum(k, 1, inf, 1 / k^1.5)',), 2.612375348685488, 1e-14, 0.0)
+test_case(evaluate, ('sum(k, 1, inf, (0 - 1)^(k + 1) / k)',), math.log(2), 1e-14, 0.0)
+test_case(evaluate, ('sum(k, 0, inf, (0 - 1)^k / (2 * k + 1))',), math.pi / 4, 1e-14, 0.0)
+test_case(evaluate, ('sum(k, 0, inf, 1 / k!)',), math.e, 1e-15, 0.0)
+test_case(evaluate, ('sum(k, 1, inf, k / 2^k) + sum(k, 0, inf, 0.5^k)',), 4.0, 1e-15, 0.0)
+test_case(evaluate, ('product(k, 2, inf, 1 - 1 / k^2)',), 0.5, 1e-13, 0.0)
+test_case(evaluate, ('sum(k, 1, inf, 1 / k^2, 10^(0 - 6))',), math.pi ** 2 / 6, 1e-6, 0.0)
+test_case(compiled_with, ('sum(k, 1, 100, x * k + y)', 2.0, 1.0), 10200.0)
+test_case(variables, ('sum(k, 1, n, x * k)',), ['n', 'x'])
+test_case(precise, ('sum(k, 1, inf, 1 / k^2)', 30), '1.64493406684822643647241516662')
+test_case(series_error, ('sum(k, 1, inf, k)',), 'ValueError: Series diverges')
+test_case(series_error, ('sum(k, 1, 2.5, k)',), 'ValueError: Bounds of sum must be integers, got 2.5')
+test_case(parse_error, ('sum(1, 1, 2, 3)',), "Expected the index variable of 'sum', got '1'")
+test_case(parse_error, ('product(k, 1, 2)',), "'product' takes an index, two bounds, a body and an optional tolerance")
+
+if np is not None:
+    test_case(lambda: Parse('sum(k, 1, 4, x^k)').evaluate_batch(x=np.array([1.0, 2.0])).tolist(), (), [4.0, 30.0])
+
+def derivative(expression, x):
+    from calculus import ForwardMode
+    from compiler import CompiledExpression
+    return ForwardMode('x', lambda ast: CompiledExpression(ast).fn).compile(Parse(expression).ast)({'x': x})
+
+def float_only(expression):
+    try:
+        Parse(expression, precision=20).evaluate()
+    except ValueError as e:
+        return str(e)
+
+test_case(evaluate, ('integrate(x, 0, 1, x^2)',), 1 / 3, 1e-15, 0.0)
+test_case(evaluate, ('integrate(x, 0, pi, sin(x))',), 2.0, 1e-15, 0.0)
+test_case(evaluate, ('integrate(x, 0, 1, 1 / sqrt(x))',), 2.0, 1e-12, 0.0)
+test_case(evaluate, ('integrate(x, 0, 1, ln(x)^2 / sqrt(x))',), 16.0, 1e-12, 0.0)
+test_case(evaluate, ('integrate(x, 0 - inf, inf, exp(0 - x^2))',), math.sqrt(math.pi), 1e-14, 0.0)
+test_case(evaluate, ('integrate(x, 1, inf, 1 / x^2) + integrate(x, 0 - inf, 0, exp(x))',), 2.0, 1e-14, 0.0)
+test_case(evaluate, ('integrate(x, 1, 0, x) + integrate(x, 2, 2, x)',), -0.5, 1e-15, 0.0)
+test_case(evaluate, ('integrate(x, 0, 1, abs(x - 0.3))',), 0.29, 1e-12, 0.0)
+test_case(evaluate, ('integrate(y, 0, 1, integrate(x, 0, y, x * y))',), 0.125, 1e-14, 0.0)
+test_case(evaluate, ('integrate(x, 0 - 1, 1, 1 / sqrt(1 - x^2), 10^(0 - 7))',), math.pi, 1e-7, 0.0)
+test_case(compiled_with, ('integrate(t, 0, x, t^2) + y', 3.0, 1.0), 10.0, 1e-14, 0.0)
+test_case(lambda: Parse('sin(x)').integrate('x', 0, PI)[1], (), {'evaluations': 15, 'intervals': 1, 'method': 'gauss-kronrod', 'error': 1.7903229000278308e-12})
+test_case(lambda: Parse('exp(0 - a * x)').integrate('x', 0, math.inf, a=2.0)[0], (), 0.5, 1e-14, 0.0)
+test_case(evaluate, ('solve(x, 1, x^2 - 2)',), math.sqrt(2), 1e-15, 0.0)
+test_case(evaluate, ('solve(x, 0, 2, cos(x) == x)',), 0.7390851332151607, 1e-15, 0.0)
+test_case(evaluate, ('solve(x, 1, 3, x^3 - 2 * x - 5)',), 2.0945514815423265, 1e-15, 0.0)
+test_case(evaluate, ('solve(x, 0.1, 10, floor(x) + x - 3.5)',), 2.0, 1e-15, 0.0)
+test_case(evaluate, ('solve(y, 0, 5, integrate(x, 0, y, x^2) - 9)',), 3.0, 1e-14, 0.0)
+test_case(compiled_with, ('solve(t, 0, 10, t^2 - x) + y', 2.0, 1.0), math.sqrt(2) + 1, 1e-15, 0.0)
+test_case(lambda: Parse('x^2 == a').solve('x', 1, a=3)[1], (), {'evaluations': 0, 'derivative_evaluations': 6, 'iterations': 6, 'method': 'newton'})
+test_case(lambda: Parse('minimize(t, 0, 3, (t - x)^2) - 2').solve('x', 0, 3)[1]['method'], (), 'brent')
+test_case(evaluate, ('minimize(x, 3, 4, cos(x))',), math.pi, 1e-15, 0.0)
+test_case(evaluate, ('minimize(x, 0, 3, (x - 1.5)^2 + 1)',), 1.5, 1e-15, 0.0)
+test_case(evaluate, ('minimize(x, 0.5, 3, gamma(x))',), 1.4616321449683622, 1e-15, 0.0)
+test_case(evaluate, ('minimize(x, 0, 2, x)',), 0.0, 0.0, 1e-9)
+test_case(variables, ('integrate(x, a, b, x * c) + solve(y, 0, y - d)',), ['a', 'b', 'c', 'd'])
+test_case(derivative, ('gamma(x) + x^x', 2.5), (math.gamma(2.5) + 2.5 ** 2.5, math.gamma(2.5) * 0.7031566406452432 + 2.5 ** 2.5 * (math.log(2.5) + 1)), 1e-14, 0.0)
+test_case(derivative, ('atan2(x, 2) * normcdf(x, 1, 2)', 0.5), (math.atan2(0.5, 2) * 0.4012936743170763, 2 / 4.25 * 0.4012936743170763 + math.atan2(0.5, 2) * 0.19333405840142465), 1e-14, 0.0)
+test_case(derivative, ('fsum(x^k for k in range(4)) + product(k, 1, 3, x + k)', 2.0), (15.0 + 60.0, 1 + 4 + 12 + 47.0), 1e-15, 0.0)
+test_case(derivative, ('integrate(t, 0, x, t * x)', 2.0), (4.0, 6.0), 1e-14, 0.0)
+test_case(derivative, ('solve(t, 0, 5, t^3 - x)', 8.0), (2.0, 1 / 12), 1e-14, 0.0)
+test_case(function_list['lgamma'].__self__._digamma, (1.0,), -0.5772156649015329, 1e-15, 0.0)
+test_case(function_list['lgamma'].__self__._digamma, (-0.5,), 0.03648997397857652, 1e-14, 0.0)
+test_case(series_error, ('solve(x, 2, 3, x^2 - 2)',), 'ValueError: No sign change between 2.0 and 3.0 to bracket a root')
+test_case(series_error, ('solve(x, 0, x^2 + 1)',), 'ArithmeticError: Zero derivative at 0.0, no Newton step')
+test_case(series_error, ('integrate(x, 1, inf, 1 / x)',), 'ArithmeticError: Integral did not converge to 1e-12 within 2000 intervals')
+test_case(float_only, ('integrate(x, 0, 1, x)',), 'integrate, solve and minimize evaluate in floats, parse without a precision')
+test_case(parse_error, ('integrate(x, 0, x)',), "'integrate' takes a variable, two bounds, a body and an optional tolerance")
+test_case(parse_error, ('solve(x, 0, 1, 2, x)',), "'solve' takes a variable, a starting point or two bracketing points and a body")
+test_case(parse_error, ('minimize(2, 0, 1, x)',), "Expected the variable of 'minimize', got '2'")
+
+if np is not None:
+    test_case(vectorized, ('fsum(integrate(x, 0, k, x) for k in range(4))',), 7.0, 1e-15, 0.0)
+
+def tree(expression):
+    return Parse(expression, fold=False).ast
+
+test_case(tree, ('1 - 2 - 3',), ('symbol', '-', ('symbol', '-', ('num', 1), ('num', 2)), ('num', 3)))
+test_case(tree, ('2 ** 3 ^ 2',), ('symbol', '^', ('num', 2), ('symbol', '^', ('num', 3), ('num', 2))))
+test_case(tree, ('~x^2!',), ('symbol', '^', ('unary', '~', ('var', 'x')), ('postfix', '!', ('num', 2))))
+test_case(tree, ('a || b && c < d | u xor f & g << h + i * j P k',), ('symbol', '||', ('var', 'a'), ('symbol', '&&', ('var', 'b'), ('symbol', '<', ('var', 'c'),
+    ('symbol', '|', ('var', 'd'), ('symbol', 'xor', ('var', 'u'), ('symbol', '&', ('var', 'f'), ('symbol', '<<', ('var', 'g'),
+    ('symbol', '+', ('var', 'h'), ('symbol', '*', ('var', 'i'), ('symbol', 'P', ('var', 'j'), ('var', 'k'))))))))))))
+test_case(evaluate, ('2 < 3 == 1 + 0',), True)
+
+def tokens(expression):
+    scanned = []
+    for token in scan(expression, function_list, constants):
+        scanned.append(token)
+        if token[0] == 'end':
+            return scanned
+
+test_case(tokens, ('sin(x2) >== 2.5pi',), [('function', 'sin', 0), ('op', '(', 3), ('name', 'x2', 4), ('op', ')', 6), ('op', '>==', 8),
+    ('num', decimal.Decimal('2.5'), 12), ('constant', 'pi', 15), ('end', None, 17)])
+test_case(tokens, ('2.pi',), [('num', 2, 0), ('op', '.', 1), ('constant', 'pi', 2), ('end', None, 4)])
+test_case(parse_error, ('1 + 2 @ 3',), "Unexpected character '@' at offset 6")
+test_case(parse_error, ('x = 1',), "Unexpected character '=' at offset 2")
+test_case(parse_error, ('(1 + (2 * 3)',), "Missing ')' for the '(' at offset 0")
+test_case(parse_error, ('1 + 2) * 3',), "Unexpected ')' at offset 5")
+test_case(parse_error, ('2 * ',), 'Unexpected end of expression at offset 4')
+test_case(parse_error, ('sum(k, 1, 3, k) 4',), "Unexpected '4' at offset 16")
+
+def deep(opening, middle, closing, n):
+    return Parse(opening * n + middle + closing * n, fold=False).evaluate(x=1)
+
+# Nesting far beyond the recursion limit, the last case is a million nodes
+test_case(deep, ('(', 'x', ')', 10**4), 1)
+test_case(deep, ('x ^ ', 'x', '', 10**4), 1)
+test_case(deep, ('~', 'x', '', 10**4 + 1), -2)
+test_case(deep, ('x && ', 'x', '', 10**4), 1)
+test_case(deep, ('sin(', 'x - x', ')', 10**4), 0.0)
+test_case(deep, ('gcd(2, ', 'x', ')', 10**4), 1)
+test_case(deep, ('(x + ', 'x', ')', 10**4), 10001)
+test_case(deep, ('x + ', 'x', '', 5 * 10**5), 500001)
+test_case(lambda n: Parse('(' * n + '2' + ')' * n).ast, (10**4,), ('num', 2))
+test_case(lambda n: Parse('x - ' * n + 'y').variables, (10**4,), {'x', 'y'})
+test_case(parse_error, ('(' * 10**4 + 'x',), "Missing ')' for the '(' at offset 9999")
+
+def compact(expression):
+    parsed = Parse(expression, fold=False, compact=True)
+    return parsed.tree() == Parse(expression, fold=False).ast, parsed.evaluate(x=1.5, y=2)
+
+test_case(compact, ('2 * x + y^2 - sin(x) / 3',), (True, 7.0 - math.sin(1.5) / 3), 1e-15, 0.0)
+test_case(compact, ('(x < 1 && 1 / 0) || y',), (True, 2))
+test_case(compact, ('x > 1 || 1 / 0',), (True, True))
+test_case(compact, ('gcd(4, 6, 8) + gcd() + hypot(3, 4)',), (True, 7.0))
+test_case(compact, ('fsum(k * x for k in range(4)) + sum(k, 1, 3, k)',), (True, 15.0))
+test_case(compact, ('~3! + 2.5 + 2.5 + £y$',), (True, decimal.Decimal('0.0')))
+test_case(lambda: str(Parse('1/3 + x', precision=30, compact=True).evaluate(x=1)), (), '1.33333333333333333333333333333')
+test_case(lambda: Parse('x + x + 1 + 1', fold=False, compact=True).store.pool, (), ['x', 1])
+test_case(lambda: Parse('(x + 1) * 2', compact=True).variables, (), {'x'})
+test_case(lambda n: Parse('x + ' * n + 'x', compact=True).evaluate(x=1), (10**5,), 100001)
+
+def calls(expression, name, share):
+    original = function_list[name]
+    count = 0
+    def counted(*args):
+        nonlocal count
+        count += 1
+        return original(*args)
+    function_list[name] = counted
+    try:
+        Parse(expression, fold=False, share=share).evaluate(x=2)
+    finally:
+        function_list[name] = original
+    return count
+
+def calls_impure(expression, name):
+    mark_impure(name)
+    try:
+        return calls(expression, name, True)
+    finally:
+        impure_functions.discard(name)
+
+test_case(calls, ('sqrt(x)^2 + sqrt(x) - (2 - sqrt(x))', 'sqrt', True), 1)
+test_case(calls, ('sqrt(x)^2 + sqrt(x) - (2 - sqrt(x))', 'sqrt', False), 3)
+test_case(calls, ('ln(exp(x + 1)) + ln(exp(x + 1)) * ln(exp(x + 1))', 'exp', True), 1)
+test_case(calls, ('x > 3 && sqrt(x) || sqrt(x) + sqrt(x)', 'sqrt', True), 1)
+test_case(calls_impure, ('sqrt(x) + sqrt(x)', 'sqrt'), 2)
+test_case(lambda: Parse('sqrt(2)^2 + sqrt(2) - (2 - sqrt(2))', fold=False).sharing, (), {'nodes': 12, 'distinct': 6, 'shared': 1})
+test_case(lambda: Parse('(x + 1.0) + (x + 1) + (0.0 - 0) + (0 - 0.0)', fold=False).sharing, (), {'nodes': 17, 'distinct': 14, 'shared': 0})
+test_case(lambda: Parse('sin(x) * sin(x)').ast[2] is Parse('sin(x) * sin(x)').ast[3], (), True)
+test_case(lambda: Parse('fsum(k * 2 for k in range(3)) + k * 2').evaluate(k=5), (), 16.0)
+test_case(lambda: Parse('sin(x) + sin(x)', share=False).sharing, (), None)
+test_case(lambda: Parse('sin(x) + sin(x)', compact=True).sharing, (), None)
@@ -0,0 +1,654 @@
+import decimal
+from functions import function_list, functions
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def _horner(x, coefficients):
+    ''' Evaluate a polynomial with coefficients in ascending order '''
+    r = coefficients[-1]
+    for c in reversed(coefficients[:-1]):
+        r = r * x + c
+    return r
+
+class ArrayFunc:
+    ''' Array versions of Func using fixed degree polynomials and masked range reduction '''
+
+    def __init__(self):
+        self.PI = functions.PI
+        self.HALF_PI = functions.HALF_PI
+        self.QUARTER_PI = functions.QUARTER_PI
+        self.LN2 = functions.LN2
+        self.LN10 = functions.LN10
+        self.SQRT_HALF = 0.7071067811865476
+        self.SQRT_2PI = functions.SQRT_2PI
+        self.LN_SQRT_2PI = 0.9189385332046728
+        self.TWO_OVER_PI = 0.6366197723675814
+        self.LANCZOS_CONSTANTS = functions.LANCZOS_CONSTANTS
+
+        self.LN2_HI = functions.LN2_HI
+        self.LN2_LO = functions.LN2_LO
+        self.PIO2_1 = functions.PIO2_1
+        self.PIO2_2 = functions.PIO2_2
+        self.PIO2_3 = functions.PIO2_3
+        # Largest |x| whose quadrant n keeps n * PIO2_1 exact, beyond it Func._reduce_large takes over
+        self.REDUCTION_LIMIT = 823549.0
+
+        factorial = functions.GAMMA_INTEGERS
+        self.FACTORIALS = np.array(factorial)
+
+        # Taylor coefficients, truncated where the next term drops below 1e-17
+        self.EXPM1_COEFFS = [1 / factorial[n] for n in range(1, 15)]
+        self.SIN_COEFFS = [(-1) ** n / factorial[2 * n + 1] for n in range(9)]
+        self.COS_COEFFS = [(-1) ** n / factorial[2 * n] for n in range(10)]
+        self.ATANH_COEFFS = [1 / (2 * n + 1) for n in range(12)]
+        self.ATAN_COEFFS = [(-1) ** n / (2 * n + 1) for n in range(13)]
+        # Piecewise tables transposed, so each coefficient gathers into a contiguous row
+        self.ERF_TABLE = np.array(functions.ERF_TABLE).T.copy()
+        self.ERF_SMALL = functions.ERF_COEFFS
+        self.ERFC_TABLE = np.array(functions.ERFC_TABLE).T.copy()
+        # e^b for the |b| < 1e-4 low part of a split square
+        self.EXP_TINY = [1.0, 1.0, 1 / 2, 1 / 6, 1 / 24]
+        self.ERFC_TAIL = functions.ERFC_TAIL
+        self.SQRT_PI = functions.SQRT_PI
+        self.INV_SQRT_2PI = functions.INV_SQRT_2PI
+        # Acklam's coefficients in ascending order for _horner
+        self.INVNORM_A = functions.INVNORM_A[::-1]
+        self.INVNORM_B = [1.0] + functions.INVNORM_B[::-1]
+        self.INVNORM_C = functions.INVNORM_C[::-1]
+        self.INVNORM_D = [1.0] + functions.INVNORM_D[::-1]
+        self.INVNORM_LOW = functions.INVNORM_LOW
+
+    def _float(self, x):
+        return np.asarray(x, dtype=float)
+
+    def _expm1_reduced(self, x):
+        ''' Return expm1(r) and k with x = k ln2 + r, |r| <= ln2 / 2 '''
+        x = np.clip(x, -746.0, 710.0)
+        k = np.rint(x / self.LN2)
+        r = (x - k * self.LN2_HI) - k * self.LN2_LO
+        return r * _horner(r, self.EXPM1_COEFFS), np.nan_to_num(k).astype(np.int64)
+
+    def _sincos_reduced(self, x):
+        ''' Return sin(r), cos(r) and the quadrant with x = n pi/2 + r, |r| <= pi/4 '''
+        n = np.rint(x * self.TWO_OVER_PI)
+        r = np.array(((x - n * self.PIO2_1) - n * self.PIO2_2) - n * self.PIO2_3)
+        q = np.mod(np.nan_to_num(n), 4).astype(np.int64)
+        # The few large arguments are reduced one by one against the exact expansion of 2/π
+        large = np.flatnonzero(np.isfinite(x) & (np.abs(x) >= self.REDUCTION_LIMIT))
+        for i in large:
+            r.flat[i], q.flat[i] = functions._reduce_large(float(x.flat[i]))
+        r2 = r * r
+        s = r * _horner(r2, self.SIN_COEFFS)
+        c = _horner(r2, self.COS_COEFFS)
+        return s, c, q
+
+    def sincosFn(self, x):
+        ''' Compute sine and cosine with a single argument reduction '''
+        x = self._float(x)
+        s, c, q = self._sincos_reduced(x)
+        odd = (q & 1) == 1
+        sin = np.where(odd, c, s)
+        cos = np.where(odd, s, c)
+        sin = np.where(q >= 2, -sin, sin)
+        cos = np.where((q == 1) | (q == 2), -cos, cos)
+        return sin, cos
+
+    def sinFn(self, x):
+        ''' Compute sine '''
+        return self.sincosFn(x)[0]
+
+    def cosFn(self, x):
+        ''' Compute cosine '''
+        return self.sincosFn(x)[1]
+
+    def tanFn(self, x):
+        ''' Compute tangent '''
+        s, c = self.sincosFn(x)
+        return s / c
+
+    def secFn(self, x):
+        ''' Compute secant '''
+        return 1 / self.cosFn(x)
+
+    def cscFn(self, x):
+        ''' Compute cosecant '''
+        return 1 / self.sinFn(x)
+
+    def cosecFn(self, x):
+        ''' Compute cosecant '''
+        return self.cscFn(x)
+
+    def cotFn(self, x):
+        ''' Compute cotangent '''
+        s, c = self.sincosFn(x)
+        return c / s
+
+    def expFn(self, x):
+        ''' Compute exponential '''
+        p, k = self._expm1_reduced(self._float(x))
+        return np.ldexp(1 + p, k)
+
+    def expm1Fn(self, x):
+        ''' Compute exp(x) - 1 without cancellation near zero '''
+        p, k = self._expm1_reduced(self._float(x))
+        return np.ldexp(p, k) + (np.ldexp(1.0, k) - 1)
+
+    def exp2Fn(self, x):
+        ''' Compute 2 raised to the power x '''
+        return self.expFn(self._float(x) * self.LN2)
+
+    def lnFn(self, x):
+        ''' Compute natural logarithm, nan for negative input '''
+        x = self._float(x)
+        m, e = np.frexp(x)
+        small = m < self.SQRT_HALF
+        m = np.where(small, m * 2, m)
+        e = e - small
+        y = (m - 1) / (m + 1)
+        s = 2 * y * _horner(y * y, self.ATANH_COEFFS)
+        r = e * self.LN2_HI + (e * self.LN2_LO + s)
+        r = np.where(x == 0, -np.inf, r)
+        r = np.where(x == np.inf, np.inf, r)
+        return np.where(x < 0, np.nan, r)
+
+    def logFn(self, x):
+        ''' Compute natural logarithm '''
+        return self.lnFn(x)
+
+    def log10Fn(self, x):
+        ''' Compute base-10 logarithm '''
+        return self.lnFn(x) / self.LN10
+
+    def lgFn(self, x):
+        ''' Compute base-10 logarithm '''
+        return self.log10Fn(x)
+
+    def log2Fn(self, x):
+        ''' Compute base-2 logarithm '''
+        return self.lnFn(x) / self.LN2
+
+    def log1pFn(self, x):
+        ''' Compute ln(1 + x), correcting for the rounding of 1 + x '''
+        x = self._float(x)
+        u = 1 + x
+        d = u - 1
+        return np.where(d == 0, x, self.lnFn(u) * (x / np.where(d == 0, 1, d)))
+
+    def atanFn(self, x):
+        ''' Compute arctangent '''
+        x = self._float(x)
+        ax = np.abs(x)
+        invert = ax > 1
+        t = np.where(invert, 1 / np.where(invert, ax, 1), ax)
+        shift = t > 0.41421356237309503
+        t = np.where(shift, (t - 1) / (t + 1), t)
+        # Half angle step brings |v| under 0.21
+        v = t / (1 + np.sqrt(1 + t * t))
+        a = 2 * v * _horner(v * v, self.ATAN_COEFFS)
+        a = np.where(shift, a + self.QUARTER_PI, a)
+        a = np.where(invert, self.HALF_PI - a, a)
+        return np.copysign(a, x)
+
+    def atan2Fn(self, y, x):
+        ''' Compute arctangent two '''
+        y = self._float(y)
+        x = self._float(x)
+        a = self.atanFn(y / np.where(x == 0, 1, x))
+        a = np.where(x < 0, np.where(y >= 0, a + self.PI, a - self.PI), a)
+        return np.where(x == 0, np.sign(y) * self.HALF_PI, a)
+
+    def asinFn(self, x):
+        ''' Compute arcsine, nan outside [-1, 1] '''
+        x = self._float(x)
+        inside = np.abs(x) < 1
+        d = np.sqrt(np.where(inside, 1 - x * x, 1))
+        r = np.where(inside, self.atanFn(x / d), np.sign(x) * self.HALF_PI)
+        return np.where(np.abs(x) > 1, np.nan, r)
+
+    def acosFn(self, x):
+        ''' Compute arccosine '''
+        return self.HALF_PI - self.asinFn(x)
+
+    def sqrtFn(self, x):
+        ''' Square root, nan for negative input '''
+        return np.sqrt(self._float(x))
+
+    def cbrtFn(self, x):
+        ''' Compute cube root '''
+        return np.cbrt(self._float(x))
+
+    def sinhFn(self, x):
+        ''' Compute hyperbolic sine '''
+        x = self._float(x)
+        u = self.expm1Fn(np.abs(x))
+        return np.copysign((u + u / (u + 1)) / 2, x)
+
+    def coshFn(self, x):
+        ''' Compute hyperbolic cosine '''
+        ex = self.expFn(np.abs(self._float(x)))
+        return (ex + 1 / ex) / 2
+
+    def tanhFn(self, x):
+        ''' Compute hyperbolic tangent '''
+        x = self._float(x)
+        u = self.expm1Fn(2 * np.minimum(np.abs(x), 20.0))
+        return np.copysign(u / (u + 2), x)
+
+    def asinhFn(self, x):
+        ''' Compute inverse hyperbolic sine '''
+        x = self._float(x)
+        ax = np.abs(x)
+        return np.copysign(self.lnFn(ax + np.sqrt(ax * ax + 1.0)), x)
+
+    def acoshFn(self, x):
+        ''' Compute inverse hyperbolic cosine '''
+        x = self._float(x)
+        return self.lnFn(x + np.sqrt(x - 1.0) * np.sqrt(x + 1.0))
+
+    def atanhFn(self, x):
+        ''' Compute inverse hyperbolic tangent '''
+        x = self._float(x)
+        return 0.5 * self.lnFn((1.0 + x) / (1.0 - x))
+
+    def _exp_neg_square(self, x, c=1.0):
+        ''' exp(-c x^2) for x >= 0 with x^2 split so its rounding is not magnified by the exponential '''
+        x = np.minimum(x, 40.0)
+        xh = np.trunc(x * 2097152) / 2097152
+        return self.expFn(-c * xh * xh) * _horner(-c * (x + xh) * (x - xh), self.EXP_TINY)
+
+    def _erf_tables(self, x):
+        ''' erf by the scalar piecewise polynomials, 0 for nan '''
+        ax = np.clip(np.nan_to_num(np.abs(x)), 0.0, 6.0)
+        j = np.clip((ax * 2).astype(np.int64), 1, 11)
+        t = ax - (j * 0.5 + 0.25)
+        c = self.ERF_TABLE.take(j - 1, axis=1)
+        p = c[13]
+        for i in range(12, -1, -1):
+            p = p * t + c[i]
+        p = np.where(ax >= 6, 1.0, p)
+        small = ax * _horner(ax * ax, self.ERF_SMALL)
+        return np.copysign(np.where(ax < 0.5, small, p), x)
+
+    def _erfc_scaled(self, x):
+        ''' erfc(x) e^(x^2) for x >= 1/2, by the scalar tables '''
+        x = np.clip(np.nan_to_num(x, nan=0.5), 0.5, 40.0)
+        j = np.clip((x * 2).astype(np.int64), 1, 11)
+        t = x - (j * 0.5 + 0.25)
+        c = self.ERFC_TABLE.take(j - 1, axis=1)
+        p = c[13]
+        for i in range(12, -1, -1):
+            p = p * t + c[i]
+        tail = _horner(1 / (x * x), self.ERFC_TAIL) / (x * self.SQRT_PI)
+        return np.where(x >= 6, tail, p)
+
+    def erfFn(self, x):
+        ''' Compute error function from the scalar piecewise polynomials '''
+        x = self._float(x)
+        return np.where(np.isnan(x), x, self._erf_tables(x))
+
+    def erfcFn(self, x):
+        ''' Compute complementary error function, keeping its relative accuracy in the upper tail '''
+        x = self._float(x)
+        tail = self._exp_neg_square(np.maximum(x, 0.5)) * self._erfc_scaled(x)
+        return np.where(x >= 0.5, tail, 1 - self.erfFn(x))
+
+    def normpdfFn(self, x, mu=0.0, sigma=1.0):
+        ''' Compute the normal probability density, nan for sigma <= 0 '''
+        sigma = self._float(sigma)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.abs(self._float(x) - mu) / sigma
+            r = self._exp_neg_square(z, 0.5) * self.INV_SQRT_2PI / sigma
+        return np.where(sigma > 0, r, np.nan)
+
+    def normcdfFn(self, x, mu=0.0, sigma=1.0):
+        ''' Compute the normal cumulative distribution, erfc tables below -1/sqrt(2), nan for sigma <= 0 '''
+        sigma = self._float(sigma)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = (self._float(x) - mu) / sigma
+        upper = 0.5 + 0.5 * self._erf_tables(z * self.SQRT_HALF)
+        a = np.maximum(-z, 0.0)
+        lower = 0.5 * self._exp_neg_square(a, 0.5) * self._erfc_scaled(a * self.SQRT_HALF)
+        r = np.where(z > -self.SQRT_HALF, upper, lower)
+        return np.where(sigma > 0, r, np.nan)
+
+    def invnormFn(self, p, mu=0.0, sigma=1.0):
+        ''' Compute the normal quantile by Acklam's approximation and one Halley step, nan outside (0, 1) '''
+        p = self._float(p)
+        sigma = self._float(sigma)
+        valid = (p > 0) & (p < 1) & (sigma > 0)
+        # Work in the lower half, where 1 - p is exact and the refinement stays relative
+        sign = np.where(p > 0.5, -1.0, 1.0)
+        lo = np.where(valid, np.minimum(p, 1 - p), 0.25)
+
+        q = self.sqrtFn(-2 * self.lnFn(np.minimum(lo, self.INVNORM_LOW)))
+        tail = _horner(q, self.INVNORM_C) / _horner(q, self.INVNORM_D)
+        c = lo - 0.5
+        r = c * c
+        central = c * _horner(r, self.INVNORM_A) / _horner(r, self.INVNORM_B)
+        x = np.where(lo < self.INVNORM_LOW, tail, central)
+
+        e = np.where(lo < self.INVNORM_LOW, self.normcdfFn(x) - lo, 0.5 * self._erf_tables(x * self.SQRT_HALF) - c)
+        u = e / self.normpdfFn(x)
+        x = x - u / (1 + x * u / 2)
+        return np.where(valid, mu + sign * sigma * x, np.nan)
+
+    def _lanczos(self, x):
+        ''' Lanczos sum and shifted argument for x >= 0.5 '''
+        z = x - 1
+        a = self.LANCZOS_CONSTANTS[0]
+        for i in range(1, len(self.LANCZOS_CONSTANTS)):
+            a = a + self.LANCZOS_CONSTANTS[i] / (z + i)
+        return z, z + 7.5, a
+
+    def gammaFn(self, x):
+        ''' Compute gamma function using Lanczos approximation, nan for x <= 0 '''
+        x = self._float(x)
+        reflect = x < 0.5
+        z, t, a = self._lanczos(np.where(reflect, 1 - x, x))
+        # Split the power so t ** (z + 0.5) does not overflow before exp(-t) scales it back
+        p = np.power(t, (z + 0.5) / 2)
+        g = self.SQRT_2PI * a * (p * self.expFn(-t)) * p
+        with np.errstate(divide='ignore'):
+            g = np.where(reflect, self.PI / (self.sinFn(self.PI * x) * g), g)
+        return np.where(x <= 0, np.nan, g)
+
+    def lgammaFn(self, x):
+        ''' Compute natural logarithm of gamma function in log space '''
+        x = self._float(x)
+        reflect = x < 0.5
+        z, t, a = self._lanczos(np.where(reflect, 1 - x, x))
+        lg = self.LN_SQRT_2PI + (z + 0.5) * self.lnFn(t) - t + self.lnFn(a)
+        with np.errstate(divide='ignore'):
+            reflected = self.lnFn(self.PI / np.abs(self.sinFn(self.PI * x))) - lg
+        lg = np.where(reflect, reflected, lg)
+        return np.where((x <= 0) & (x == np.floor(x)), np.inf, lg)
+
+    def factorialFn(self, x):
+        ''' Factorial by table lookup, inf beyond 170 and nan for negatives '''
+        n = np.trunc(self._float(x))
+        index = np.clip(np.nan_to_num(n), 0, 170).astype(np.int64)
+        r = np.where(n > 170, np.inf, self.FACTORIALS[index])
+        return np.where(n < 0, np.nan, r)
+
+    def permFn(self, n, k):
+        ''' Compute permutations P(n, k), 0 when k > n '''
+        n = np.trunc(self._float(n))
+        k = np.trunc(self._float(k))
+        over = k > n
+        rest = np.where(over, n, n - k)
+        small = n <= 170
+        table = self.factorialFn(np.where(small, n, 0)) / self.factorialFn(np.where(small, rest, 0))
+        big = self.expFn(self.lgammaFn(n + 1) - self.lgammaFn(rest + 1))
+        return np.where(over, 0.0, np.rint(np.where(small, table, big)))
+
+    def combFn(self, n, k):
+        ''' Compute combinations C(n, k), 0 when k > n, through lgamma once the factorials overflow '''
+        n = np.trunc(self._float(n))
+        k = np.trunc(self._float(k))
+        over = k > n
+        k = np.where(over, 0, np.minimum(k, n - k))
+        small = n <= 170
+        table = self.factorialFn(np.where(small, n, 0)) / (self.factorialFn(np.where(small, k, 0)) * self.factorialFn(np.where(small, n - k, 0)))
+        big = self.expFn(self.lgammaFn(n + 1) - self.lgammaFn(k + 1) - self.lgammaFn(n - k + 1))
+        return np.where(over, 0.0, np.rint(np.where(small, table, big)))
+
+    def fabsFn(self, x):
+        ''' Compute absolute value '''
+        return np.abs(self._float(x))
+
+    def sgnFn(self, x):
+        ''' Compute sign of x '''
+        return np.sign(x)
+
+    def floorFn(self, x):
+        ''' Compute floor of x '''
+        return np.floor(x)
+
+    def ceilFn(self, x):
+        ''' Compute ceiling of x '''
+        return np.ceil(x)
+
+    def truncFn(self, x):
+        ''' Truncate x to integer '''
+        return np.trunc(x)
+
+    def modfFn(self, x):
+        ''' Return fractional and integer parts of x '''
+        return np.modf(self._float(x))
+
+    def fmodFn(self, x, y):
+        ''' Compute floating-point modulus '''
+        x = self._float(x)
+        return x - np.trunc(x / y) * y
+
+    def remainderFn(self, x, y):
+        ''' Compute remainder of x divided by y '''
+        x = self._float(x)
+        return x - np.rint(x / y) * y
+
+    def copysignFn(self, x, y):
+        ''' Returns abs(x) with sign of y '''
+        return np.copysign(x, y)
+
+    def radiansFn(self, deg):
+        ''' Convert degrees to radians '''
+        return self._float(deg) * (self.PI / 180)
+
+    def degreesFn(self, rad):
+        ''' Convert radians to degrees '''
+        return self._float(rad) * (180 / self.PI)
+
+    def hypotFn(self, x, y):
+        ''' Compute hypotenuse using sqrt(x^2 + y^2) '''
+        x = self._float(x)
+        y = self._float(y)
+        return np.sqrt(x * x + y * y)
+
+    def ldexpFn(self, x, i):
+        ''' Compute x * (2 ** i) '''
+        return self._float(x) * np.power(2.0, i)
+
+    def powFn(self, x, y):
+        ''' Compute x to power of y '''
+        return np.power(self._float(x), y)
+
+    def fmaFn(self, a, b, c):
+        ''' Compute fused multiply-add: a * b + c '''
+        return self._float(a) * b + c
+
+    def isqrtFn(self, n):
+        ''' Integer square root, exact for n below 2 ** 52 '''
+        n = np.floor(self._float(n))
+        r = np.floor(np.sqrt(n))
+        r = np.where(r * r > n, r - 1, r)
+        return np.where((r + 1) * (r + 1) <= n, r + 1, r)
+
+    def gcdFn(self, *args):
+        ''' Compute greatest common divisor of any number of values '''
+        g = np.int64(0)
+        for a in args:
+            g = np.gcd(g, np.asarray(a, dtype=np.int64))
+        return g
+
+    def lcmFn(self, *args):
+        ''' Compute least common multiple of any number of values '''
+        m = np.int64(1)
+        for a in args:
+            m = np.lcm(m, np.asarray(a, dtype=np.int64))
+        return m
+
+    def isnanFn(self, x):
+        ''' Check if x is NaN '''
+        return np.isnan(x)
+
+    def isinfFn(self, x):
+        ''' Check if x is infinite '''
+        return np.isinf(x)
+
+    def isfiniteFn(self, x):
+        ''' Check if x is finite '''
+        return np.isfinite(x)
+
+    def iscloseFn(self, a, b, rel_tol=1e-09, abs_tol=0.0):
+        ''' Check if two values are close, matching Func.iscloseFn '''
+        a = self._float(a)
+        b = self._float(b)
+        with np.errstate(invalid='ignore'):
+            diff = np.abs(a - b)
+            close = diff <= np.maximum(rel_tol * np.maximum(np.abs(a), np.abs(b)), abs_tol)
+        return (a == b) | (close & np.isfinite(a) & np.isfinite(b))
+
+    def fsumFn(self, arr):
+        ''' Sum along the last axis, carrying TwoSum errors through a pairwise reduction '''
+        s = self._float(arr)
+        if s.shape[-1] == 0:
+            return np.zeros(s.shape[:-1])
+        errors = np.zeros(s.shape[:-1])
+        while s.shape[-1] > 1:
+            if s.shape[-1] % 2:
+                s = np.concatenate([s, np.zeros(s.shape[:-1] + (1,))], axis=-1)
+            a = s[..., 0::2]
+            b = s[..., 1::2]
+            s = a + b
+            bb = s - a
+            errors = errors + np.sum((a - (s - bb)) + (b - bb), axis=-1)
+        return s[..., 0] + errors
+
+    def rangeFn(self, start, stop=None, step=1):
+        ''' Materialize a range as an array, the bounds must be the same for every element '''
+        if stop is None:
+            start, stop = 0, start
+        if any(np.ndim(v) for v in (start, stop, step)):
+            raise ValueError('Range bounds cannot depend on array variables')
+        return np.arange(start, stop, step, dtype=float)
+
+    def prodFn(self, arr):
+        ''' Compute product along the last axis '''
+        return np.prod(arr, axis=-1)
+
+    def sumprodFn(self, a, b):
+        ''' Compute sum of products along the last axis '''
+        return np.sum(np.multiply(a, b), axis=-1)
+
+    def distFn(self, p, q):
+        ''' Compute Euclidean distance along the last axis '''
+        d = self._float(p) - self._float(q)
+        return np.sqrt(np.sum(d * d, axis=-1))
+
+def _array_function_list():
+    ''' Map every function_list entry to the ArrayFunc method of the same name '''
+    kernels = {}
+    for name, fn in function_list.items():
+        kernel = getattr(array_functions, getattr(fn, '__name__', ''), None)
+        # Anything without a native kernel still works, one element at a time
+        kernels[name] = kernel or np.vectorize(fn, otypes=[float])
+    kernels['abs'] = np.abs
+    return kernels
+
+def _strict(compare):
+    ''' Array version of the type checking comparison operators '''
+    def fn(a, b):
+        same = np.asarray(a).dtype.kind == np.asarray(b).dtype.kind
+        return np.logical_and(same, compare(a, b))
+    return fn
+
+if np is not None:
+    array_functions = ArrayFunc()
+    array_function_list = _array_function_list()
+
+    array_operators = {
+        "+": np.add,
+        "-": np.subtract,
+        "*": np.multiply,
+        "/": np.true_divide,
+        "^": np.power,
+        "//": np.floor_divide,
+        "%": np.mod,
+        ".": np.multiply,
+        "P": lambda a, b: array_function_list["perm"](a, b),
+        "C": lambda a, b: array_function_list["comb"](a, b),
+        "&": np.bitwise_and,
+        "|": np.bitwise_or,
+        "xor": np.bitwise_xor,
+        "XOR": np.bitwise_xor,
+        "~": np.invert,
+        "<<": np.left_shift,
+        ">>": np.right_shift,
+        "<": np.less,
+        "<=": np.less_equal,
+        ">": np.greater,
+        ">=": np.greater_equal,
+        "==": np.equal,
+        "!=": np.not_equal,
+        "===": _strict(np.equal),
+        "!==": lambda a, b: np.logical_not(_strict(np.equal)(a, b)),
+        "<==": _strict(np.less_equal),
+        ">==": _strict(np.greater_equal),
+        # The operand that decides, as in scalar evaluation, rather than a boolean
+        "&&": lambda a, b: np.where(a, b, a),
+        "||": lambda a, b: np.where(a, a, b),
+    }
+
+def evaluate_array(ast, arrays):
+    ''' Evaluate the AST once with every variable bound to a NumPy array '''
+    if np is None:
+        raise ImportError('NumPy is required for batch evaluation')
+
+    arrays = {name: np.asarray(value) for name, value in arrays.items()}
+    shape = np.broadcast_shapes(*(a.shape for a in arrays.values()))
+    return np.broadcast_to(_evaluate(ast, arrays), shape).copy()
+
+def _evaluate(node, arrays):
+    kind = node[0]
+
+    if kind == 'num':
+        value = node[1]
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+        return value
+
+    if kind == 'var':
+        try:
+            return arrays[node[1]]
+        except KeyError:
+            raise ValueError(f"Variable '{node[1]}' has no value") from None
+
+    if kind == 'function':
+        return array_function_list[node[1]](*(_evaluate(arg, arrays) for arg in node[2:]))
+
+    if kind == 'map':
+        raise ValueError('Sequences cannot be mapped over array variables, evaluate them one value at a time')
+
+    if kind == 'series':
+        # Term by term over the index, each term evaluated for every element at once
+        _, op, name, lo, hi, body = node[:6]
+        lo, hi = _evaluate(lo, arrays), _evaluate(hi, arrays)
+        if np.ndim(lo) or np.ndim(hi) or not np.isfinite(hi):
+            raise ValueError('Series over arrays need finite bounds that do not depend on array variables')
+        combine = np.add if op == 'sum' else np.multiply
+        total = 0 if op == 'sum' else 1
+        for k in range(int(lo), int(hi) + 1):
+            total = combine(total, _evaluate(body, {**arrays, name: k}))
+        return total
+
+    if kind == 'calculus':
+        raise ValueError(f"'{node[1]}' cannot be evaluated over arrays, evaluate it one value at a time")
+
+    if kind == 'postfix':
+        val = _evaluate(node[2], arrays)
+        if node[1] == '!':
+            return array_function_list['factorial'](val)
+        return val
+
+    if kind == 'convert':
+        # Array values are already floats
+        return _evaluate(node[2], arrays)
+
+    if kind == 'unary':
+        return array_operators[node[1]](_evaluate(node[2], arrays))
+
+    _, op, left, right = node
+    return array_operators[op](_evaluate(left, arrays), _evaluate(right, arrays))